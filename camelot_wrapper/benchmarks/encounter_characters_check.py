@@ -0,0 +1,45 @@
+"""
+Check of the characters found in the encounters shipped in the encounters directory.
+Every encounter must be loaded, and the characters its instructions refer to (also as positions, e.g. the player in
+move-within-location(arnell, annara, City), and the player in the conversations) must be among the ones found, so that
+EncountersController never executes together two encounters using the same character.
+
+usage: python encounter_characters_check.py
+"""
+import sys
+import os
+import glob
+import itertools
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from encounters_controller import EncountersController
+
+# Characters that each shipped encounter must be found to use, keyed by encounter name
+EXPECTED_CHARACTERS = {
+    "First": {"father", "annara"},
+    "Second": {"arnell", "annara"},
+    "Second-2": {"arnell", "annara"},
+}
+
+
+def main() -> int:
+    controller = EncountersController()
+    errors = []
+    files = glob.glob(os.path.join(os.path.dirname(__file__), '..', 'encounters', '*.json'))
+    if len(controller.encounters) != len(files):
+        errors.append("%d encounters loaded out of %d files" % (len(controller.encounters), len(files)))
+    for encounter in controller.encounters:
+        print("%-10s %s" % (encounter.name, ", ".join(sorted(encounter.characters))))
+        missing = EXPECTED_CHARACTERS.get(encounter.name, set()) - encounter.characters
+        if len(missing) > 0:
+            errors.append("characters %s of encounter %s not found" % (sorted(missing), encounter.name))
+    for first, second in itertools.combinations(controller.encounters, 2):
+        shared = EXPECTED_CHARACTERS.get(first.name, set()) & EXPECTED_CHARACTERS.get(second.name, set())
+        if len(shared) > 0 and len(first.characters & second.characters) == 0:
+            errors.append("encounters %s and %s could be executed together" % (first.name, second.name))
+    for error in errors:
+        print("ERROR: " + error)
+    return 1 if len(errors) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
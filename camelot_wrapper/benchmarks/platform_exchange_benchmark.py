@@ -0,0 +1,96 @@
+"""
+Benchmark of the full handshake and of the message-exchange loop with the evaluation platform,
+run offline against the local stand-in platform. It follows the same calls GameController makes.
+
+usage: python platform_exchange_benchmark.py <optional> -n <number of actions> -l <latency in seconds>
+"""
+import sys
+import os
+import getopt
+import time
+import statistics
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from platform_IO_communication import PlatformIOCommunication
+from platform_stand_in import PlatformStandIn
+
+
+def _handshake(platform : PlatformIOCommunication) -> dict:
+    timings = {}
+    start = time.perf_counter()
+    platform.start()
+    message = platform.communication_protocol_phase_messages['PHASE_2']['message_3'] + "Camelot"
+    result = platform.send_message(message, inizialization=True)
+    assert result['text'] == platform.communication_protocol_phase_messages['PHASE_2']['message_4']
+    timings['phase 2'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    platform.wait_for_handshake_phase("PHASE_3")
+    timings['wait for phase 3'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    message_text = {
+        "text" : platform.communication_protocol_phase_messages['PHASE_3']['message_6'],
+        "domain" : "(define (domain CamelotDomain))",
+        "problem" : "(define (problem CamelotProblem))",
+        "additional_data" : "{}"
+    }
+    result = platform.send_message(message_text, inizialization=True)
+    assert result['text'] == platform.communication_protocol_phase_messages['PHASE_4']['message_9']
+    platform.send_message_link = result['add_message_url'].replace('/', '')
+    platform.receive_message_link = result['get_message_url'].replace('/', '')
+    platform.start_receiving_normal_messages()
+    timings['phase 3 and 4'] = time.perf_counter() - start
+    return timings
+
+
+def _exchange(platform : PlatformIOCommunication, stand_in : PlatformStandIn, number_of_actions : int) -> list:
+    latencies = []
+    for index in range(number_of_actions):
+        sent = time.perf_counter()
+        stand_in.add_action("move-within-location(father, annara, Tavern)")
+        action = None
+        while action is None:
+            time.sleep(0)
+            action = platform.receive_message()
+        latencies.append((time.perf_counter() - sent) * 1000)
+        platform.send_message_async('[["new", "(at father annara)"]]')
+    while platform.get_outbox_metrics()['sent'] < number_of_actions:
+        time.sleep(0.001)
+    return latencies
+
+
+def main(argv):
+    number_of_actions = 200
+    latency = 0.0
+    try:
+        opts, args = getopt.getopt(argv, "hn:l:")
+    except getopt.GetoptError:
+        print('Parameter not recognized')
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(__doc__)
+            sys.exit()
+        elif opt == '-n':
+            number_of_actions = int(arg)
+        elif opt == '-l':
+            latency = float(arg)
+
+    stand_in = PlatformStandIn(port=0, latency=latency, phase_delays={"PHASE_3": 0.2})
+    stand_in.start()
+    platform = PlatformIOCommunication()
+    platform.base_link = stand_in.base_link
+
+    for name, seconds in _handshake(platform).items():
+        print("%-20s %.3f ms" % (name, seconds * 1000))
+
+    latencies = sorted(_exchange(platform, stand_in, number_of_actions))
+    print("%-20s mean %.3f ms | median %.3f ms | p95 %.3f ms" % ("action delivery", statistics.mean(latencies), statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]))
+    print("outbox", platform.get_outbox_metrics())
+
+    platform.stop_receiving_normal_messages()
+    stand_in.stop()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
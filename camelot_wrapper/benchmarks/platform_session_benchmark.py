@@ -0,0 +1,67 @@
+"""
+Benchmark of the per-request latency towards the evaluation platform.
+It compares the module-level requests calls (one TCP connection per request) with the
+keep-alive session used by PlatformIOCommunication, against a local stand-in server.
+
+usage: python platform_session_benchmark.py <optional> -n <number of requests>
+"""
+import sys
+import os
+import getopt
+import time
+import statistics
+import requests
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from platform_IO_communication import PlatformIOCommunication
+from platform_stand_in import PlatformStandIn
+
+
+def _measure(function, number_of_requests : int) -> list:
+    latencies = []
+    for _ in range(number_of_requests):
+        start = time.perf_counter()
+        function()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def _report(name : str, latencies : list):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print("%-28s mean %.3f ms | median %.3f ms | p95 %.3f ms" % (name, statistics.mean(latencies), statistics.median(latencies), p95))
+
+
+def main(argv):
+    number_of_requests = 1000
+    try:
+        opts, args = getopt.getopt(argv, "hn:")
+    except getopt.GetoptError:
+        print('Parameter not recognized')
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(__doc__)
+            sys.exit()
+        elif opt == '-n':
+            number_of_requests = int(arg)
+
+    stand_in = PlatformStandIn(port=0)
+    stand_in.start()
+    base_link = stand_in.base_link
+    send_link = base_link + stand_in.send_message_link
+
+    platform = PlatformIOCommunication()
+    platform.base_link = base_link
+    platform.send_message_link = stand_in.send_message_link
+
+    _report("requests.get (before)", _measure(lambda: requests.get(base_link + "protocol_phase"), number_of_requests))
+    _report("session.get (after)", _measure(lambda: platform._session.get(base_link + "protocol_phase", timeout = platform._timeout), number_of_requests))
+    _report("requests.post (before)", _measure(lambda: requests.post(send_link, json = {'text': 'x', 'to_user_role': 'EM'}), number_of_requests))
+    _report("send_message (after)", _measure(lambda: platform.send_message('x'), number_of_requests))
+
+    platform.close()
+    stand_in.stop()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,143 @@
+"""
+Benchmark of the evaluation of the preconditions of the actions of camelot_domain.pddl and of the encounters.
+It compares the compiled evaluators of PreconditionCompiler with a generic evaluation of the formula trees,
+on synthetic world states with thousands of entities.
+
+usage: python precondition_benchmark.py <optional> -e <number of entities> -n <evaluations per action>
+"""
+import sys
+import os
+import getopt
+import glob
+import json
+import random
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from precondition_compiler import PreconditionCompiler, WorldStateIndex, parse_sexpression, parse_typed_list
+from shared_variables import get_domain_and_problem_path
+
+ENTITY_TYPES = ["character", "location", "entrypoint", "furniture", "item"]
+
+
+def _synthetic_state(compiler : PreconditionCompiler, number_of_entities : int, seed : int = 1) -> tuple:
+    random_generator = random.Random(seed)
+    entity_types = {}
+    for index in range(number_of_entities):
+        entity_type = ENTITY_TYPES[index % len(ENTITY_TYPES)]
+        entity_types["%s%d" % (entity_type, index)] = entity_type
+    by_type = {entity_type: [name for name, value in entity_types.items() if value == entity_type] for entity_type in ENTITY_TYPES}
+    facts = set()
+    for character in by_type["character"]:
+        facts.add(("in", character, random_generator.choice(by_type["location"])))
+        facts.add(("at", character, random_generator.choice(by_type["entrypoint"] + by_type["furniture"])))
+        if random_generator.random() < 0.9:
+            facts.add(("alive", character))
+    for furniture in by_type["furniture"]:
+        facts.add(("at", furniture, random_generator.choice(by_type["location"])))
+        facts.add((random_generator.choice(["has_surface", "can_open", "is_open"]), furniture))
+    for item in by_type["item"]:
+        facts.add(("stored", item, random_generator.choice(by_type["furniture"])))
+    for entrypoint in by_type["entrypoint"]:
+        facts.add(("adjacent", entrypoint, random_generator.choice(by_type["entrypoint"])))
+    return WorldStateIndex(facts, entity_types, compiler.type_parents), by_type
+
+
+def _generic_evaluation(formula, bindings : dict, index : WorldStateIndex) -> bool:
+    """Evaluation of the formula tree, walking it for every call."""
+    operator = formula[0]
+    if operator == "and":
+        return all(_generic_evaluation(item, bindings, index) for item in formula[1:])
+    if operator == "or":
+        return any(_generic_evaluation(item, bindings, index) for item in formula[1:])
+    if operator == "not":
+        return not _generic_evaluation(formula[1], bindings, index)
+    if operator in ("forall", "exists"):
+        variables = parse_typed_list(formula[1])
+        def evaluate(position, inner_bindings):
+            if position == len(variables):
+                return _generic_evaluation(formula[2], inner_bindings, index)
+            name, type_name = variables[position]
+            results = (evaluate(position + 1, dict(inner_bindings, **{name: entity})) for entity in index.entities_of_type(type_name))
+            return all(results) if operator == "forall" else any(results)
+        return evaluate(0, bindings)
+    atom = (operator,) + tuple(bindings.get(term, term) for term in formula[1:])
+    return atom in index.facts
+
+
+def _domain_actions(domain_path : str) -> dict:
+    actions = {}
+    for section in parse_sexpression(open(domain_path).read())[0]:
+        if type(section) == list and len(section) > 0 and section[0] == ":action":
+            parameters = section[section.index(":parameters") + 1]
+            precondition = section[section.index(":precondition") + 1] if ":precondition" in section else ["and"]
+            actions[section[1]] = (parse_typed_list(parameters), precondition)
+    return actions
+
+
+def main(argv):
+    number_of_entities = 5000
+    evaluations = 2000
+    try:
+        opts, args = getopt.getopt(argv, "he:n:")
+    except getopt.GetoptError:
+        print('Parameter not recognized')
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(__doc__)
+            sys.exit()
+        elif opt == '-e':
+            number_of_entities = int(arg)
+        elif opt == '-n':
+            evaluations = int(arg)
+    domain_path = get_domain_and_problem_path()[0]
+    start = time.perf_counter()
+    compiler = PreconditionCompiler(domain_path)
+    print("Compiled %d actions in %.2f ms" % (len(compiler.evaluators), (time.perf_counter() - start) * 1000))
+    index, by_type = _synthetic_state(compiler, number_of_entities)
+    print("Synthetic state: %d entities, %d true relations" % (number_of_entities, len(index.facts)))
+    random_generator = random.Random(2)
+    actions = _domain_actions(domain_path)
+    compiled_total = generic_total = 0.0
+    print("%-28s %16s %16s" % ("action", "compiled eval/s", "generic eval/s"))
+    for name, (parameters, precondition) in actions.items():
+        calls = []
+        for _ in range(evaluations):
+            bindings = {}
+            for parameter, type_name in parameters:
+                candidates = index.entities_of_type(type_name) or index.entities_of_type("object")
+                bindings[parameter] = random_generator.choice(candidates)
+            calls.append(bindings)
+        evaluator = compiler.evaluators[name]
+        ordered_calls = [[bindings[parameter] for parameter, _ in parameters] for bindings in calls]
+        start = time.perf_counter()
+        compiled_results = [evaluator(index, *arguments) for arguments in ordered_calls]
+        compiled_time = time.perf_counter() - start
+        start = time.perf_counter()
+        generic_results = [_generic_evaluation(precondition, bindings, index) for bindings in calls]
+        generic_time = time.perf_counter() - start
+        if compiled_results != generic_results:
+            raise Exception("Different results for " + name)
+        compiled_total += compiled_time
+        generic_total += generic_time
+        print("%-28s %16.0f %16.0f" % (name, evaluations / compiled_time, evaluations / generic_time))
+    total = evaluations * len(actions)
+    print("%-28s %16.0f %16.0f" % ("all actions", total / compiled_total, total / generic_total))
+    for path in glob.glob(os.path.join(os.path.dirname(__file__), '..', 'encounters', '*.json')):
+        with open(path) as file:
+            formula = json.load(file)['preconditions']
+        evaluator = compiler.compile_formula(formula)
+        tree = parse_sexpression(formula)[0]
+        start = time.perf_counter()
+        for _ in range(evaluations):
+            evaluator(index)
+        compiled_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(evaluations):
+            _generic_evaluation(tree, {}, index)
+        generic_time = time.perf_counter() - start
+        print("%-28s %16.0f %16.0f" % ("encounter " + os.path.basename(path), evaluations / compiled_time, evaluations / generic_time))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,60 @@
+"""
+Benchmark of the encode/decode throughput of the changed relations messages sent to the platform,
+for each supported wire format, on bursts of relation changes.
+
+usage: python serialization_benchmark.py <optional> -b <relations per burst> -r <repetitions>
+"""
+import sys
+import os
+import getopt
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from wire_format import encode_changed_relations, decode_changed_relations, SUPPORTED_WIRE_FORMATS
+
+
+def _burst(size : int) -> list:
+    relation_list = []
+    for index in range(size):
+        if index % 3 == 0:
+            relation_list.append(("new", "(at character%d tavern.Table.Left)" % index))
+        elif index % 3 == 1:
+            relation_list.append(("changed_value", "(not (in character%d Tavern))" % index))
+        else:
+            relation_list.append(("new", "(stored item%d alchemyshop.Chest)" % index))
+    return relation_list
+
+
+def main(argv):
+    burst_size = 500
+    repetitions = 200
+    try:
+        opts, args = getopt.getopt(argv, "hb:r:")
+    except getopt.GetoptError:
+        print('Parameter not recognized')
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(__doc__)
+            sys.exit()
+        elif opt == '-b':
+            burst_size = int(arg)
+        elif opt == '-r':
+            repetitions = int(arg)
+
+    relation_list = _burst(burst_size)
+    for wire_format in SUPPORTED_WIRE_FORMATS:
+        start = time.perf_counter()
+        for _ in range(repetitions):
+            message = encode_changed_relations(relation_list, wire_format)
+        encode_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(repetitions):
+            decoded = decode_changed_relations(message)
+        decode_time = time.perf_counter() - start
+        assert [tuple(item) for item in decoded] == relation_list
+        print("%-14s encode %10.0f relations/s | decode %10.0f relations/s | %7d bytes per burst of %d" % (
+            wire_format, burst_size * repetitions / encode_time, burst_size * repetitions / decode_time, len(message), burst_size))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -4,6 +4,10 @@ import logging
 import sys
 import time
 from singleton_decorator import singleton
+try:
+    from command_queue import PrioritizedCommandQueue, CommandPriority
+except (ModuleNotFoundError, ImportError):
+    from .command_queue import PrioritizedCommandQueue, CommandPriority
 
 @singleton
 class CamelotIOCommunication:
@@ -22,7 +26,7 @@ class CamelotIOCommunication:
             # logging.basicConfig(filename='logs/python/'+logname, filemode='w',
             #                     format='%(levelname)s:%(message)s', level=logging.DEBUG)
             self.__queue_input = queue.Queue()
-            self.__queue_output = queue.Queue()
+            self.__queue_output = PrioritizedCommandQueue()
             self.__running = True
             lock = threading.Lock()
             event_obj = threading.Event()
@@ -61,7 +65,7 @@ class CamelotIOCommunication:
 
         Parameters
         ----------
-        queue : queue.Queue; the queue used to get the messages to sent over the standard input
+        queue : PrioritizedCommandQueue; the queue used to get the messages to sent over the standard input, the most urgent first
         is_running : bool; the flag used to stop the thread
         lock : threading.Lock; the lock used to ensure that the standard input / output is not used by two threads at the same time
         event_obj : threading.Event; the event used to notify the thread that a message has been received from the standard input so the operation on the standard output can be performed.
@@ -145,15 +149,23 @@ class CamelotIOCommunication:
         logging.debug("__standard_IO_operations: Lock released")
         return return_message
 
-    def print_action(self, text):
+    def print_action(self, text, priority = CommandPriority.GAMEPLAY, reorderable = False):
         """
         This method is called to add a new message to the queue to be printed over the standard output.
 
         Parameters
         ----------
         text : str; the message to be printed.
+        priority : int; the priority class of the message, a value of CommandPriority. Default: CommandPriority.GAMEPLAY.
+        reorderable : bool; True only if the sender waits for the reply of Camelot before sending other messages (see PrioritizedCommandQueue). Default: False.
         """
-        self.__queue_output.put(text)
+        self.__queue_output.put(text, priority, reorderable)
+
+    def get_output_queue_metrics(self) -> dict:
+        """
+        This method is called to get the depth and the queue wait of each priority class of the messages sent to Camelot.
+        """
+        return self.__queue_output.get_metrics()
 
     def get_message(self) -> str:
         """
@@ -5,10 +5,18 @@ try:
     from camelot_IO_communication import CamelotIOCommunication
     from utilities import parse_json, replace_all, str2bool
     from camelot_input_multiplexer import CamelotInputMultiplexer
+    from game_event_scheduler import GameEventScheduler, EventSource
+    from command_queue import CommandPriority
+    from camelot_ui_state import CamelotUIState
+    import shared_variables
 except (ModuleNotFoundError, ImportError):
     from .camelot_IO_communication import CamelotIOCommunication
     from .utilities import parse_json, replace_all, str2bool
     from .camelot_input_multiplexer import CamelotInputMultiplexer
+    from .game_event_scheduler import GameEventScheduler, EventSource
+    from .command_queue import CommandPriority
+    from .camelot_ui_state import CamelotUIState
+    from . import shared_variables
 from singleton_decorator import singleton
 from ev_pddl.action import Action
 #TODO: check if parameters in action are what camelot expects
@@ -24,7 +32,13 @@ class CamelotAction:
         self.camelot_input_multiplex.start()
         self.camelot_IO_communication = CamelotIOCommunication()
         self.success_messages = queue.Queue()
+        self._event_scheduler = GameEventScheduler()
         self.debug = False
+        # If True, the commands that would not change the state of the Camelot UI are not sent
+        self.suppress_redundant_commands = False
+        self.ui_state = CamelotUIState()
+        self.commands_suppressed = 0
+        self.round_trips_saved = 0
         self.json_actionlist = parse_json("Actionlist")
         self.json_actions_to_camelot = parse_json("pddl_actions_to_camelot")
 
@@ -52,6 +66,7 @@ class CamelotAction:
                 logging.debug("Camelot output: %s" % received)
                 if received == 'succeeded ' + command:
                     self.success_messages.put(received)
+                    self._event_scheduler.notify(EventSource.SUCCESS)
                     logging.debug("Camelot_Action(check_for_success): Success message added to queue")
                     return True
                 elif received.startswith('failed ' + command) or received.startswith('error ' + command):
@@ -71,7 +86,7 @@ class CamelotAction:
             
 
 
-    def action(self, action_name, parameters = [] , wait=True):
+    def action(self, action_name, parameters = [] , wait=True, priority=None):
         """
         Format an action for interpretation by Camelot and sends it to Camelot.
 
@@ -83,6 +98,8 @@ class CamelotAction:
             The parameters of the action.
         wait : bool
             If true, wait for success or fail response from Camelot. If False, do not wait.
+        priority : int (Optional)
+            The priority class of the command, a value of CommandPriority. If None, it depends on the action (see get_action_priority).
         
         Returns
         -------
@@ -103,16 +120,28 @@ class CamelotAction:
         # Format commands
         # This method assumes that the parameters are checked and ok to be printed
         command = self._generate_camelot_string(action_name, parameters, action_data)
+
+        if self.suppress_redundant_commands and self.ui_state.is_redundant(action_name, parameters):
+            logging.debug("CamelotAction(action): %s not sent, it would not change anything" % command)
+            self.commands_suppressed += 1
+            if wait == True:
+                self.round_trips_saved += 1
+            return True
+        self.ui_state.apply(action_name, parameters)
         
-        self.send_camelot_instruction('start ' + command)
+        # Only a command whose reply is awaited can be reordered in the output queue
+        self._send_camelot_string('start ' + command, priority, reorderable=wait==True)
 
         if wait==True:
             # Call function to check for its success
-            return self.check_for_success(command, action_name)
+            success = self.check_for_success(command, action_name)
+            if not success:
+                self.ui_state.invalidate(action_name, parameters)
+            return success
         else:
             return True
     
-    def send_camelot_instruction(self, instruction):
+    def send_camelot_instruction(self, instruction, priority=None):
         """
         This method is used to send a command to Camelot without performing any checks.
 
@@ -120,11 +149,63 @@ class CamelotAction:
         ----------
         instruction : str
             The instruction to send to Camelot.
+        priority : int (Optional)
+            The priority class of the command, a value of CommandPriority. If None, it depends on the action (see get_action_priority).
         """
-        if instruction.startswith('start '):
-            self.camelot_IO_communication.print_action(instruction)
-        else:
-            self.camelot_IO_communication.print_action('start ' + instruction)
+        if not instruction.startswith('start '):
+            instruction = 'start ' + instruction
+        action_name = instruction[len('start '):].split('(')[0].strip()
+        if action_name in CamelotUIState.tracked_actions:
+            # The parameters are not parsed, so what the instruction changed is not known
+            self.ui_state.invalidate(action_name)
+        self._send_camelot_string(instruction, priority)
+
+    def _send_camelot_string(self, instruction, priority=None, reorderable=False):
+        """
+        This method is used to put a command, starting with 'start ', in the output queue of Camelot.
+
+        Parameters
+        ----------
+        instruction : str
+            The instruction to send to Camelot.
+        priority : int (Optional)
+            The priority class of the command, a value of CommandPriority. If None, it depends on the action.
+        reorderable : bool (Optional)
+            True only if the reply of Camelot is awaited before sending other commands (see PrioritizedCommandQueue).
+        """
+        if priority is None:
+            priority = self.get_action_priority(instruction[len('start '):].split('(')[0].strip())
+        self.camelot_IO_communication.print_action(instruction, priority, reorderable)
+
+    def get_redundant_commands_metrics(self) -> dict:
+        """
+        This method is used to get how many commands have not been sent to Camelot because they would not change anything.
+
+        Returns
+        -------
+        dict
+            "commands_suppressed": commands not sent; "round_trips_saved": the ones that would have waited for the reply of Camelot.
+        """
+        return {
+            "commands_suppressed": self.commands_suppressed,
+            "round_trips_saved": self.round_trips_saved,
+        }
+
+    def get_action_priority(self, action_name):
+        """
+        This method is used to get the default priority class of an action: CommandPriority.UI for the actions in shared_variables.ui_actions,
+        CommandPriority.BACKGROUND for the ones in shared_variables.background_actions and CommandPriority.GAMEPLAY for the others.
+
+        Parameters
+        ----------
+        action_name : str
+            The name of the action.
+        """
+        if action_name in shared_variables.ui_actions:
+            return CommandPriority.UI
+        if action_name in shared_variables.background_actions:
+            return CommandPriority.BACKGROUND
+        return CommandPriority.GAMEPLAY
 
     
     def _generate_camelot_string(self, action_name, parameters, action_data):
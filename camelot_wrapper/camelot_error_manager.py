@@ -5,17 +5,34 @@ except (ModuleNotFoundError, ImportError):
     from .platform_IO_communication import PlatformIOCommunication
     from .camelot_error import CamelotError
 from singleton_decorator import singleton
+import collections
+import threading
 
 @singleton
 class CamelotErrorManager:
     """
     This class is used to manage camelot errors.
+    The open errors are indexed by action name and by the words of their message when they are added, so finding the error of a
+    command costs as much as the number of its arguments. Only the last solved errors are kept; the others are only counted.
     """
     platform_IO_communication = PlatformIOCommunication()
 
-    def __init__(self):
-        self._errors = []
-        self._solved_errors = []
+    def __init__(self, solved_history : int = 100):
+        """
+        Parameters
+        ----------
+        solved_history : int, default - 100
+            The number of solved errors kept.
+        """
+        self._lock = threading.Lock()
+        # Words of the message of each open error, in the order the errors were added
+        self._errors = {}
+        self._error_sequence = {}
+        self._sequence = 0
+        # Open errors, keyed by (action name, word of the message)
+        self._errors_by_token = {}
+        self._solved_errors = collections.deque(maxlen=solved_history)
+        self._solved_count = collections.Counter()
     
     def add_error(self, error : CamelotError):
         """
@@ -26,12 +43,21 @@ class CamelotErrorManager:
         error : CamelotError
             The error to add.
         """
-        self._errors.append(error)
-        self.platform_IO_communication.send_error_message(str(error))
+        tokens = set(error.error_message.split())
+        action_name = getattr(error, "action_name", None)
+        with self._lock:
+            self._errors[error] = tokens
+            self._error_sequence[error] = self._sequence
+            self._sequence += 1
+            if action_name is not None:
+                for token in tokens:
+                    self._errors_by_token.setdefault((action_name, token), set()).add(error)
+        self.platform_IO_communication.send_error_message_async(str(error))
     
     def check_errors_with_action(self, action_name, command):
         """
         This method is used to check if there is an error that has the same action name.
+        If more errors match, the oldest one is solved.
 
         Parameters
         ----------
@@ -40,17 +66,18 @@ class CamelotErrorManager:
         command : str
             The command to check.
         """
-        for error in self._errors:
-            if error.action_name == action_name:
-                # Find arguments of the command
-                arguments = command[command.find("(")+1:command.find(")")].split(',')
-                # Check if the arguments of the command are in (any part of) the error message
-                common_elements = set(error.error_message.split()) & set(arguments)
-                if len(common_elements) > 0:
-                    # If there is a common element, the error is solved
-                    self.solve_error(error)
-                    return error
-        return None
+        # Find arguments of the command
+        arguments = command[command.find("(")+1:command.find(")")].split(',')
+        with self._lock:
+            # The errors with an argument of the command in (any part of) the error message
+            candidates = set()
+            for argument in arguments:
+                candidates |= self._errors_by_token.get((action_name, argument), set())
+            if len(candidates) == 0:
+                return None
+            error = min(candidates, key=self._error_sequence.get)
+            self._solve_error(error)
+        return error
     
     def solve_error(self, error: CamelotError):
         """
@@ -61,8 +88,46 @@ class CamelotErrorManager:
         error : CamelotError
             The error to solve.
         """
+        with self._lock:
+            self._solve_error(error)
+
+    def _solve_error(self, error: CamelotError):
+        """
+        This function is used to solve an error, with the lock already acquired.
+        """
         error.close_error()
+        tokens = self._errors.pop(error)
+        del self._error_sequence[error]
+        action_name = getattr(error, "action_name", None)
+        if action_name is not None:
+            for token in tokens:
+                errors = self._errors_by_token[(action_name, token)]
+                errors.discard(error)
+                if len(errors) == 0:
+                    del self._errors_by_token[(action_name, token)]
         self._solved_errors.append(error)
-        self._errors.remove(error)
+        self._solved_count[action_name] += 1
+
+    def get_solved_errors(self) -> list:
+        """
+        This method is used to get the last solved errors, from the oldest.
+        """
+        with self._lock:
+            return list(self._solved_errors)
 
+    def get_error_metrics(self) -> dict:
+        """
+        This method is used to get the metrics of the errors.
 
+        Returns
+        -------
+        dict
+            "open": errors not solved; "solved": errors solved; "solved_by_action": errors solved keyed by action name
+            (None for the errors whose action is not known).
+        """
+        with self._lock:
+            return {
+                "open": len(self._errors),
+                "solved": sum(self._solved_count.values()),
+                "solved_by_action": dict(self._solved_count),
+            }
@@ -3,16 +3,21 @@ try:
     from camelot_error_manager import CamelotErrorManager
     from camelot_error import CamelotError
     from camelot_IO_communication import CamelotIOCommunication
+    from game_event_scheduler import GameEventScheduler, EventSource
+    from location_event_queue import LocationEventQueue
     import shared_variables
 except (ModuleNotFoundError, ImportError):
     from .camelot_error_manager import CamelotErrorManager
     from .camelot_error import CamelotError
     from .camelot_IO_communication import CamelotIOCommunication
+    from .game_event_scheduler import GameEventScheduler, EventSource
+    from .location_event_queue import LocationEventQueue
     from . import shared_variables
 from singleton_decorator import singleton
 import threading
 from queue import Queue, Empty
 import logging
+import time
 
 
 @singleton
@@ -31,7 +36,11 @@ class CamelotInputMultiplexer:
             self.camelot_IO_communication = CamelotIOCommunication()
             self.camelot_IO_communication.start()
             self.__input_queue = Queue()
-            self.__location_queue = Queue()
+            self.__location_queue = LocationEventQueue()
+            # Location messages that are not dropped, e.g. "input arrived"
+            self.location_subscriptions = tuple(shared_variables.location_message_subscriptions)
+            self._location_received = 0
+            self._location_dropped = 0
             self.__success_queue = Queue()
             self.__error_queue = Queue()
             self.__other_queue = Queue()
@@ -39,6 +48,9 @@ class CamelotInputMultiplexer:
             self.__messages_management.start()
             self.__started = True
             self._camelot_error_manager = CamelotErrorManager()
+            self._event_scheduler = GameEventScheduler()
+            # Seconds the last message taken from each queue waited in it
+            self._queue_lag = {EventSource.INPUT: 0.0, EventSource.LOCATION: 0.0, EventSource.ERROR: 0.0}
 
     def _input_messages_management(self):
         """
@@ -60,19 +72,27 @@ class CamelotInputMultiplexer:
                 logging.debug("CamelotInputMultiplexer: Added to success queue")
             elif message.startswith("input"):
                 if message.startswith(shared_variables.location_message_prefix):
-                    self.__location_queue.put(message)
+                    self._location_received += 1
+                    if not message.startswith(self.location_subscriptions):
+                        self._location_dropped += 1
+                        logging.debug("CamelotInputMultiplexer: Location message not subscribed, dropped")
+                        continue
+                    self.__location_queue.put((time.perf_counter(), message))
+                    self._event_scheduler.notify(EventSource.LOCATION)
                     logging.debug("CamelotInputMultiplexer: Added to location queue")
                 else:
                     if previous_input_message == message:
                         logging.debug("CamelotInputMultiplexer: Duplicated message, but keeping it.")
                     previous_input_message = str(message)
-                    self.__input_queue.put(message)
+                    self.__input_queue.put((time.perf_counter(), message))
+                    self._event_scheduler.notify(EventSource.INPUT)
                     logging.debug("CamelotInputMultiplexer: Added to input queue")
             elif message.startswith("started"):
                 logging.debug("CamelotInputMultiplexer: Received started so I pass next print to realease the event")
                 self.camelot_IO_communication.print_action("%PASS%")
             elif message.startswith("error") or message.startswith("failed") or message.lower().startswith("exception"):
-                self.__error_queue.put(message)
+                self.__error_queue.put((time.perf_counter(), message))
+                self._event_scheduler.notify(EventSource.ERROR)
                 logging.debug("CamelotInputMultiplexer: Added to error queue")
             else:
                 self.__other_queue.put(message)
@@ -107,7 +127,7 @@ class CamelotInputMultiplexer:
             The part of the error message that is searched for.
         """
         try:
-            message = self.__error_queue.get_nowait()
+            message = self._take_from_queue(self.__error_queue, EventSource.ERROR, no_wait = True)
             logging.debug("CamelotInputMultiplexer(get_error_message): Got error message: %s"%(message))
         except Empty:
             message = None
@@ -121,16 +141,79 @@ class CamelotInputMultiplexer:
         """
         This method is used to add an error message to the error queue.
         """
-        self.__error_queue.put(message)
+        self.__error_queue.put((time.perf_counter(), message))
+        self._event_scheduler.notify(EventSource.ERROR)
+
+    def _take_from_queue(self, source_queue : Queue, source : str, no_wait = False) -> str:
+        """
+        This method is used to take a message from one of the queues of the main thread, recording how long it waited in the queue.
+
+        Parameters
+        ----------
+        source_queue : Queue
+            The queue to take the message from.
+        source : str
+            The source of the queue, e.g. EventSource.LOCATION.
+        no_wait : bool, default - False
+            If True, raise queue.Empty instead of waiting when the queue is empty.
+        """
+        if no_wait:
+            enqueued_at, message = source_queue.get_nowait()
+        else:
+            enqueued_at, message = source_queue.get()
+        self._queue_lag[source] = time.perf_counter() - enqueued_at
+        return message
+
+    def set_location_subscriptions(self, subscriptions : tuple, coalesce : bool = True):
+        """
+        This method is used to choose which location messages are sent to the main thread.
+
+        Parameters
+        ----------
+        subscriptions : tuple
+            The prefixes of the location messages that are kept (e.g. ("input arrived", "input exited")); the others are dropped.
+        coalesce : bool, default - True
+            If True, the redundant messages of the same character still waiting in the queue are coalesced.
+        """
+        self.location_subscriptions = tuple(subscriptions)
+        self.__location_queue.coalesce = coalesce
+
+    def get_location_metrics(self) -> dict:
+        """
+        This method is used to get the counters of the location messages.
+
+        Returns
+        -------
+        dict
+            "received": location messages received from Camelot; "dropped": messages not subscribed;
+            "coalesced": messages removed from the queue because they were redundant.
+        """
+        return {
+            "received": self._location_received,
+            "dropped": self._location_dropped,
+            "coalesced": self.__location_queue.coalesced,
+        }
+
+    def get_queue_metrics(self) -> dict:
+        """
+        This method is used to get the backlog and the lag of the queues used by the main thread.
+
+        Returns
+        -------
+        dict
+            For each source, "backlog": messages waiting in the queue; "lag": seconds the last message taken waited in the queue.
+        """
+        return {
+            EventSource.INPUT: {"backlog": self.__input_queue.qsize(), "lag": self._queue_lag[EventSource.INPUT]},
+            EventSource.LOCATION: {"backlog": self.__location_queue.qsize(), "lag": self._queue_lag[EventSource.LOCATION]},
+            EventSource.ERROR: {"backlog": self.__error_queue.qsize(), "lag": self._queue_lag[EventSource.ERROR]},
+        }
     
     def get_input_message(self, no_wait = False) -> str:
         """
         This method is used from the main thread to get the input messages that come from Camelot.
         """
-        if no_wait:
-            message = self.__input_queue.get_nowait()
-        else:
-            message =  self.__input_queue.get()
+        message = self._take_from_queue(self.__input_queue, EventSource.INPUT, no_wait)
         logging.debug("CamelotInputMultiplexer: Got input message: %s"%(message))
         if message == "kill":
             raise Exception("Kill called - End program")
@@ -140,10 +223,7 @@ class CamelotInputMultiplexer:
         """
         This method is used from the main thread to get the location messages that come from Camelot.
         """
-        if no_wait:
-            message = self.__location_queue.get_nowait()
-        else:
-            message =  self.__location_queue.get()
+        message = self._take_from_queue(self.__location_queue, EventSource.LOCATION, no_wait)
         logging.debug("CamelotInputMultiplexer: Got location message: %s"%(message))
         if message == "kill":
             raise Exception("Kill called - End program")
@@ -160,8 +240,8 @@ class CamelotInputMultiplexer:
         self.__thread_running = False
         self.__messages_management.join()
         self.camelot_IO_communication.stop()
-        self.__input_queue.put("kill")
-        self.__location_queue.put("kill")
+        self.__input_queue.put((time.perf_counter(), "kill"))
+        self.__location_queue.put((time.perf_counter(), "kill"))
         self.__success_queue.put("kill")
         self.__other_queue.put("kill")
 
@@ -0,0 +1,146 @@
+import logging
+import threading
+
+
+class CamelotUIState:
+    """
+    This class is a mirror of the state of the Camelot UI (menu, dialog, player input, camera focus and icons), updated from
+    the commands sent to Camelot. It is used to find the commands that would not change anything.
+    A part of the state that is not known (e.g. at the start, or after a command failed) is None, and the commands that depend
+    on it are never considered redundant.
+
+    Attributes
+    ----------
+    tracked_actions : tuple
+        The actions that change the mirrored state.
+    """
+
+    tracked_actions = ("ShowMenu", "HideMenu", "ShowDialog", "HideDialog", "EnableInput", "DisableInput", "SetTitle",
+                       "SetCameraFocus", "EnableIcon", "DisableIcon")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        This method is used to forget the whole state, e.g. when a command has been sent to Camelot without the mirror.
+        """
+        with self._lock:
+            self.menu_shown = None
+            self.dialog_shown = None
+            # Camelot counts the times the input has been disabled and each EnableInput undoes one of them; 0 means that the input is enabled
+            self.input_disabled = None
+            self.title = None
+            self.camera_focus = None
+            # Parameters of the icons enabled, keyed by (action name, entity); False for the icons known to be disabled
+            self.icons = {}
+
+    def is_redundant(self, action_name : str, parameters : list) -> bool:
+        """
+        This method is used to check if a command would not change the state of Camelot.
+
+        Parameters
+        ----------
+        action_name : str
+            The name of the action.
+        parameters : list
+            The parameters of the action.
+        """
+        with self._lock:
+            if action_name == "EnableInput":
+                # With the input disabled more than once, EnableInput still undoes one of the DisableInput
+                return self.input_disabled == 0
+            if action_name == "ShowMenu":
+                # Showing the menu again would only disable the input once more
+                return self.menu_shown is True
+            if action_name == "HideMenu":
+                return self.menu_shown is False and self.input_disabled == 0
+            if action_name == "ShowDialog":
+                return self.dialog_shown is True
+            if action_name == "HideDialog":
+                return self.dialog_shown is False and self.input_disabled == 0
+            if action_name == "SetTitle":
+                return self.title is not None and list(parameters) == self.title
+            if action_name == "SetCameraFocus":
+                return self.camera_focus is not None and list(parameters) == self.camera_focus
+            if action_name == "EnableIcon" and len(parameters) >= 3:
+                return self.icons.get((parameters[0], parameters[2])) == list(parameters)
+            if action_name == "DisableIcon" and len(parameters) >= 2:
+                return self.icons.get((parameters[0], parameters[1])) is False
+            return False
+
+    def apply(self, action_name : str, parameters : list):
+        """
+        This method is used to update the state with a command sent to Camelot.
+
+        Parameters
+        ----------
+        action_name : str
+            The name of the action.
+        parameters : list
+            The parameters of the action.
+        """
+        with self._lock:
+            if action_name in ("ShowMenu", "ShowDialog"):
+                if action_name == "ShowMenu":
+                    self.menu_shown = True
+                else:
+                    self.dialog_shown = True
+                if self.input_disabled is not None:
+                    self.input_disabled += 1
+            elif action_name in ("HideMenu", "HideDialog"):
+                if action_name == "HideMenu":
+                    self.menu_shown = False
+                else:
+                    self.dialog_shown = False
+                if self.input_disabled is not None:
+                    self.input_disabled = max(self.input_disabled - 1, 0)
+            elif action_name == "EnableInput":
+                if self.input_disabled is not None:
+                    self.input_disabled = max(self.input_disabled - 1, 0)
+            elif action_name == "DisableInput":
+                if self.input_disabled is not None:
+                    self.input_disabled += 1
+            elif action_name == "SetTitle":
+                self.title = list(parameters)
+            elif action_name == "SetCameraFocus":
+                self.camera_focus = list(parameters)
+            elif action_name == "EnableIcon" and len(parameters) >= 3:
+                self.icons[(parameters[0], parameters[2])] = list(parameters)
+            elif action_name == "DisableIcon" and len(parameters) >= 2:
+                self.icons[(parameters[0], parameters[1])] = False
+
+    def invalidate(self, action_name : str, parameters : list = None):
+        """
+        This method is used to forget the part of the state changed by an action, e.g. because the command failed
+        or because the player changed it from Camelot.
+
+        Parameters
+        ----------
+        action_name : str
+            The name of the action.
+        parameters : list (Optional)
+            The parameters of the action. If None, every icon is forgotten for EnableIcon and DisableIcon.
+        """
+        logging.debug("CamelotUIState: state of %s not known anymore" % action_name)
+        with self._lock:
+            if action_name in ("ShowMenu", "HideMenu"):
+                self.menu_shown = None
+                self.input_disabled = None
+            elif action_name in ("ShowDialog", "HideDialog"):
+                self.dialog_shown = None
+                self.input_disabled = None
+            elif action_name in ("EnableInput", "DisableInput"):
+                self.input_disabled = None
+            elif action_name == "SetTitle":
+                self.title = None
+            elif action_name == "SetCameraFocus":
+                self.camera_focus = None
+            elif action_name in ("EnableIcon", "DisableIcon"):
+                if parameters is None:
+                    self.icons = {}
+                elif action_name == "EnableIcon" and len(parameters) >= 3:
+                    self.icons.pop((parameters[0], parameters[2]), None)
+                elif action_name == "DisableIcon" and len(parameters) >= 2:
+                    self.icons.pop((parameters[0], parameters[1]), None)
@@ -6,11 +6,13 @@ from ev_pddl.relation import Relation
 from ev_pddl.entity import Entity
 try:
     from camelot_action import CamelotAction
-    from utilities import parse_json
+    from utilities import parse_json, split_instruction
+    from precondition_compiler import get_precondition_compiler, WorldStateIndex
     import shared_variables
 except (ModuleNotFoundError, ImportError):
     from .camelot_action import CamelotAction
-    from .utilities import parse_json    
+    from .utilities import parse_json, split_instruction
+    from .precondition_compiler import get_precondition_compiler, WorldStateIndex
     from . import shared_variables
 from ev_pddl.domain import Domain
 from ev_pddl.world_state import WorldState
@@ -18,7 +20,6 @@ import random
 import logging
 import debugpy
 import copy
-import re
 import random
 
 
@@ -81,6 +82,9 @@ class CamelotWorldState:
         self._wait_for_actions = wait_for_actions
         self.problem = problem
         self.current_room = ""
+        self._precondition_compiler = get_precondition_compiler(shared_variables.get_domain_and_problem_path()[0])
+        # Index of the world state used by the compiled preconditions, updated with the changes of the world state
+        self._state_index = None
         #logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.DEBUG)
 
     def _create_world_state(self) -> WorldState:
@@ -132,6 +136,7 @@ class CamelotWorldState:
             self._create_camelot_action_from_relation(item)
         
         self.world_state = self._create_world_state()
+        self._state_index = None
 
     def _create_camelot_action_from_relation(self, relation):
         """A method that is used to create camelot actions from a relation.
@@ -363,91 +368,11 @@ class CamelotWorldState:
         message_parts = message.split(' ')
         
         if message_parts[0] == 'input':
-            # example of message to parse: "input arrived bob position alchemyshop.Door"
-            # I exclude the messages with "at"
-            if message_parts[1] == "arrived" and message_parts[3] == "position":
+            if self._is_location_message(message_parts):
                 new_world_state = copy.deepcopy( self.world_state )
-                character = new_world_state.find_entity(name = message_parts[2])
-                if character is None:
-                    logging.error("Character %s not found in the world state" % message_parts[2])
-                    raise Exception("Character %s not found in the problem" % message_parts[2])
-
-                # Exclude messages like "input arrived bob position luca" where the position is a character
-                location_entity = new_world_state.find_entity(name = message_parts[4])
-                if location_entity is not None and location_entity.type.name == "character":
-                    return changed_relations
-
-                location_parts = message_parts[4].split('.')
-
-                relations_at = new_world_state.get_entity_relations(character, 
-                                                                    predicates= [shared_variables.supported_predicates['at']], 
-                                                                    value_list= [RelationValue.PENDING_FALSE, RelationValue.PENDING_TRUE, RelationValue.TRUE])
-                # The character is nowhere, so we add the relation with the new position
-                if len(relations_at) == 0:
-                    changed_relations.append(self._create_and_add_relation_for_location(new_world_state, character, message_parts[4], shared_variables.supported_predicates['at']))
-                    # Check if the room is different from the current room, if true we change the relation IN
-                    if location_parts[0] != self.current_room:
-                        self._change_relation_in_location(new_world_state, character, changed_relations, location_parts[0])
-                else:
-                    for relation_at in relations_at:
-                        entity = relation_at.find_entity_with_type(entity_type = shared_variables.supported_types['position'])
-                        entity_parts = entity.name.split('.')
-                        if self.current_room == "":
-                            self.current_room = entity_parts[0]
-                        # we change relations because actions can be used from the EM to sent what to do to the platform. 
-                        # location_parts can be size 2 or 3 based on the position of the room. We summarize here the conditions where we have to apply the chages of the relations.
-                        evaluate_location = False
-                        if len(location_parts) == 2:
-                            # Same room, different position within the room
-                            if location_parts[0] == entity_parts[0] and location_parts[1] != entity_parts[1]:
-                                evaluate_location = True
-                        elif len(location_parts) == 3:
-                            # If we don't have the last part of the specific position within the room, we have to add the relation
-                            if len(entity_parts) == 2:
-                                evaluate_location = True
-                            # Same room, different position within the room or different specific position within the room e.g. "alchemyshop.Table.Right" != "alchemyshop.Table.Left"
-                            elif location_parts[0] == entity_parts[0] and (location_parts[1] != entity_parts[1] or location_parts[2] != entity_parts[2]):
-                                evaluate_location = True
-                        
-                        if evaluate_location:
-                            # We add a new relation with the new position of the character
-                            changed_relations.append(self._create_and_add_relation_for_location(new_world_state, character, message_parts[4], shared_variables.supported_predicates['at']))
-
-                        # Different primary location (room)
-                        elif entity_parts[0] != location_parts[0]:
-                            relation_in = new_world_state.get_entity_relations(character, 
-                                                                            predicates= [shared_variables.supported_predicates['in']], 
-                                                                            value_list= [RelationValue.PENDING_FALSE, RelationValue.PENDING_TRUE, RelationValue.TRUE])
-
-                            # Now we need to change the relation at in the old room to false since the character is in a different room
-                            for relation_at in relations_at:
-                                changed_relations.append(self._modify_relation_value(relation_at, RelationValue.FALSE))
-                            
-                            # Add new relation AT to change position in the new room
-                            changed_relations.append(self._create_and_add_relation_for_location(new_world_state, character, message_parts[4], shared_variables.supported_predicates['at']))
-
-                            self._change_relation_in_location(new_world_state, character, changed_relations, location_parts[0])
-                            #Changed room, so we don't need to evaluate other at predicates
-                            break
-                self.world_state = copy.deepcopy(new_world_state)
-
-
-            # example of message to parse: "input exited bob position alchemyshop.Door.In"
-            elif message_parts[1] == "exited" and message_parts[3] == "position":
-                new_world_state = copy.deepcopy( self.world_state )
-
-                character = new_world_state.find_entity(name = message_parts[2])
-                if character is None:
-                    logging.error("Character %s not found in the world state" % message_parts[2])
-                    raise Exception("Character %s not found in the problem" % message_parts[2])
-                    
-                location_entity = new_world_state.find_entity(name = message_parts[4])
-
-                relation_at = new_world_state.find_relation(Relation(shared_variables.supported_predicates['at'], [character, location_entity], RelationValue.TRUE))
-                if relation_at is not None:
-                    changed_relations.append(self._modify_relation_value(relation_at, RelationValue.FALSE))
-
-                self.world_state = copy.deepcopy(new_world_state)
+                if self._apply_location_message(new_world_state, message_parts, changed_relations):
+                    self.world_state = copy.deepcopy(new_world_state)
+                    self._update_state_index(changed_relations)
         elif message_parts[0] == 'succeeded':
             remove_succedeed = len("succeeded ")
             message_parts = message[remove_succedeed:].replace("(", "|").replace(")", "").replace(",", "|").replace(" ", "").split("|")
@@ -472,8 +397,159 @@ class CamelotWorldState:
                     
                     action = Action(action_definition, parameters)
                     changed_relations.append(self.world_state.apply_action(action , check_action_can_apply=False))
+            self._update_state_index(changed_relations)
+        return changed_relations
+
+    def apply_camelot_location_messages(self, messages: list) -> list:
+        """
+        This method applies a batch of location messages from Camelot in one pass, copying the world state once for the whole batch.
+        A message that can't be applied is logged and skipped, the others are still applied. If it fails after changing some relations,
+        these changes stay in the world state and are returned too, so that the world state, its index and the changes published agree.
+
+        Parameters
+        ----------
+        messages : list
+            The location messages, in the order they have been received (e.g. "input arrived bob position alchemyshop.Door").
+
+        Returns
+        -------
+        list ( tuple )
+            The changed relations of all the messages, in the same format as apply_camelot_message.
+        """
+        changed_relations = []
+        new_world_state = None
+        for message in messages:
+            message_parts = message.split(' ')
+            if not self._is_location_message(message_parts):
+                continue
+            if new_world_state is None:
+                new_world_state = copy.deepcopy( self.world_state )
+            message_changed_relations = []
+            try:
+                self._apply_location_message(new_world_state, message_parts, message_changed_relations)
+            except Exception as inst:
+                if len(message_changed_relations) == 0:
+                    logging.exception("CamelotWorldState: location message \"%s\" not applied: %s" % (message, inst))
+                else:
+                    logging.exception("CamelotWorldState: location message \"%s\" applied in part, %d relations changed: %s" % (message, len(message_changed_relations), inst))
+            # Each change is appended right after it is made to the world state, so also a part of a message is kept in step
+            changed_relations.extend(message_changed_relations)
+        if new_world_state is not None:
+            self.world_state = new_world_state
+            self._update_state_index(changed_relations)
         return changed_relations
 
+    def _is_location_message(self, message_parts: list) -> bool:
+        """
+        This method is used to check if a message from Camelot is a location message that changes the world state.
+
+        Parameters
+        ----------
+        message_parts : list
+            The message split on spaces, e.g. ["input", "arrived", "bob", "position", "alchemyshop.Door"].
+        """
+        return len(message_parts) >= 5 and message_parts[0] == 'input' and message_parts[1] in ("arrived", "exited") and message_parts[3] == "position"
+
+    def _apply_location_message(self, new_world_state: WorldState, message_parts: list, changed_relations: list) -> bool:
+        """
+        This method applies a location message from Camelot to a copy of the world state.
+
+        Parameters
+        ----------
+        new_world_state : WorldState
+            The copy of the world state the message is applied to.
+        message_parts : list
+            The message split on spaces.
+        changed_relations : list
+            The list the changed relations are appended to.
+
+        Returns
+        -------
+        bool
+            True if the message has been applied, False if it has been ignored.
+        """
+        # example of message to parse: "input arrived bob position alchemyshop.Door"
+        # I exclude the messages with "at"
+        if message_parts[1] == "arrived" and message_parts[3] == "position":
+            character = new_world_state.find_entity(name = message_parts[2])
+            if character is None:
+                logging.error("Character %s not found in the world state" % message_parts[2])
+                raise Exception("Character %s not found in the problem" % message_parts[2])
+
+            # Exclude messages like "input arrived bob position luca" where the position is a character
+            location_entity = new_world_state.find_entity(name = message_parts[4])
+            if location_entity is not None and location_entity.type.name == "character":
+                return False
+
+            location_parts = message_parts[4].split('.')
+
+            relations_at = new_world_state.get_entity_relations(character, 
+                                                                predicates= [shared_variables.supported_predicates['at']], 
+                                                                value_list= [RelationValue.PENDING_FALSE, RelationValue.PENDING_TRUE, RelationValue.TRUE])
+            # The character is nowhere, so we add the relation with the new position
+            if len(relations_at) == 0:
+                changed_relations.append(self._create_and_add_relation_for_location(new_world_state, character, message_parts[4], shared_variables.supported_predicates['at']))
+                # Check if the room is different from the current room, if true we change the relation IN
+                if location_parts[0] != self.current_room:
+                    self._change_relation_in_location(new_world_state, character, changed_relations, location_parts[0])
+            else:
+                for relation_at in relations_at:
+                    entity = relation_at.find_entity_with_type(entity_type = shared_variables.supported_types['position'])
+                    entity_parts = entity.name.split('.')
+                    if self.current_room == "":
+                        self.current_room = entity_parts[0]
+                    # we change relations because actions can be used from the EM to sent what to do to the platform. 
+                    # location_parts can be size 2 or 3 based on the position of the room. We summarize here the conditions where we have to apply the chages of the relations.
+                    evaluate_location = False
+                    if len(location_parts) == 2:
+                        # Same room, different position within the room
+                        if location_parts[0] == entity_parts[0] and location_parts[1] != entity_parts[1]:
+                            evaluate_location = True
+                    elif len(location_parts) == 3:
+                        # If we don't have the last part of the specific position within the room, we have to add the relation
+                        if len(entity_parts) == 2:
+                            evaluate_location = True
+                        # Same room, different position within the room or different specific position within the room e.g. "alchemyshop.Table.Right" != "alchemyshop.Table.Left"
+                        elif location_parts[0] == entity_parts[0] and (location_parts[1] != entity_parts[1] or location_parts[2] != entity_parts[2]):
+                            evaluate_location = True
+                    
+                    if evaluate_location:
+                        # We add a new relation with the new position of the character
+                        changed_relations.append(self._create_and_add_relation_for_location(new_world_state, character, message_parts[4], shared_variables.supported_predicates['at']))
+
+                    # Different primary location (room)
+                    elif entity_parts[0] != location_parts[0]:
+                        relation_in = new_world_state.get_entity_relations(character, 
+                                                                        predicates= [shared_variables.supported_predicates['in']], 
+                                                                        value_list= [RelationValue.PENDING_FALSE, RelationValue.PENDING_TRUE, RelationValue.TRUE])
+
+                        # Now we need to change the relation at in the old room to false since the character is in a different room
+                        for relation_at in relations_at:
+                            changed_relations.append(self._modify_relation_value(relation_at, RelationValue.FALSE))
+                        
+                        # Add new relation AT to change position in the new room
+                        changed_relations.append(self._create_and_add_relation_for_location(new_world_state, character, message_parts[4], shared_variables.supported_predicates['at']))
+
+                        self._change_relation_in_location(new_world_state, character, changed_relations, location_parts[0])
+                        #Changed room, so we don't need to evaluate other at predicates
+                        break
+
+
+        # example of message to parse: "input exited bob position alchemyshop.Door.In"
+        elif message_parts[1] == "exited" and message_parts[3] == "position":
+
+            character = new_world_state.find_entity(name = message_parts[2])
+            if character is None:
+                logging.error("Character %s not found in the world state" % message_parts[2])
+                raise Exception("Character %s not found in the problem" % message_parts[2])
+                
+            location_entity = new_world_state.find_entity(name = message_parts[4])
+
+            relation_at = new_world_state.find_relation(Relation(shared_variables.supported_predicates['at'], [character, location_entity], RelationValue.TRUE))
+            if relation_at is not None:
+                changed_relations.append(self._modify_relation_value(relation_at, RelationValue.FALSE))
+        return True
+
     def _change_relation_in_location(self, new_world_state: WorldState, character: Entity, changed_relations: list, location: str):
         """
         Change the relation in the location of the character. This method is used to semplifiy the code.
@@ -581,24 +657,43 @@ class CamelotWorldState:
             The message that will be used to create the action
         """
         # for debugging: openfurniture(bob, alchemyshop.Chest, alchemyshop.Chest)
-        message_parts = re.split(r"\(|\)|,", message)
-        action_name = message_parts[0]
+        action_name, arguments = split_instruction(message)
+        return self.create_action(action_name, arguments)
+
+    def create_action(self, action_name : str, arguments : list):
+        """This method is used to create an action from its name and the names of its arguments, e.g. an instruction of an encounter
+        already split when the encounter was loaded.
+
+        Parameters
+        ----------
+        action_name : str
+            The name of the action, e.g. "openfurniture"
+        arguments : list
+            The names of the entities passed as parameters, in the order of the parameters of the action
+
+        Returns
+        -------
+        Action
+            The action, or None if the action is not in the domain.
+        """
         action_definition = self.domain.find_action_with_name(action_name)
         if action_definition is None:
             logging.error("GameController: PDDL action \"%s\" not found in domain" %( action_name ))
             return
+        if len(arguments) < len(action_definition.parameters):
+            raise ValueError("PDDL action %s expects %d parameters" % (action_name, len(action_definition.parameters)))
         parameters = {}
         if action_name.startswith("instantiate_"):
             for i in range(len(action_definition.parameters)):
                 if action_definition.parameters[i].type.name == "item":
-                    item = Entity(name=message_parts[i+1] + str(random.randint(0,100)), type_e=action_definition.parameters[i].type)
+                    item = Entity(name=arguments[i] + str(random.randint(0,100)), type_e=action_definition.parameters[i].type)
                     self.world_state.add_entity(item)
                     parameters[action_definition.parameters[i].name] = item
                 else:
-                    parameters[action_definition.parameters[i].name] = self.world_state.find_entity(name = message_parts[i+1], type=action_definition.parameters[i].type)
+                    parameters[action_definition.parameters[i].name] = self.world_state.find_entity(name = arguments[i], type=action_definition.parameters[i].type)
         else:
             for i in range(len(action_definition.parameters)):
-                parameters[action_definition.parameters[i].name] = self.world_state.find_entity(name = message_parts[i+1], type=action_definition.parameters[i].type)
+                parameters[action_definition.parameters[i].name] = self.world_state.find_entity(name = arguments[i], type=action_definition.parameters[i].type)
         return Action(action_definition, parameters=parameters)
 
     def apply_action(self, action: Action):
@@ -614,11 +709,121 @@ class CamelotWorldState:
         list
             A list of relations that are added or changed in the world state.
         """
+        changed_relations = self._apply_action_to_world_state(action)
+        self._update_state_index(changed_relations)
+        return changed_relations
+
+    def _apply_action_to_world_state(self, action: Action) -> list:
+        """This method is used to apply an action to the world state, without updating its index.
+        """
         changed_relations = self.world_state.apply_action(action)
         if action.name.startswith("instantiate_"):
             changed_relations.insert(0, ('new_entity', action.parameters['?obj']))
         return changed_relations
     
+    def apply_action_speculatively(self, action: Action) -> tuple:
+        """This method is used to apply an action to the world state before Camelot confirmed it, keeping what is needed to undo it.
+        The undo record keeps only whether each relation changed by the action was true before it, read from the index of the
+        world state, so that no copy of the world state is made.
+
+        Parameters
+        ----------
+        action : Action
+            The action that will be applied
+
+        Returns
+        -------
+        tuple
+            The list of relations that are added or changed in the world state, as returned by apply_action, and the undo record to pass to rollback.
+        """
+        index = self.get_state_index()
+        changed_relations = self._apply_action_to_world_state(action)
+        previous_values = {}
+        for item in changed_relations:
+            if type(item) == tuple and len(item) == 2 and type(item[1]) == Relation:
+                atom = (item[1].predicate.name,) + tuple(entity.name for entity in item[1].entities)
+                previous_values.setdefault(atom, atom in index.facts)
+        self._update_state_index(changed_relations)
+        undo_record = {"changed_relations": changed_relations, "previous_values": previous_values}
+        return changed_relations, undo_record
+
+    def rollback(self, undo_record: dict) -> list:
+        """This method is used to undo an action applied with apply_action_speculatively.
+        The relations changed by the action get back the value they had before it (true or false), so a later change of the same
+        relations is undone too; the other relations are not touched. An entity created by the action stays in the world state,
+        with none of its relations true.
+
+        Parameters
+        ----------
+        undo_record : dict
+            The undo record returned by apply_action_speculatively.
+
+        Returns
+        -------
+        list
+            A list of tuples ("changed_value", relation) that give back to the relations changed by the action their previous value;
+            the relations added by the action are set to false.
+        """
+        previous_values = undo_record["previous_values"]
+        compensating_relations = []
+        for item in undo_record["changed_relations"]:
+            if type(item) != tuple or len(item) != 2 or type(item[1]) != Relation:
+                continue
+            atom = (item[1].predicate.name,) + tuple(entity.name for entity in item[1].entities)
+            if atom not in previous_values:
+                continue
+            relation = self.world_state.find_relation(item[1])
+            if relation is None:
+                logging.error("CamelotWorldState: relation %s not found, not rolled back" % str(atom))
+                continue
+            previous_value = RelationValue.TRUE if previous_values.pop(atom) else RelationValue.FALSE
+            compensating_relations.append(self._modify_relation_value(relation, previous_value))
+        self._update_state_index(compensating_relations)
+        return compensating_relations
+
+    def _update_state_index(self, changed_relations: list):
+        """This method is used to update the index of the world state with the relations changed, if the index has been created.
+        """
+        if self._state_index is not None:
+            self._state_index.apply_changes(changed_relations)
+
+    def get_state_index(self) -> WorldStateIndex:
+        """This method is used to get the index of the world state used by the compiled preconditions.
+        The index is created the first time it is needed; after that it is updated with the changes.
+        """
+        if self._state_index is None:
+            self._state_index = WorldStateIndex.from_world_state(self.world_state, self._precondition_compiler.type_parents)
+        return self._state_index
+
+    def check_action_preconditions(self, action: Action) -> bool:
+        """This method is used to check the preconditions of an action with the compiled evaluator of the action.
+        If the action is not in the domain file, check_action_can_apply is used.
+
+        Parameters
+        ----------
+        action : Action
+            The action that will be checked
+
+        Returns
+        -------
+        bool
+            True if the preconditions are satisfied, False otherwise
+        """
+        if action.name not in self._precondition_compiler.evaluators:
+            return self.check_action_can_apply(action)
+        arguments = {name: entity.name for name, entity in action.parameters.items()}
+        return self._precondition_compiler.evaluate_action(action.name, self.get_state_index(), arguments)
+
+    def check_formula(self, formula: str) -> bool:
+        """This method is used to check a PDDL formula without variables against the world state, e.g. the preconditions of an encounter.
+
+        Parameters
+        ----------
+        formula : str
+            The formula, e.g. "(and (in father Tavern) (alive father))".
+        """
+        return self._precondition_compiler.compile_formula(formula)(self.get_state_index())
+
     def check_action_can_apply(self, action: Action):
         """This method is used to check if an action can be applied.
 
@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import deque
+
+
+class CommandPriority:
+    """
+    This class contains the priority classes of the commands sent to Camelot, from the most urgent.
+    """
+
+    # Responses to the player, e.g. HideMenu, EnableInput, SetDialog
+    UI = 0
+    # Actions of the characters and of the encounters
+    GAMEPLAY = 1
+    # Scene setup, e.g. CreateCharacter, SetClothing
+    BACKGROUND = 2
+
+    NAMES = {UI: "ui", GAMEPLAY: "gameplay", BACKGROUND: "background"}
+
+
+class PrioritizedCommandQueue:
+    """
+    This class is the queue of the commands waiting to be sent to Camelot.
+    The command taken is the oldest of the most urgent priority class; the commands of the same class keep their order.
+    To avoid starvation, a command that has waited more than the max_wait of its class is taken before the commands of the
+    more urgent classes.
+    Only the reorderable commands can be taken out of the order they were added: the ones whose sender waits for the reply
+    of Camelot before sending anything else (CamelotAction.action with wait=True), so no command they depend on can still be
+    in the queue. Any other command (e.g. sent with wait=False, a raw instruction, %PASS%) keeps its place: it is taken only
+    when it is the oldest command in the queue, and no command added after it is taken before it.
+
+    Attributes
+    ----------
+    max_wait : dict
+        Seconds after which a command of each priority class is taken whatever its priority. None means never.
+    """
+
+    def __init__(self, max_wait : dict = None):
+        self.max_wait = {CommandPriority.UI: None, CommandPriority.GAMEPLAY: 0.5, CommandPriority.BACKGROUND: 2.0}
+        if max_wait is not None:
+            self.max_wait.update(max_wait)
+        # Tuples (sequence number, time, command) waiting, for each priority class
+        self._queues = {priority: deque() for priority in CommandPriority.NAMES}
+        # Sequence numbers of the commands waiting that are not reorderable, in order
+        self._ordered = deque()
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._sent = {priority: 0 for priority in CommandPriority.NAMES}
+        self._total_wait = {priority: 0.0 for priority in CommandPriority.NAMES}
+        self._max_wait_seen = {priority: 0.0 for priority in CommandPriority.NAMES}
+        self._promoted = 0
+
+    def put(self, command : str, priority : int = CommandPriority.GAMEPLAY, reorderable : bool = False):
+        """
+        This method is used to add a command to the queue.
+
+        Parameters
+        ----------
+        command : str
+            The command.
+        priority : int, default - CommandPriority.GAMEPLAY
+            The priority class of the command.
+        reorderable : bool, default - False
+            True only if the sender waits for the reply of Camelot to this command before sending other commands.
+        """
+        with self._condition:
+            self._queues[priority].append((self._sequence, time.perf_counter(), command))
+            if not reorderable:
+                self._ordered.append(self._sequence)
+            self._sequence += 1
+            self._condition.notify()
+
+    def get(self) -> str:
+        """
+        This method is used to take the next command to send, waiting for one if the queue is empty.
+
+        Returns
+        -------
+        str
+            The command.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: any(len(commands) > 0 for commands in self._queues.values()))
+            now = time.perf_counter()
+            heads = {candidate: commands[0] for candidate, commands in self._queues.items() if len(commands) > 0}
+            oldest = min(heads, key=lambda candidate: heads[candidate][0])
+            priority = None
+            if len(self._ordered) > 0 and heads[oldest][0] == self._ordered[0]:
+                # A command that is not reorderable is sent as soon as it is the oldest
+                priority = oldest
+                self._ordered.popleft()
+            else:
+                # Only the commands added before the oldest command that is not reorderable can be taken
+                if len(self._ordered) > 0:
+                    heads = {candidate: head for candidate, head in heads.items() if head[0] < self._ordered[0]}
+                # The command that waited the longest among the ones over the max_wait of their class
+                for candidate, head in heads.items():
+                    if self.max_wait[candidate] is not None and now - head[1] > self.max_wait[candidate]:
+                        if priority is None or head[1] < heads[priority][1]:
+                            priority = candidate
+                if priority is not None and any(other < priority for other in heads):
+                    self._promoted += 1
+                if priority is None:
+                    priority = min(heads)
+            _, enqueued_at, command = self._queues[priority].popleft()
+            wait = now - enqueued_at
+            self._sent[priority] += 1
+            self._total_wait[priority] += wait
+            self._max_wait_seen[priority] = max(self._max_wait_seen[priority], wait)
+            return command
+
+    def qsize(self) -> int:
+        """
+        This method is used to get the number of commands waiting.
+        """
+        with self._condition:
+            return sum(len(commands) for commands in self._queues.values())
+
+    def get_metrics(self) -> dict:
+        """
+        This method is used to get the metrics of each priority class.
+
+        Returns
+        -------
+        dict
+            Keyed by the name of the priority class: "depth": commands waiting; "sent": commands taken;
+            "mean_wait" and "max_wait": seconds the commands taken waited in the queue.
+            "promoted": commands taken before more urgent ones because they waited too long.
+        """
+        with self._condition:
+            metrics = {}
+            for priority, name in CommandPriority.NAMES.items():
+                metrics[name] = {
+                    "depth": len(self._queues[priority]),
+                    "sent": self._sent[priority],
+                    "mean_wait": self._total_wait[priority] / self._sent[priority] if self._sent[priority] > 0 else 0.0,
+                    "max_wait": self._max_wait_seen[priority],
+                }
+            metrics["promoted"] = self._promoted
+            return metrics
@@ -0,0 +1,49 @@
+import os
+
+
+class ContentWatcher:
+    """
+    This class is used to find the files of a directory that have been added, changed or removed since the last time it was checked.
+    The directory is polled comparing the modification time and the size of the files, so that it works on every platform without
+    other packages.
+    """
+
+    def __init__(self, directory : str, extension : str):
+        """
+        Parameters
+        ----------
+        directory : str
+            The path of the directory.
+        extension : str
+            The extension of the files watched, e.g. ".json".
+        """
+        self.directory = directory
+        self.extension = extension
+        self._signatures = self._scan()
+
+    def _scan(self) -> dict:
+        """
+        This method is used to get the (modification time, size) of each file watched, keyed by the name of the file without extension.
+        """
+        signatures = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(self.extension):
+                    stat = entry.stat()
+                    signatures[entry.name.removesuffix(self.extension)] = (stat.st_mtime_ns, stat.st_size)
+        return signatures
+
+    def poll(self) -> tuple:
+        """
+        This method is used to check the directory.
+
+        Returns
+        -------
+        tuple
+            The names (without extension) of the files added or changed and the names of the files removed since the last call.
+        """
+        signatures = self._scan()
+        changed = sorted(name for name, signature in signatures.items() if self._signatures.get(name) != signature)
+        removed = sorted(name for name in self._signatures if name not in signatures)
+        self._signatures = signatures
+        return changed, removed
@@ -4,6 +4,9 @@ from yarnrunner_python import YarnRunner
 import debugpy
 import shlex
 import os
+import io
+import shutil
+import tempfile
 import jsonpickle
 try:
     from platform_IO_communication import PlatformIOCommunication
@@ -14,8 +17,7 @@ class Conversation:
 
     def __init__(self, name : str, filename : str) -> None:
         self.name = name
-        command = "ysc compile "+filename+" -o output -n "+ filename.replace(".yarn", ".yarnc") +" -t " + filename.replace(".yarn", ".csv")
-        subprocess.run(shlex.split(command), stdout=subprocess.PIPE)
+        self._compiled_story, self._compiled_strings = self._compile(filename)
         self._running = False
         self._prepared = False
         self.runner = None
@@ -23,6 +25,40 @@ class Conversation:
         self.npc_name = None
         self._platform_communication = PlatformIOCommunication()
     
+    def _compile(self, filename : str) -> tuple:
+        """
+        This method is used to compile the yarn file of the conversation with ysc.
+        The compiled program is kept in memory, so that a conversation is not affected when the file is compiled again;
+        a copy is also written in narrative/output.
+
+        Parameters
+        ----------
+        filename : str
+            The name of the yarn file in the narrative directory.
+
+        Returns
+        -------
+        tuple
+            The compiled story (bytes) and the strings (str).
+        """
+        narrative_path = os.path.join(os.path.dirname(__file__), 'narrative')
+        story_filename = filename.replace(".yarn", ".yarnc")
+        strings_filename = filename.replace(".yarn", ".csv")
+        with tempfile.TemporaryDirectory(dir=narrative_path) as output_path:
+            command = "ysc compile "+filename+" -o "+os.path.basename(output_path)+" -n "+ story_filename +" -t " + strings_filename
+            subprocess.run(shlex.split(command), stdout=subprocess.PIPE, cwd=narrative_path)
+            try:
+                with open(os.path.join(output_path, story_filename), 'rb') as story_f:
+                    compiled_story = story_f.read()
+                with open(os.path.join(output_path, strings_filename), 'r') as strings_f:
+                    compiled_strings = strings_f.read()
+            except FileNotFoundError:
+                raise Exception("Conversation %s: %s not compiled by ysc." % (self.name, filename))
+            os.makedirs(os.path.join(narrative_path, 'output'), exist_ok=True)
+            for compiled_filename in (story_filename, strings_filename):
+                shutil.copyfile(os.path.join(output_path, compiled_filename), os.path.join(narrative_path, 'output', compiled_filename))
+        return compiled_story, compiled_strings
+
     def prepare(self, player_name : str, npc_name : str):
         """
         This method is used to prepare the conversation for execution.
@@ -34,14 +70,12 @@ class Conversation:
         npc_name : str
             The name of the npc.
         """
-        with open(os.path.join(os.path.dirname(__file__),'narrative/output/'+self.name+'.yarnc'), 'rb') as story_f:
-            with open(os.path.join(os.path.dirname(__file__),'narrative/output/'+self.name+'.csv'), 'r') as strings_f:
-                self.runner = YarnRunner(story_f, strings_f, autostart=False)
+        self.runner = YarnRunner(io.BytesIO(self._compiled_story), io.StringIO(self._compiled_strings), autostart=False)
 
         def update_player_model(fighter, method_actor, storyteller, tactician, power_gamer):
             logging.info("Updating player model with paramenters: {}, {}, {}, {}, {}".format(fighter, method_actor, storyteller, tactician, power_gamer))
             message = jsonpickle.encode(('update_player_model', str((fighter, method_actor, storyteller, tactician, power_gamer))))
-            self._platform_communication.send_message(message)
+            self._platform_communication.send_message_async(message)
 
         
         self.runner.add_command_handler("update_player_model", update_player_model)
@@ -3,6 +3,7 @@ import glob
 import subprocess
 import os
 import shlex
+import logging
 try:
     from camelot_action import CamelotAction
     from conversation import Conversation
@@ -29,16 +30,38 @@ class ConversationController:
         os.chdir(initial_path)
         
         self.runners = {}
+        # Conversations currently active, keyed by the name of the NPC involved.
+        self._active_conversations = {}
+        # NPC of the conversation currently shown in the Camelot dialog window.
+        self._current_npc = None
         self._camelot_action = CamelotAction()
     
-    def get_running_conversation(self) -> Conversation:
+    def get_running_conversation(self, npc_name : str = None) -> Conversation:
         """
         This method is used to get the conversation that is currently running.
+        The lookup does not depend on the number of conversations loaded.
+
+        Parameters
+        ----------
+        npc_name : str (Optional)
+            The name of the NPC involved in the conversation. If None, the conversation currently shown in Camelot is returned.
         """
-        for key in self.conversations.keys():
-            if self.conversations[key].is_running():
-                return self.conversations[key]
+        if npc_name is None:
+            npc_name = self._current_npc
+        return self._active_conversations.get(npc_name)
     
+    def get_active_conversations(self) -> dict:
+        """
+        This method is used to get all the active conversations keyed by the name of the NPC involved.
+        """
+        return dict(self._active_conversations)
+    
+    def has_active_conversations(self) -> bool:
+        """
+        This method is used to know if a conversation is active with at least one NPC.
+        """
+        return len(self._active_conversations) > 0
+
     def check_conversation_exists(self, conversation_name : str):
         """
         This method is used to check if a conversation exists.
@@ -48,7 +71,52 @@ class ConversationController:
         conversation_name : str
             The name of the conversation to check if exists.
         """
-        return conversation_name in self.narrative_names
+        return conversation_name in self.conversations
+
+    def compile_conversations(self, conversation_names : list) -> dict:
+        """
+        This method is used to compile again the yarn files of some conversations, e.g. because they have been changed.
+        It does not change the conversations used by this controller, so it can be called from another thread; the conversations
+        compiled are then used after apply_reload.
+
+        Parameters
+        ----------
+        conversation_names : list
+            The names of the conversations, i.e. the names of their yarn files without extension.
+
+        Returns
+        -------
+        dict
+            The conversations compiled, keyed by name. A conversation that can't be compiled is logged and left out.
+        """
+        conversations = {}
+        for name in conversation_names:
+            try:
+                conversations[name] = Conversation(name, name + ".yarn")
+            except Exception as inst:
+                logging.error("ConversationController: conversation %s not reloaded: %s" % (name, inst))
+        return conversations
+
+    def apply_reload(self, conversations : dict, removed : list = ()):
+        """
+        This method is used to replace the conversations with the ones compiled by compile_conversations.
+        The conversations active keep running with the version they were started with.
+
+        Parameters
+        ----------
+        conversations : dict
+            The conversations compiled, keyed by name.
+        removed : list, default - ()
+            The names of the conversations whose yarn file has been removed.
+        """
+        updated = dict(self.conversations)
+        updated.update(conversations)
+        for name in removed:
+            updated.pop(name, None)
+        self.conversations = updated
+        self.narrative_names = list(updated)
+        self.narrative_filenames = [name + ".yarn" for name in updated]
+        logging.info("ConversationController: conversations reloaded %s, removed %s" % (sorted(conversations), sorted(removed)))
 
     def start_camelot_conversation(self, conversation_name : str, player_name: str, npc_name : str):
         """
@@ -59,15 +127,24 @@ class ConversationController:
         ----------
         conversation_name : str
             The name of the conversation to prepare Camelot for.
+        player_name : str
+            The name of the player.
+        npc_name : str
+            The name of the NPC involved in the conversation.
         """
-        self.conversations[conversation_name].prepare(player_name, npc_name)
+        conversation = self.conversations[conversation_name]
+        if any(active is conversation for npc, active in self._active_conversations.items() if npc != npc_name):
+            raise Exception("Conversation %s is already running with another NPC." % conversation_name)
+        conversation.prepare(player_name, npc_name)
+        self._active_conversations[npc_name] = conversation
+        self._current_npc = npc_name
         
         self._camelot_action.action("SetLeft", [player_name], True)
         self._camelot_action.action("SetRight", [npc_name], True)
-        self._prepare_and_send_camelot_setdialog_command(conversation_name)
+        self._prepare_and_send_camelot_setdialog_command(conversation)
         self._camelot_action.action("ShowDialog", [], True)
     
-    def continue_conversation_with_choice(self, choice : int):
+    def continue_conversation_with_choice(self, choice : int, npc_name : str = None):
         """
         This method is used to continue a conversation with a choice.
         It will create and send all the camelot commands to continue the execution of the conversation.
@@ -76,8 +153,10 @@ class ConversationController:
         ----------
         choice : int
             The choice to continue the conversation with.
+        npc_name : str (Optional)
+            The name of the NPC involved in the conversation. If None, the conversation currently shown in Camelot is used.
         """
-        running_conversation = self.get_running_conversation()
+        running_conversation = self.get_running_conversation(npc_name)
         running_conversation.choose(choice)
         self.continue_conversation(running_conversation=running_conversation)
     
@@ -94,29 +173,40 @@ class ConversationController:
         self._camelot_action.action("ClearDialog", [], False)
         if running_conversation is None:
             running_conversation = self.get_running_conversation()
-        self._prepare_and_send_camelot_setdialog_command(running_conversation.name)
+        self._prepare_and_send_camelot_setdialog_command(running_conversation)
     
-    def end_conversation(self):
+    def end_conversation(self, npc_name : str = None):
         """
         This method is used to end a conversation.
         It will create and send all the camelot commands to end the execution of the conversation.
+
+        Parameters
+        ----------
+        npc_name : str (Optional)
+            The name of the NPC involved in the conversation. If None, the conversation currently shown in Camelot is ended.
         """
+        if npc_name is None:
+            npc_name = self._current_npc
+        self._active_conversations.pop(npc_name, None)
+        if self._current_npc == npc_name:
+            # Fall back to the most recently started conversation that is still active
+            self._current_npc = next(reversed(self._active_conversations), None)
         self._camelot_action.action("HideDialog", [], True)
         self._camelot_action.action("EnableInput", [], True)
         self._camelot_action.action("ClearDialog", [], False)
 
         
-    def _prepare_and_send_camelot_setdialog_command(self, conversation_name : str):
+    def _prepare_and_send_camelot_setdialog_command(self, conversation : Conversation):
         """
         This method is used to prepare and send the camelot setdialog command.
         It will prepare the camelot setdialog command and send it to Camelot.
 
         Parameters
         ----------
-        conversation_name : str
-            The name of the conversation to prepare the camelot setdialog command for.
+        conversation : Conversation
+            The conversation to prepare the camelot setdialog command for.
         """
-        lines_of_dialog = self.conversations[conversation_name].get_camelot_setdialog_string()
+        lines_of_dialog = conversation.get_camelot_setdialog_string()
         for line_of_dialog in lines_of_dialog:
             self._camelot_action.action("SetDialog", [line_of_dialog], False)
         
@@ -1,3 +1,42 @@
+import time
+try:
+    from utilities import split_instruction
+except (ModuleNotFoundError, ImportError):
+    from .utilities import split_instruction
+
+
+class EncounterInstruction:
+    """
+    Class used to represent an instruction of an encounter, split when the encounter is loaded.
+
+    Attributes:
+    ----------
+    type : str
+        EncounterInstruction.CAMELOT for a Camelot action, EncounterInstruction.PDDL for a PDDL action.
+    command : str
+        The instruction as written in the encounter, e.g. "Face(arnell, annara)".
+    name : str
+        The name of the action, e.g. "Face".
+    arguments : tuple
+        The arguments of the action, e.g. ("arnell", "annara").
+    """
+
+    CAMELOT = "Camelot"
+    PDDL = "PDDL"
+
+    __slots__ = ("type", "command", "name", "arguments")
+
+    def __init__(self, instruction_type : str, command : str) -> None:
+        self.type = instruction_type
+        self.command = command
+        name, arguments = split_instruction(command)
+        self.name = name
+        self.arguments = tuple(arguments)
+
+    def __repr__(self) -> str:
+        return "EncounterInstruction(%s, %s)" % (self.type, self.command)
+
+
 class Encounter:
     """
     Class used to represent an encounter. 
@@ -10,6 +49,8 @@ class Encounter:
         The description of the encounter.
     metadata : dict
         The metadata of the encounter.
+    characters : frozenset
+        The characters used by the encounter, from the "characters" field or found in its instructions.
     """
 
     def __init__(self, json_data) -> None:
@@ -19,16 +60,26 @@ class Encounter:
         self.metadata = json_data['metadata']
         self.preconditions = json_data['preconditions']
         self._instructions = json_data['instructions']
+        self.instructions = [EncounterInstruction(instruction["type"], command)
+                             for instruction in self._instructions for command in instruction["commands"]]
         self._instructions_sent = []
+        # Index of the next instruction to execute
+        self.cursor = 0
+        # Characters used by the encounter; two encounters using the same character are not executed at the same time
+        self.characters = frozenset(json_data.get('characters', ()))
         self.started = False
         self.executed = False
+        self._started_at = None
+        self._finished_at = None
     
     def start_encounter(self):
         """
         Method used to start the encounter.
         """
         self.started = True
-        self.instructions_generator = self.get_generator_instruction()
+        self._started_at = time.perf_counter()
+        self._finished_at = None
+        self.cursor = 0
     
     def is_started(self) -> bool:
         """
@@ -46,24 +97,49 @@ class Encounter:
         Method used to finish the execution of the encounter.
         """
         self.executed = True
+        self._finished_at = time.perf_counter()
+
+    def get_wall_time(self) -> float:
+        """
+        Method used to get the seconds from the start of the encounter to the end of its execution, or to now if it is in execution.
+
+        Returns:
+        ----------
+        wall_time : float
+            The seconds, or None if the encounter has not been started.
+        """
+        if self._started_at is None:
+            return None
+        end = self._finished_at if self._finished_at is not None else time.perf_counter()
+        return end - self._started_at
     
-    def get_generator_instruction(self):
+    def peek_instruction(self) -> EncounterInstruction:
         """
-        Method used to get the instructions of the encounter. 
-        This function is a generator that returns the instructions one by one as a tuple (instruction_type, instruction_command).
+        Method used to get the next instruction of the encounter without moving the cursor.
 
         Returns:
         ----------
-        instruction : tuple
-            The instruction as a tuple (instruction_type, instruction_command).
+        instruction : EncounterInstruction
+            The instruction, or None if the encounter has no other instructions.
         """
-        if self.executed:
+        if self.executed or self.cursor >= len(self.instructions):
             return None
-        for instruction in self._instructions:
-            for command in instruction["commands"]:
-                return_instruction = (instruction["type"], command)
-                self._instructions_sent.append(return_instruction)
-                yield return_instruction
+        return self.instructions[self.cursor]
+
+    def next_instruction(self) -> EncounterInstruction:
+        """
+        Method used to get the next instruction of the encounter, moving the cursor to the following one.
+
+        Returns:
+        ----------
+        instruction : EncounterInstruction
+            The instruction, or None if the encounter has no other instructions.
+        """
+        instruction = self.peek_instruction()
+        if instruction is not None:
+            self.cursor += 1
+            self._instructions_sent.append(instruction)
+        return instruction
     
     def get_EM_message(self) -> str:
         """
@@ -0,0 +1,102 @@
+import logging
+try:
+    from precondition_compiler import WorldStateIndex, parse_sexpression
+except (ModuleNotFoundError, ImportError):
+    from .precondition_compiler import WorldStateIndex, parse_sexpression
+
+
+class EncounterAvailabilityEngine:
+    """
+    This class is used to know which encounters have their preconditions satisfied, updating it from the changed relations.
+    The preconditions are parsed once and an inverted index maps each relation to the encounters whose preconditions use it, so an
+    update evaluates again only the encounters that depend on the relations changed.
+
+    Attributes
+    ----------
+    available : set
+        The names of the encounters whose preconditions are satisfied.
+    """
+
+    def __init__(self, encounters : list, precondition_compiler, world_state):
+        """
+        Parameters
+        ----------
+        encounters : list
+            The encounters, e.g. EncountersController.encounters.
+        precondition_compiler : PreconditionCompiler
+            The compiler used for the preconditions.
+        world_state : WorldState
+            The current world state; after this the engine is updated only with the changed relations.
+        """
+        self._encounters = {encounter.name: encounter for encounter in encounters}
+        self._evaluators = {}
+        # Encounters keyed by the relation (predicate, entity, ...) they use, and by predicate for the relations with variables
+        self._by_relation = {}
+        self._by_predicate = {}
+        for encounter in encounters:
+            self._evaluators[encounter.name] = precondition_compiler.compile_formula(encounter.preconditions)
+            for atom in self._atoms(parse_sexpression(encounter.preconditions)[0]):
+                if any(term.startswith("?") for term in atom[1:]):
+                    self._by_predicate.setdefault(atom[0], set()).add(encounter.name)
+                else:
+                    self._by_relation.setdefault(atom, set()).add(encounter.name)
+        self._index = WorldStateIndex.from_world_state(world_state, precondition_compiler.type_parents)
+        self.available = {name for name, evaluator in self._evaluators.items() if evaluator(self._index)}
+        self.evaluations = len(self._evaluators)
+
+    def _atoms(self, formula : list) -> list:
+        """
+        This method is used to get the atoms of a formula, e.g. ("in", "father", "Tavern").
+        """
+        if formula[0] in ("and", "or", "not", "imply"):
+            return [atom for item in formula[1:] for atom in self._atoms(item)]
+        if formula[0] in ("forall", "exists"):
+            return self._atoms(formula[2])
+        if formula[0] == "=":
+            return []
+        return [tuple(formula)]
+
+    def update(self, changed_relations : list) -> tuple:
+        """
+        This method is used to update the availability of the encounters with the relations changed in the world state.
+
+        Parameters
+        ----------
+        changed_relations : list
+            The changed relations in the format of CamelotWorldState.apply_camelot_message, e.g. [("new", relation), ...].
+
+        Returns
+        -------
+        tuple
+            The sets of the names of the encounters that became available and of the ones that are not available anymore.
+        """
+        affected = set()
+        for atom in self._index.apply_changes(changed_relations):
+            affected |= self._by_relation.get(atom, set())
+            affected |= self._by_predicate.get(atom[0], set())
+        now_available = set()
+        not_available = set()
+        for name in affected:
+            self.evaluations += 1
+            if self._evaluators[name](self._index):
+                if name not in self.available:
+                    now_available.add(name)
+            elif name in self.available:
+                not_available.add(name)
+        self.available |= now_available
+        self.available -= not_available
+        if len(now_available) > 0 or len(not_available) > 0:
+            logging.debug("EncounterAvailabilityEngine: available %s, not available %s" % (now_available, not_available))
+        return now_available, not_available
+
+    def is_available(self, encounter_name : str) -> bool:
+        """
+        This method is used to know if the preconditions of an encounter are satisfied.
+        """
+        return encounter_name in self.available
+
+    def get_available_encounters(self) -> list:
+        """
+        This method is used to get the names of the encounters whose preconditions are satisfied and that have not been executed yet.
+        """
+        return sorted(name for name in self.available if not self._encounters[name].executed)
@@ -0,0 +1,135 @@
+import logging
+import time
+try:
+    from encounter import EncounterInstruction
+    import shared_variables
+except (ModuleNotFoundError, ImportError):
+    from .encounter import EncounterInstruction
+    from . import shared_variables
+
+
+class EncounterExecutor:
+    """
+    This class is used to execute the instructions of the encounters in execution, each from its own cursor.
+    In each pass of the main loop the encounters ready take turns, starting each time from a different one, and each executes one batch:
+    its consecutive Camelot instructions, up to and including the next PDDL instruction. The pause after a PDDL instruction lets the
+    main loop handle the changes it caused before the next instructions of the encounter.
+    A Camelot instruction waits for the reply of Camelot, so each pass also stops after a given time: the encounters go on in
+    the next pass, after the main loop handled the other events.
+    While a conversation is active, the encounter that started it waits for its end; the other encounters go on, but wait before
+    starting another conversation or using the UI (see shared_variables.ui_actions).
+    Encounters using the same characters are never in execution together (see EncountersController.start_encounter).
+
+    Attributes
+    ----------
+    metrics : dict
+        For each encounter executed, keyed by name: "instructions", "batches" and "wall_time" (seconds from the start to the end
+        of the encounter, None while it is in execution).
+    """
+
+    def __init__(self, encounters_controller, camelot_action, execute_PDDL_instruction, is_conversation_active):
+        """
+        Parameters
+        ----------
+        encounters_controller : EncountersController
+            The controller that knows the encounters in execution.
+        camelot_action : CamelotAction
+            Used to send the Camelot instructions.
+        execute_PDDL_instruction : function
+            Called with (action_name, arguments, command) for each PDDL instruction, e.g. GameController._execute_PDDL_instruction.
+        is_conversation_active : function
+            Called without arguments, returns True if a conversation is active.
+        """
+        self._encounters_controller = encounters_controller
+        self._camelot_action = camelot_action
+        self._execute_PDDL_instruction = execute_PDDL_instruction
+        self._is_conversation_active = is_conversation_active
+        # Name of the encounter that started the active conversation
+        self._conversation_owner = None
+        self._turn = 0
+        self.metrics = {}
+
+    def _is_ready(self, encounter) -> bool:
+        """
+        This method is used to know if the next instruction of an encounter can be executed now.
+        """
+        if not self._is_conversation_active():
+            self._conversation_owner = None
+            return True
+        if encounter.name == self._conversation_owner:
+            return False
+        instruction = encounter.peek_instruction()
+        if instruction is None:
+            return True
+        if instruction.type == EncounterInstruction.PDDL:
+            return instruction.name != "start_conversation"
+        return instruction.name not in shared_variables.ui_actions
+
+    def step(self, max_instructions : int, max_time : float = None) -> bool:
+        """
+        This method is used to execute a batch of instructions of each encounter ready.
+
+        Parameters
+        ----------
+        max_instructions : int
+            The maximum number of instructions executed, for all the encounters.
+        max_time : float (Optional)
+            The seconds after which no other instruction is started, for all the encounters. At least one instruction is executed.
+
+        Returns
+        -------
+        bool -> True if an encounter is ready to execute other instructions; False if not.
+        """
+        running = list(self._encounters_controller.encounters_in_execution)
+        if len(running) == 0:
+            return False
+        start = self._turn % len(running)
+        self._turn = start + 1
+        budget = max_instructions
+        deadline = time.perf_counter() + max_time if max_time is not None else None
+        for encounter in running[start:] + running[:start]:
+            if budget <= 0 or (deadline is not None and budget < max_instructions and time.perf_counter() >= deadline):
+                break
+            if self._is_ready(encounter):
+                budget -= self._execute_batch(encounter, budget, deadline)
+        return any(self._is_ready(encounter) for encounter in self._encounters_controller.encounters_in_execution)
+
+    def _execute_batch(self, encounter, max_instructions : int, deadline : float = None) -> int:
+        """
+        This method is used to execute the next batch of instructions of an encounter.
+        The batch stops early after the deadline (a time.perf_counter value); the encounter goes on from its cursor in the next call.
+
+        Returns
+        -------
+        int -> The number of instructions executed.
+        """
+        metrics = self.metrics.setdefault(encounter.name, {"instructions": 0, "batches": 0, "wall_time": None})
+        metrics["batches"] += 1
+        executed = 0
+        while executed < max_instructions and self._is_ready(encounter):
+            instruction = self._encounters_controller.get_next_instruction(encounter)
+            if instruction is None:
+                metrics["wall_time"] = encounter.get_wall_time()
+                logging.info("EncounterExecutor: encounter %s executed in %.3f s, %d instructions in %d batches" % (
+                    encounter.name, metrics["wall_time"], metrics["instructions"], metrics["batches"]))
+                break
+            executed += 1
+            metrics["instructions"] += 1
+            # The instructions have been split and checked when the encounters were loaded
+            if instruction.type == EncounterInstruction.CAMELOT:
+                if not self._camelot_action.action(instruction.name, list(instruction.arguments)):
+                    logging.warning("EncounterExecutor: instruction %s of encounter %s failed" % (instruction.command, encounter.name))
+            elif instruction.type == EncounterInstruction.PDDL:
+                self._execute_PDDL_instruction(instruction.name, list(instruction.arguments), instruction.command)
+                if instruction.name == "start_conversation" and self._is_conversation_active():
+                    self._conversation_owner = encounter.name
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        return executed
+
+    def get_metrics(self) -> dict:
+        """
+        This method is used to get the metrics of the encounters executed.
+        """
+        return {name: dict(metrics) for name, metrics in self.metrics.items()}
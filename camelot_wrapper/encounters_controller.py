@@ -1,7 +1,20 @@
 from functools import cached_property
+from pathlib import Path
 import jsonpickle
-from encounter import Encounter
-from utilities import parse_json
+try:
+    from encounter import Encounter, EncounterInstruction
+    from utilities import parse_json
+    from precondition_compiler import get_precondition_compiler, parse_sexpression, parse_typed_list
+    import shared_variables
+except (ModuleNotFoundError, ImportError):
+    from .encounter import Encounter, EncounterInstruction
+    from .utilities import parse_json
+    from .precondition_compiler import get_precondition_compiler, parse_sexpression, parse_typed_list
+    from . import shared_variables
+import logging
+import collections
+import re
+import threading
 import glob
 import os
 import debugpy
@@ -15,10 +28,93 @@ class EncountersController:
             filenames = [path.removeprefix("encounters\\").removesuffix(".json") for path in glob.glob('encounters/*.json')]
         else:
             filenames = [path.removeprefix("encounters/").removesuffix(".json") for path in glob.glob('encounters/*.json')]
-        self.encounters = [Encounter(parse_json(filename, encounter=True)) for filename in filenames]
         os.chdir(initial_path)
-        self.encounter_in_execution = None
+        domain_path, problem_path = shared_variables.get_domain_and_problem_path()
+        self._precondition_compiler = get_precondition_compiler(domain_path)
+        # Names of the characters and of the players of the problem
+        self._characters, self._players = self._load_characters(problem_path)
+        self._camelot_actions = {action['name']: action for action in parse_json("Actionlist")}
+        # Encounters loaded, keyed by the name of their file without extension. The dict is replaced by apply_reload and never
+        # changed after, so load_encounters can read the one taken under _reload_lock from another thread
+        self._encounters_by_filename = {}
+        self._reload_lock = threading.Lock()
+        self.apply_reload(self.load_encounters(filenames))
+        # Encounters started and not finished, in the order they were started
+        self.encounters_in_execution = []
+        # Encounters started while one of their characters was used by an encounter in execution, in the order they were started
+        self._waiting_encounters = collections.deque()
+        # Name of the encounter in execution that uses each character
+        self._character_locks = {}
     
+    def load_encounters(self, filenames : list, removed : list = ()) -> dict:
+        """
+        Method used to parse and check the files of some encounters, e.g. because they have been changed.
+        It does not change the encounters used by this controller, so it can be called from another thread; the encounters
+        loaded are then used after apply_reload.
+
+        Parameters:
+        ----------
+        filenames : list
+            The names of the files in the encounters directory, without extension.
+        removed : list, default - ()
+            The names of the files that have been removed, whose encounters can't be started by the encounters loaded.
+
+        Returns:
+        ----------
+        encounters : dict
+            The encounters loaded, keyed by the name of their file. An encounter not valid is logged and left out.
+        """
+        encounters = {}
+        for filename in filenames:
+            try:
+                encounters[filename] = Encounter(parse_json(filename, encounter=True))
+            except Exception as inst:
+                logging.error("EncountersController: encounter file %s not loaded: %s" % (filename, inst))
+        with self._reload_lock:
+            encounters_by_filename = self._encounters_by_filename
+        names = [encounter.name for filename, encounter in encounters_by_filename.items()
+                 if filename not in encounters and filename not in removed]
+        names += [encounter.name for encounter in encounters.values()]
+        loaded = {}
+        for filename, encounter in encounters.items():
+            try:
+                errors = self.validate_encounter(encounter, names)
+                if len(errors) == 0:
+                    # The preconditions are compiled once here, then CamelotWorldState.check_formula finds them in the cache of the compiler
+                    self._precondition_compiler.compile_formula(encounter.preconditions)
+                    if len(encounter.characters) == 0:
+                        encounter.characters = self.find_characters(encounter)
+            except Exception as inst:
+                errors = [str(inst)]
+            if len(errors) > 0:
+                logging.error("EncountersController: encounter %s not loaded: %s" % (encounter.name, "; ".join(errors)))
+                continue
+            loaded[filename] = encounter
+        return loaded
+
+    def apply_reload(self, encounters : dict, removed : list = ()):
+        """
+        Method used to replace the encounters with the ones loaded by load_encounters.
+        The encounters in execution go on with the version they were started with.
+
+        Parameters:
+        ----------
+        encounters : dict
+            The encounters loaded, keyed by the name of their file.
+        removed : list, default - ()
+            The names of the files that have been removed.
+        """
+        with self._reload_lock:
+            by_filename = dict(self._encounters_by_filename)
+            by_filename.update(encounters)
+            for filename in removed:
+                by_filename.pop(filename, None)
+            self._encounters_by_filename = by_filename
+        self.encounters = list(by_filename.values())
+        self._encounters_by_name = {encounter.name: encounter for encounter in self.encounters}
+        # get_encounters_name is cached
+        self.__dict__.pop("get_encounters_name", None)
+
     def find_encounter(self, encounter_name) -> Encounter:
         """
         Method used to find an encounter by name.
@@ -28,11 +124,106 @@ class EncountersController:
         encounter_name : str
             The name of the encounter to find.
         """
-        for encounter in self.encounters:
-            if encounter.name == encounter_name:
-                return encounter
-        return None
+        return self._encounters_by_name.get(encounter_name)
+
+    def validate_encounter(self, encounter : Encounter, encounter_names : list) -> list:
+        """
+        Method used to check the instructions of an encounter against the Camelot actions in Actionlist.json and the actions of the domain.
+
+        Parameters:
+        ----------
+        encounter : Encounter
+            The encounter to check.
+        encounter_names : list
+            The names of all the encounters, that can be started with start_encounter.
+
+        Returns:
+        ----------
+        errors : list
+            The description of each instruction not valid; empty if the encounter is valid.
+        """
+        errors = []
+        for instruction in encounter.instructions:
+            if instruction.type == EncounterInstruction.CAMELOT:
+                action_data = self._camelot_actions.get(instruction.name)
+                if action_data is None:
+                    errors.append("Camelot action %s does not exist" % instruction.command)
+                    continue
+                required = len([param for param in action_data['param'] if param['default'] == "REQUIRED"])
+                if not required <= len(instruction.arguments) <= len(action_data['param']):
+                    errors.append("wrong number of parameters in %s" % instruction.command)
+            elif instruction.type == EncounterInstruction.PDDL:
+                if instruction.name == "start_conversation":
+                    expected = 2
+                elif instruction.name == "start_encounter":
+                    expected = 1
+                    if len(instruction.arguments) == 1 and instruction.arguments[0] not in encounter_names:
+                        errors.append("encounter %s does not exist" % instruction.arguments[0])
+                elif instruction.name in self._precondition_compiler.action_parameters:
+                    expected = len(self._precondition_compiler.action_parameters[instruction.name])
+                else:
+                    errors.append("PDDL action %s does not exist" % instruction.command)
+                    continue
+                if len(instruction.arguments) != expected:
+                    errors.append("wrong number of parameters in %s" % instruction.command)
+            else:
+                errors.append("instruction type %s not supported" % instruction.type)
+        return errors
     
+    def _load_characters(self, problem_path : str) -> tuple:
+        """
+        Method used to find the characters defined in the objects of the problem.
+
+        Returns:
+        ----------
+        characters : tuple
+            The names of the characters (players included) and the names of the players, as frozensets.
+        """
+        characters = set()
+        players = set()
+        problem = parse_sexpression(Path(problem_path).read_text())[0]
+        for section in problem:
+            if type(section) == list and len(section) > 0 and section[0] == ":objects":
+                for name, type_name in parse_typed_list(section[1:]):
+                    if self._precondition_compiler.is_subtype(type_name, "character"):
+                        characters.add(name)
+                    if self._precondition_compiler.is_subtype(type_name, "player"):
+                        players.add(name)
+        return frozenset(characters), frozenset(players)
+
+    def find_characters(self, encounter : Encounter) -> frozenset:
+        """
+        Method used to find the characters used by the instructions of an encounter: the characters of the problem named anywhere in
+        the arguments (e.g. as the position in move-within-location(arnell, annara, City), or in the text of a dialog), the parameters
+        of type Character of the Camelot actions and of type character of the PDDL actions, and for a conversation also the players.
+
+        Parameters:
+        ----------
+        encounter : Encounter
+            The encounter, already validated.
+
+        Returns:
+        ----------
+        characters : frozenset
+            The names of the characters.
+        """
+        characters = set()
+        for instruction in encounter.instructions:
+            for argument in instruction.arguments:
+                characters.update(word for word in re.findall(r"[\w.-]+", argument) if word in self._characters)
+            if instruction.type == EncounterInstruction.CAMELOT:
+                parameters = self._camelot_actions[instruction.name]['param']
+                characters.update(argument for argument, parameter in zip(instruction.arguments, parameters) if parameter['type'] == "Character")
+            elif instruction.name == "start_conversation":
+                # The player is the other side of each conversation
+                characters.add(instruction.arguments[0])
+                characters.update(self._players)
+            elif instruction.name != "start_encounter":
+                types = self._precondition_compiler.action_parameter_types[instruction.name]
+                characters.update(argument for argument, type_name in zip(instruction.arguments, types)
+                                  if self._precondition_compiler.is_subtype(type_name, "character"))
+        return frozenset(characters)
+
     @cached_property
     def get_encounters_name(self) -> list:
         """
@@ -62,6 +253,7 @@ class EncountersController:
     def start_encounter(self, encounter_name : str):
         """
         Method used to start an encounter.
+        If one of its characters is used by an encounter in execution, the encounter waits until the characters are free.
 
         Parameters:
         ----------
@@ -69,27 +261,60 @@ class EncountersController:
             The name of the encounter to start.
         """
         encounter = self.find_encounter(encounter_name)
-        if encounter:
-            encounter.start_encounter()
-            self.encounter_in_execution = encounter
-        else:
+        if not encounter:
             raise ValueError("Encounter not found.")
-    
-    def get_next_instruction(self) -> tuple:
+        if any(started.name == encounter_name for started in self.encounters_in_execution + list(self._waiting_encounters)):
+            logging.warning("EncountersController: encounter %s already started" % encounter_name)
+            return
+        self._waiting_encounters.append(encounter)
+        self._start_waiting_encounters()
+        if encounter in self._waiting_encounters:
+            logging.info("EncountersController: encounter %s waiting for characters %s" % (
+                encounter_name, sorted(character for character in encounter.characters if character in self._character_locks)))
+
+    def _start_waiting_encounters(self):
+        """
+        Method used to start the waiting encounters whose characters are free, in the order they were started.
+        An encounter does not take a character wanted by an encounter waiting before it, so that no encounter waits forever.
+        """
+        wanted = set()
+        for encounter in list(self._waiting_encounters):
+            if encounter.characters.isdisjoint(self._character_locks) and encounter.characters.isdisjoint(wanted):
+                self._waiting_encounters.remove(encounter)
+                for character in encounter.characters:
+                    self._character_locks[character] = encounter.name
+                encounter.start_encounter()
+                self.encounters_in_execution.append(encounter)
+            wanted |= encounter.characters
+
+    def is_encounter_in_execution(self) -> bool:
+        """
+        Method used to know if an encounter is in execution or waiting for its characters.
         """
-        Method used to get the next instruction of the encounter in execution.
+        return len(self.encounters_in_execution) > 0 or len(self._waiting_encounters) > 0
+
+    def get_next_instruction(self, encounter : Encounter) -> EncounterInstruction:
+        """
+        Method used to get the next instruction of an encounter in execution.
+        When the encounter has no other instructions it is finished, its characters are freed and the encounters waiting for them are started.
+
+        Parameters:
+        ----------
+        encounter : Encounter
+            The encounter, one of encounters_in_execution.
 
         Returns:
         ----------
-        instruction : tuple
-            The instruction as a tuple (instruction_type, instruction_command).
-        """
-        try:
-            instruction = next(self.encounter_in_execution.instructions_generator)
-        except StopIteration:
-            self.encounter_in_execution.finish_execution()
-            self.encounter_in_execution = None
-            return None
+        instruction : EncounterInstruction
+            The instruction, or None if the encounter is finished.
+        """
+        instruction = encounter.next_instruction()
+        if instruction is None:
+            encounter.finish_execution()
+            self.encounters_in_execution.remove(encounter)
+            for character in encounter.characters:
+                self._character_locks.pop(character, None)
+            self._start_waiting_encounters()
         return instruction
     
     
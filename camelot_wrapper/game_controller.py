@@ -7,10 +7,17 @@ try:
     from platform_IO_communication import PlatformIOCommunication
     from camelot_action import CamelotAction
     from camelot_world_state import CamelotWorldState
-    from utilities import parse_json, replace_all, get_action_list, str2bool
+    from utilities import parse_json, replace_all, get_action_list, str2bool, split_instruction
     from camelot_input_multiplexer import CamelotInputMultiplexer
     from encounters_controller import EncountersController
+    from encounter_executor import EncounterExecutor
+    from content_watcher import ContentWatcher
     from conversation_controller import ConversationController
+    from game_event_scheduler import GameEventScheduler, EventSource
+    from wire_format import encode_changed_relations, SUPPORTED_WIRE_FORMATS, JSONPICKLE, COMPACT_JSON, SPECULATION_TENTATIVE, SPECULATION_CONFIRMED, SPECULATION_ROLLED_BACK
+    from encounter_availability import EncounterAvailabilityEngine
+    from precondition_compiler import get_precondition_compiler
+    from pddl_serialization import get_domain_hash, get_domain_PDDL, iter_problem_PDDL, iter_json_body
     import shared_variables
 except (ModuleNotFoundError, ImportError):
     from .GUI import GUI
@@ -19,10 +26,17 @@ except (ModuleNotFoundError, ImportError):
     from .platform_IO_communication import PlatformIOCommunication
     from .camelot_action import CamelotAction
     from .camelot_world_state import CamelotWorldState
-    from .utilities import parse_json, replace_all, get_action_list, str2bool
+    from .utilities import parse_json, replace_all, get_action_list, str2bool, split_instruction
     from .camelot_input_multiplexer import CamelotInputMultiplexer
     from .encounters_controller import EncountersController
+    from .encounter_executor import EncounterExecutor
+    from .content_watcher import ContentWatcher
     from .conversation_controller import ConversationController
+    from .game_event_scheduler import GameEventScheduler, EventSource
+    from .wire_format import encode_changed_relations, SUPPORTED_WIRE_FORMATS, JSONPICKLE, COMPACT_JSON, SPECULATION_TENTATIVE, SPECULATION_CONFIRMED, SPECULATION_ROLLED_BACK
+    from .encounter_availability import EncounterAvailabilityEngine
+    from .precondition_compiler import get_precondition_compiler
+    from .pddl_serialization import get_domain_hash, get_domain_PDDL, iter_problem_PDDL, iter_json_body
     from . import shared_variables
 from ev_pddl.action import Action
 from ev_pddl.PDDL import PDDL_Parser
@@ -30,12 +44,13 @@ from ev_pddl.domain import Domain
 from ev_pddl.world_state import WorldState
 import logging
 import multiprocessing
+import threading
 import debugpy
 import logging
 import time
-import jsonpickle
 import copy
-import re
+import collections
+import os
 
 class GameController:
 
@@ -47,20 +62,71 @@ class GameController:
         self._problem = self._parser.parse_problem(problem_filename = self._problem_path)
         self._camelot_action = CamelotAction()
         self._encounter_controller = EncountersController()
+        self._encounter_executor = EncounterExecutor(self._encounter_controller, self._camelot_action, self._execute_PDDL_instruction,
+                                                     lambda: self.conversation_active)
         self._conversation_controller = ConversationController()
         self._player = ''
         self.input_dict = {}
         self.current_state = None
-        self.conversation_active = False
         self._menu_showing = False
         self.queueIn_GUI = multiprocessing.Queue()
         self.queueOut_GUI = multiprocessing.Queue()
+        self._GUI_messages = queue.Queue()
+        self._event_scheduler = GameEventScheduler()
+        # Seconds after which the main loop runs all the handlers even if no event has been notified
+        self.idle_timeout = 1.0
         self._platform_communication = PlatformIOCommunication()
         self.active_GUI = GUI
         self.error_list = []
         self._received_action_from_platform = None
+        self._wire_format = JSONPICKLE
+        # If True, the actions of the platform are applied and published before Camelot performs them (only with the compact wire format)
+        self.speculative_actions = False
+        self._speculation_id = 0
+        self._speculation_metrics = {"applied": 0, "confirmed": 0, "rolled_back": 0, "publish_latency": 0.0, "confirmation_latency": 0.0}
+        # If True, the actions of the platform whose preconditions are not satisfied are rejected without sending them to Camelot
+        self.check_action_preconditions = True
+        self._precondition_metrics = {"checked": 0, "rejected": 0, "evaluation_time": 0.0}
+        # Created when the world state is ready; it knows which encounters have their preconditions satisfied
+        self._encounter_availability = None
+        # If True, the platform is told when encounters become available or not available
+        self.notify_available_encounters = False
+        # Seconds from the arrival of each action to the publication of its relations, without speculation
+        self._action_publish_latency = {"actions": 0, "latency": 0.0}
+        # Actions received from the platform and not processed yet, in the order the platform sent them
+        self._platform_actions = collections.deque()
+        # Maximum messages of each source handled for each pass of the main loop, so that a burst from one source can't starve the others
+        self.tick_budgets = {
+            EventSource.INPUT : 5,
+            EventSource.SUCCESS : 20,
+            EventSource.LOCATION : 50,
+            EventSource.ERROR : 10,
+            EventSource.GUI : 5,
+            EventSource.PLATFORM : 5,
+            EventSource.ENCOUNTER : 20,
+        }
+        # Seconds after which the encounters stop executing instructions in a pass of the main loop, since each Camelot instruction waits for its reply
+        self.encounter_time_budget = 0.05
+        # If True, the encounter and yarn files changed while the game is running are loaded again without restarting
+        self.hot_reload_content = False
+        # Seconds between two checks of the encounter and yarn files
+        self.content_poll_interval = 0.5
+        # Tuples (time the change was found, encounters loaded, encounter files removed, conversations compiled, yarn files removed)
+        self._content_updates = queue.Queue()
+        self._content_reload_metrics = {"reloads": 0, "encounters": 0, "conversations": 0, "latency": 0.0}
+        self._platform_action_lag = 0.0
+        self._platform_actions_received = 0
+        self._platform_actions_processed = 0
+        self._platform_first_action_time = None
         
     
+    @property
+    def conversation_active(self) -> bool:
+        """
+        True if a conversation is active with at least one NPC.
+        """
+        return self._conversation_controller.has_active_conversations()
+
     def start_platform_communication(self):
         """
         A method that is used to start the platform communication. It follows the communication controller steps.
@@ -84,24 +150,34 @@ class GameController:
         """
         logging.info("Platform communication starting handshake phase 3")
         logging.info("Platform communication waiting for phase 3 to start")
-        while self._platform_communication.get_handshake_phase() != "PHASE_3":
-            time.sleep(0.1)
+        self._platform_communication.wait_for_handshake_phase("PHASE_3")
         logging.info("Platform communication phase 3 started")
+        domain_hash = get_domain_hash(self._domain_path)
         message_text = {
             "text" : self._platform_communication.communication_protocol_phase_messages['PHASE_3']['message_6'],
-            "domain" : domain.to_PDDL(),
-            "problem" : wolrd_state.to_PDDL(),
-            "additional_data" : self._encounter_controller.get_encounters_message()
-        } 
-        logging.info("GameController: Sending message: " + str(message_text))
-        result = self._platform_communication.send_message(message_text, inizialization=True)
+            "domain_hash" : domain_hash,
+            "additional_data" : self._encounter_controller.get_encounters_message(),
+            "wire_formats" : SUPPORTED_WIRE_FORMATS
+        }
+        # The domain is sent only if the platform doesn't have this version of it yet
+        if not self._platform_communication.platform_has_domain(domain_hash):
+            message_text["domain"] = get_domain_PDDL(domain, domain_hash)
+        logging.info("GameController: Sending message: " + str(message_text) + " with problem streamed")
+        body = iter_json_body(message_text, {"problem" : iter_problem_PDDL(wolrd_state)})
+        result = self._platform_communication.send_streamed_initialization_message(body)
         logging.info("GameController: received message: " + str(result))
         if result['text'] == self._platform_communication.communication_protocol_phase_messages['PHASE_4']['message_9']:
             self._platform_communication.send_message_link = result['add_message_url'].replace('/', '')
             logging.info("Send message link: /" + self._platform_communication.send_message_link)
             self._platform_communication.receive_message_link = result['get_message_url'].replace('/', '')
             logging.info("Receive message link: /" + self._platform_communication.receive_message_link)
+            # The platform picks one of the wire formats we support; older platforms don't answer, so we keep jsonpickle
+            if result.get('wire_format') in SUPPORTED_WIRE_FORMATS:
+                self._wire_format = result['wire_format']
+            logging.info("Changed relations wire format: " + self._wire_format)
             logging.info("Platform communication setting urls finished")
+            self._platform_communication.start_receiving_normal_messages()
+            logging.info("Platform communication receiver started")
             logging.info("Platform communication handshake phase 4 finished")
             return True
         else:
@@ -135,6 +211,8 @@ class GameController:
         self._create_ingame_actions(game_loop)
         self._camelot_action.action("ShowMenu", wait=game_loop)
         self.current_state = initial_state
+        self._encounter_availability = EncounterAvailabilityEngine(self._encounter_controller.encounters,
+                                                                   get_precondition_compiler(self._domain_path), initial_state.world_state)
         self.GUI_process = multiprocessing.Process(target=GUI, args=(self.queueIn_GUI, self.queueOut_GUI))
         if self.active_GUI:
             self.GUI_process.start()
@@ -276,35 +354,132 @@ class GameController:
             self._camelot_action.action("SetCameraFocus",[self._player.name])
         self._camelot_action.success_messages = queue.Queue()
         self._camelot_action.debug = True
+        if self.active_GUI:
+            threading.Thread(target=self._GUI_messages_bridge, daemon=True).start()
+        if self.hot_reload_content:
+            threading.Thread(target=self._content_reload_thread, daemon=True).start()
+        handlers = {
+            EventSource.INPUT : [self._input_handler],
+            EventSource.SUCCESS : [self._success_message_handler],
+            EventSource.LOCATION : [self._location_handler],
+            EventSource.GUI : [self._incoming_messages_handler],
+            EventSource.PLATFORM : [self._incoming_messages_handler],
+            EventSource.ERROR : [self._check_error_messages],
+            EventSource.ENCOUNTER : [self._encounter_execution_handler],
+            EventSource.CONTENT : [self._content_reload_handler],
+        }
+        # When nothing has been notified for idle_timeout seconds every handler runs once, in case an event was missed
+        handlers[EventSource.TIMER] = [self._input_handler, self._success_message_handler, self._location_handler,
+                                              self._incoming_messages_handler, self._check_error_messages, self._encounter_execution_handler,
+                                              self._content_reload_handler]
         while exit:
-
-            self._input_handler()
-
-            self._success_message_handler()
-
-            self._location_handler()
-
-            self._incoming_messages_handler()
-
-            self._check_error_messages()
-
-            self._encounter_execution_handler()
+            sources = self._event_scheduler.wait(timeout=self.idle_timeout)
+            executed = []
+            for source in sources:
+                for handler in handlers.get(source, []):
+                    if handler in executed:
+                        continue
+                    executed.append(handler)
+                    if handler():
+                        # The handler used all its budget, there are other events waiting for it
+                        self._event_scheduler.notify(source)
         
         # self.queue_GUI.close()
         # self.queue_GUI.join_thread()
         # self.GUI_process.join()
 
 
+    def _GUI_messages_bridge(self):
+        """
+        This method is used as a thread that moves the messages of the GUI process to the main process, notifying the main loop.
+        """
+        while True:
+            self._GUI_messages.put(self.queueOut_GUI.get())
+            self._event_scheduler.notify(EventSource.GUI)
+
+    def _content_reload_thread(self):
+        """
+        This method is used as a thread that checks the encounter and yarn files every content_poll_interval seconds.
+        Only the files changed are parsed and compiled again, in this thread; the new versions are then used by the main loop
+        (see _content_reload_handler).
+        """
+        encounters_watcher = ContentWatcher(os.path.join(os.path.dirname(__file__), "encounters"), ".json")
+        narrative_watcher = ContentWatcher(os.path.join(os.path.dirname(__file__), "narrative"), ".yarn")
+        while True:
+            time.sleep(self.content_poll_interval)
+            try:
+                changed_encounters, removed_encounters = encounters_watcher.poll()
+                changed_narrative, removed_narrative = narrative_watcher.poll()
+            except OSError as inst:
+                logging.error("GameController: content files not checked: %s" % inst)
+                continue
+            if len(changed_encounters) + len(removed_encounters) + len(changed_narrative) + len(removed_narrative) == 0:
+                continue
+            found_at = time.perf_counter()
+            logging.info("GameController: content changed, encounters %s, conversations %s" % (changed_encounters + removed_encounters, changed_narrative + removed_narrative))
+            try:
+                encounters = self._encounter_controller.load_encounters(changed_encounters, removed_encounters)
+                conversations = self._conversation_controller.compile_conversations(changed_narrative)
+            except Exception as inst:
+                # The thread goes on, the files are loaded again when they are saved again
+                logging.exception("GameController: content not reloaded: %s" % inst)
+                continue
+            self._content_updates.put((found_at, encounters, removed_encounters, conversations, removed_narrative))
+            self._event_scheduler.notify(EventSource.CONTENT)
+
+    def _content_reload_handler(self) -> bool:
+        """
+        This method is used to start using the encounters and the conversations loaded again by _content_reload_thread.
+        The swap happens between two passes of the main loop, so the handlers never see a part of a reload; the encounters
+        and the conversations already running go on with the version they were started with.
+
+        Returns
+        -------
+        bool -> Always False, the reloads waiting are all applied.
+        """
+        while True:
+            try:
+                found_at, encounters, removed_encounters, conversations, removed_narrative = self._content_updates.get_nowait()
+            except queue.Empty:
+                return False
+            self._encounter_controller.apply_reload(encounters, removed_encounters)
+            self._conversation_controller.apply_reload(conversations, removed_narrative)
+            if (len(encounters) > 0 or len(removed_encounters) > 0) and self.current_state is not None:
+                self._encounter_availability = EncounterAvailabilityEngine(self._encounter_controller.encounters,
+                                                                           get_precondition_compiler(self._domain_path), self.current_state.world_state)
+            self._content_reload_metrics["reloads"] += 1
+            self._content_reload_metrics["encounters"] += len(encounters)
+            self._content_reload_metrics["conversations"] += len(conversations)
+            self._content_reload_metrics["latency"] = time.perf_counter() - found_at
+            logging.info("GameController: content reloaded in %.3f s" % self._content_reload_metrics["latency"])
+
+    def get_content_reload_metrics(self) -> dict:
+        """
+        This method is used to get the metrics of the reloads of the encounter and yarn files.
+
+        Returns
+        -------
+        dict -> "reloads": reloads applied; "encounters" and "conversations": encounters and conversations loaded again;
+                "latency": seconds from finding the changes of the last reload to using the new versions.
+        """
+        return dict(self._content_reload_metrics)
+
     def _success_message_handler(self):
-        """A method that is used to handle the success message and update the world state
+        """A method that is used to handle the success messages and update the world state.
+        At most tick_budgets[SUCCESS] messages are handled for each call.
+
+        Returns
+        -------
+        bool -> True if the budget has been used and there might be other messages waiting; False if not.
         """
-        try:
-            received = self._camelot_action.success_messages.get_nowait()
+        for _ in range(self.tick_budgets[EventSource.SUCCESS]):
+            try:
+                received = self._camelot_action.success_messages.get_nowait()
+            except queue.Empty:
+                return False
             logging.info("GameController: Success message received: " + received)
             self._apply_camelot_message(received)
-        except queue.Empty:
-            return False
-        return True       
+        return True
     
     def _input_handler(self) -> bool:
         """
@@ -316,64 +491,86 @@ class GameController:
 
         Returns
         -------
-        bool -> True if received message from input queue and responded to it; False if not.
+        bool -> True if the budget of tick_budgets[INPUT] messages has been used and there might be other messages waiting; False if not.
         """
-        try:
-            received = str(self.camelot_input_multiplex.get_input_message(no_wait=True))
+        for _ in range(self.tick_budgets[EventSource.INPUT]):
+            try:
+                received = str(self.camelot_input_multiplex.get_input_message(no_wait=True))
+            except queue.Empty:
+                return False
             logging.info("GameController: got input message \"%s\"" %( received ))
-
-            if received in self.input_dict.keys():
-                for item in self.input_dict[received]:
-                    action_name = item['action_name']
-                    action_parameters = item['action_parameters']
-                    wait = item['wait']
-                    self._camelot_action.action(action_name, action_parameters, wait=wait)
-            elif received == "input Key Pause":
-                if not self._menu_showing:
-                    self._camelot_action.action("ShowMenu", [], True)
-                    self._camelot_action.action("SetTitle", ["Pause Menu"], True)
-                    self._menu_showing = True
-            elif received in ("input Selected Resume", "input Close Menu"):
-                self._camelot_action.action("HideMenu", [], True)
-                if not self.conversation_active:
-                    self._camelot_action.action("EnableInput", [], True)
-                self._menu_showing = False
-            elif received in ("input Selected Quit", "input Quit"):
-                self.camelot_input_multiplex.stop()
-            elif received.startswith("input Selected"):
-                selection = received.removeprefix("input Selected ")
-                if selection.isdigit():
-                    self._conversation_controller.continue_conversation_with_choice(int(selection))
-                elif selection == 'next':
-                    self._conversation_controller.continue_conversation()
-                elif selection == 'end':
-                    self._conversation_controller.end_conversation()
-                    self.conversation_active = False
-        except queue.Empty:
-            return False
+            self._handle_input_message(received)
         return True
+
+    def _handle_input_message(self, received : str):
+        """
+        A method that is used to respond to an input message from Camelot.
+
+        Parameters
+        ----------
+        received : str
+            The input message.
+        """
+        if received in self.input_dict.keys():
+            for item in self.input_dict[received]:
+                action_name = item['action_name']
+                action_parameters = item['action_parameters']
+                wait = item['wait']
+                self._camelot_action.action(action_name, action_parameters, wait=wait)
+        elif received == "input Key Pause":
+            # Pressing escape disables the input in Camelot
+            self._camelot_action.ui_state.invalidate("DisableInput")
+            if not self._menu_showing:
+                self._camelot_action.action("ShowMenu", [], True)
+                self._camelot_action.action("SetTitle", ["Pause Menu"], True)
+                self._menu_showing = True
+        elif received in ("input Selected Resume", "input Close Menu"):
+            # The menu might have been closed from Camelot
+            self._camelot_action.ui_state.invalidate("HideMenu")
+            self._camelot_action.action("HideMenu", [], True)
+            if not self.conversation_active:
+                self._camelot_action.action("EnableInput", [], True)
+            self._menu_showing = False
+        elif received in ("input Selected Quit", "input Quit"):
+            self.camelot_input_multiplex.stop()
+        elif received.startswith("input Selected"):
+            selection = received.removeprefix("input Selected ")
+            if selection.isdigit():
+                self._conversation_controller.continue_conversation_with_choice(int(selection))
+            elif selection == 'next':
+                self._conversation_controller.continue_conversation()
+            elif selection == 'end':
+                self._conversation_controller.end_conversation()
+                self._event_scheduler.notify(EventSource.ENCOUNTER)
     
     def _location_handler(self):
         """
         A method that is used to handle the location inputs from Camelot.
+        Up to tick_budgets[LOCATION] messages are taken from the queue and applied to the world state together,
+        so the GUI and the platform are updated once for the whole batch.
 
-        Parameters
-        ----------
-        None
+        Returns
+        -------
+        bool -> True if the budget has been used and there might be other messages waiting; False if not.
         """
-        try:
-            #TODO: evolve to handle multiple location inputs
-            received = self.camelot_input_multiplex.get_location_message(no_wait=True)
+        batch = []
+        budget_used = True
+        for _ in range(self.tick_budgets[EventSource.LOCATION]):
+            try:
+                received = self.camelot_input_multiplex.get_location_message(no_wait=True)
+            except queue.Empty:
+                budget_used = False
+                break
             logging.info("GameController: got location message \"%s\"" %( received ))
             if received.startswith(shared_variables.location_message_prefix[2:]):
-                #self.queue_GUI.put(received)
-                self._apply_camelot_message(received)
-        except queue.Empty:
-            return False
-        except Exception as inst:
-            logging.exception("GameController: Exception in location handler: %s" %( inst ))
-            return False
-        return True
+                batch.append(received)
+        if len(batch) > 0:
+            changed_relations = self.current_state.apply_camelot_location_messages(batch)
+            self._update_encounter_availability(changed_relations)
+            if len(changed_relations) > 0:
+                self.queueIn_GUI.put(self.current_state.world_state)
+                self._platform_communication.send_message_async(self._format_changed_relations_for_external_message(changed_relations))
+        return budget_used
 
     def _incoming_messages_handler(self):
         """
@@ -382,9 +579,18 @@ class GameController:
         Parameters
         ----------
         None
+
+        Returns
+        -------
+        bool -> True if there are messages from the GUI or actions from the platform still waiting to be processed; False if not.
         """
-        try:
-            received = self.queueOut_GUI.get_nowait()
+        GUI_budget_used = True
+        for _ in range(self.tick_budgets[EventSource.GUI]):
+            try:
+                received = self._GUI_messages.get_nowait()
+            except queue.Empty:
+                GUI_budget_used = False
+                break
             logging.debug("GameController: got external message \"%s\"" %( received ))
 
             if "CI" in received:
@@ -395,23 +601,81 @@ class GameController:
                 # handle PDDL action
                 message = received["PA"]
                 self._incoming_action_handler(message)
-        except queue.Empty:
-            pass
         
-        action = self._platform_communication.receive_message()
-        if action is not None:
-            action_text = action[0]['text']
+        self._ingest_platform_messages()
+        processed = 0
+        while len(self._platform_actions) > 0 and processed < self.tick_budgets[EventSource.PLATFORM]:
+            received_at, action_text = self._platform_actions.popleft()
+            self._platform_action_lag = time.perf_counter() - received_at
             logging.debug("GameController: got external message from platform: \"%s\"" %( action_text ))
             self._incoming_action_handler(action_text)
+            self._platform_actions_processed += 1
+            processed += 1
+        return GUI_budget_used or len(self._platform_actions) > 0
+
+    def _ingest_platform_messages(self):
+        """
+        This method is used to queue every action of every response received from the platform, keeping their order.
+        The actions are then processed by _incoming_messages_handler, at most tick_budgets[PLATFORM] for each pass of the main loop.
+        """
+        response = self._platform_communication.receive_message()
+        while response is not None:
+            received_at = time.perf_counter()
+            for message in response:
+                self._platform_actions.append((received_at, message['text']))
+                self._platform_actions_received += 1
+            if self._platform_first_action_time is None and len(response) > 0:
+                self._platform_first_action_time = time.perf_counter()
+            response = self._platform_communication.receive_message()
+
+    def get_platform_ingress_metrics(self) -> dict:
+        """
+        This method is used to get the metrics of the actions received from the platform.
+
+        Returns
+        -------
+        dict
+            "queue_depth": actions waiting to be processed; "received" and "processed": actions received and processed;
+            "ingress_rate": actions received per second since the first one.
+        """
+        elapsed = 0.0 if self._platform_first_action_time is None else time.perf_counter() - self._platform_first_action_time
+        return {
+            "queue_depth": len(self._platform_actions),
+            "received": self._platform_actions_received,
+            "processed": self._platform_actions_processed,
+            "ingress_rate": self._platform_actions_received / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def get_tick_metrics(self) -> dict:
+        """
+        This method is used to get the backlog and the lag of every source handled by the main loop.
+
+        Returns
+        -------
+        dict
+            For each source, "backlog": messages waiting to be handled; "lag": seconds the last message handled waited, if it is measured.
+        """
+        metrics = self.camelot_input_multiplex.get_queue_metrics()
+        metrics[EventSource.SUCCESS] = {"backlog": self._camelot_action.success_messages.qsize()}
+        metrics[EventSource.GUI] = {"backlog": self._GUI_messages.qsize()}
+        metrics[EventSource.PLATFORM] = {"backlog": len(self._platform_actions), "lag": self._platform_action_lag}
+        return metrics
     
     def _check_error_messages(self):
         """
         This method is used to check if there are any error messages.
+
+        Returns
+        -------
+        bool -> True if the budget of tick_budgets[ERROR] messages has been used and there might be other messages waiting; False if not.
         """
-        error_message = self.camelot_input_multiplex.get_error_message()
-        if error_message is not None:
+        for _ in range(self.tick_budgets[EventSource.ERROR]):
+            error_message = self.camelot_input_multiplex.get_error_message()
+            if error_message is None:
+                return False
             error = CamelotError(error_message)
             self.error_list.append(error)
+        return True
 
     
     def _incoming_action_handler(self, message : str):
@@ -426,31 +690,187 @@ class GameController:
         """
         # move-between-location(luca, Blacksmith, AlchemyShop, Blacksmith.Door, AlchemyShop.Door)
         # start_conversation(luca, initial_narrative)
-        message = message.replace(" ", "")
-        if message.startswith("start_"):
-            message_parts = re.split(r"\(|\)|,", message)
-            if message.startswith("start_conversation"):
-                character = message_parts[1]
-                conversation = message_parts[2]
+        action_name, arguments = split_instruction(message)
+        self._execute_PDDL_instruction(action_name, arguments, message)
+
+    def _execute_PDDL_instruction(self, action_name : str, arguments : list, message : str):
+        """
+        This method is used to execute an action already split in name and arguments, received from the platform or from an encounter.
+
+        Parameters
+        ----------
+        action_name: str
+            The name of the action, e.g. "move-between-location".
+        arguments: list
+            The names of the arguments of the action.
+        message: str
+            The action as received, used to report it to the platform if it is rejected.
+        """
+        if action_name.startswith("start_"):
+            if action_name == "start_conversation":
+                character = arguments[0]
+                conversation = arguments[1]
                 if self._conversation_controller.check_conversation_exists(conversation):
-                    self.conversation_active = True
                     self._conversation_controller.start_camelot_conversation(conversation_name=conversation, player_name=self._player.name, npc_name=character)
-            elif message.startswith("start_encounter"):
-                encounter_name = message_parts[1]
+            elif action_name == "start_encounter":
+                encounter_name = arguments[0]
                 self._encounter_controller.start_encounter(encounter_name)
+                self._event_scheduler.notify(EventSource.ENCOUNTER)
         else:
-            action = self.current_state.create_action_from_incoming_message(message)
+            received_at = time.perf_counter()
+            try:
+                action = self.current_state.create_action(action_name, arguments)
+            except Exception as inst:
+                self._reject_platform_action(message, "action not valid: %s" % inst)
+                return
+            if action is None:
+                self._reject_platform_action(message, "action not found in domain")
+                return
+            if self.check_action_preconditions and not self._check_platform_action_preconditions(action, message):
+                return
             self._received_action_from_platform = copy.deepcopy(action)
             camelot_action_parameters = self._camelot_action.generate_camelot_action_parameters_from_action(action)
+            if self.speculative_actions and self._wire_format == COMPACT_JSON and not action.name.startswith("instantiate_"):
+                self._speculative_action_handler(action, camelot_action_parameters, received_at)
+                return
             success = self._camelot_action.actions(camelot_action_parameters)
             if success:
                 changed_relations = self.current_state.apply_action(action)
+                self._update_encounter_availability(changed_relations)
                 if action.name.startswith("instantiate_object"):
                     json_p = parse_json("pddl_predicates_to_camelot")
                     stored = [item[1] for item in changed_relations if item[0] == "new" and item[1].predicate.name == "stored"]
                     self._stored_predicate_handling(stored[0], json_p)
                 self.queueIn_GUI.put(self.current_state.world_state)
-                self._platform_communication.send_message(self._format_changed_relations_for_external_message(changed_relations))
+                self._platform_communication.send_message_async(self._format_changed_relations_for_external_message(changed_relations))
+                self._action_publish_latency["actions"] += 1
+                self._action_publish_latency["latency"] += time.perf_counter() - received_at
+
+    def _check_platform_action_preconditions(self, action, message : str) -> bool:
+        """
+        This method is used to check the preconditions of an action of the platform against the current world state, before Camelot is involved.
+        If they are not satisfied the action is rejected.
+
+        Parameters
+        ----------
+        action: Action
+            The action received from the platform.
+        message: str
+            The message the action has been created from.
+
+        Returns
+        -------
+        bool -> True if the preconditions are satisfied; False if the action has been rejected.
+        """
+        start = time.perf_counter()
+        missing_entities = [name for name, entity in action.parameters.items() if entity is None]
+        satisfied = len(missing_entities) == 0 and self.current_state.check_action_preconditions(action)
+        self._precondition_metrics["evaluation_time"] += time.perf_counter() - start
+        self._precondition_metrics["checked"] += 1
+        if not satisfied:
+            if len(missing_entities) > 0:
+                self._reject_platform_action(message, "entities not found for the parameters " + ", ".join(missing_entities))
+            else:
+                self._reject_platform_action(message, "preconditions not satisfied")
+        return satisfied
+
+    def _reject_platform_action(self, message : str, reason : str):
+        """
+        This method is used to answer the platform that one of its actions has not been performed.
+
+        Parameters
+        ----------
+        message: str
+            The action received from the platform.
+        reason: str
+            Why the action has been rejected.
+        """
+        logging.info("GameController: action \"%s\" rejected: %s" % (message, reason))
+        self._precondition_metrics["rejected"] += 1
+        self._platform_communication.send_error_message_async(json.dumps({"rejected_action": message, "reason": reason}))
+
+    def get_precondition_metrics(self) -> dict:
+        """
+        This method is used to get the metrics of the precondition checks of the actions received from the platform.
+
+        Returns
+        -------
+        dict
+            "checked": actions checked; "rejected": actions rejected without sending them to Camelot;
+            "mean_evaluation_time": mean seconds to evaluate the preconditions of an action.
+        """
+        checked = self._precondition_metrics["checked"]
+        return {
+            "checked": checked,
+            "rejected": self._precondition_metrics["rejected"],
+            "mean_evaluation_time": self._precondition_metrics["evaluation_time"] / checked if checked > 0 else 0.0,
+        }
+
+    def _speculative_action_handler(self, action, camelot_action_parameters : list, received_at : float):
+        """
+        This method is used to apply an action of the platform before Camelot performs it.
+        The changed relations are published as tentative; when Camelot succeeds they are confirmed, otherwise the action is rolled back
+        and the relations that undo it are published.
+
+        Parameters
+        ----------
+        action: Action
+            The action received from the platform.
+        camelot_action_parameters: list
+            The Camelot actions that perform the action.
+        received_at: float
+            When the action has been received, from time.perf_counter().
+        """
+        self._speculation_id += 1
+        speculation_id = self._speculation_id
+        changed_relations, undo_record = self.current_state.apply_action_speculatively(action)
+        self._update_encounter_availability(changed_relations)
+        self.queueIn_GUI.put(self.current_state.world_state)
+        self._platform_communication.send_message_async(self._format_changed_relations_for_external_message(
+            changed_relations, {"id": speculation_id, "status": SPECULATION_TENTATIVE}))
+        self._speculation_metrics["applied"] += 1
+        self._speculation_metrics["publish_latency"] += time.perf_counter() - received_at
+        success = self._camelot_action.actions(camelot_action_parameters)
+        self._speculation_metrics["confirmation_latency"] += time.perf_counter() - received_at
+        if success:
+            self._speculation_metrics["confirmed"] += 1
+            self._platform_communication.send_message_async(self._format_changed_relations_for_external_message(
+                [], {"id": speculation_id, "status": SPECULATION_CONFIRMED}))
+        else:
+            logging.info("GameController: action %s failed in Camelot, rolling it back" % action.name)
+            compensating_relations = self.current_state.rollback(undo_record)
+            self._update_encounter_availability(compensating_relations)
+            self._speculation_metrics["rolled_back"] += 1
+            self.queueIn_GUI.put(self.current_state.world_state)
+            self._platform_communication.send_message_async(self._format_changed_relations_for_external_message(
+                compensating_relations, {"id": speculation_id, "status": SPECULATION_ROLLED_BACK}))
+
+    def get_speculation_metrics(self) -> dict:
+        """
+        This method is used to get how much the speculative mode cuts the time the platform waits for the changes of its actions.
+
+        Returns
+        -------
+        dict
+            "applied", "confirmed" and "rolled_back": speculative actions; "mean_publish_latency": mean seconds from the arrival of a
+            speculative action to the publication of its tentative relations; "mean_confirmation_latency": mean seconds until Camelot
+            performed it, that is when its relations would have been published without speculation; "mean_latency_saved": the difference;
+            "mean_non_speculative_latency": mean seconds to publish the relations of the actions applied without speculation.
+        """
+        metrics = self._speculation_metrics
+        applied = metrics["applied"]
+        publish_latency = metrics["publish_latency"] / applied if applied > 0 else 0.0
+        confirmation_latency = metrics["confirmation_latency"] / applied if applied > 0 else 0.0
+        actions = self._action_publish_latency["actions"]
+        return {
+            "applied": applied,
+            "confirmed": metrics["confirmed"],
+            "rolled_back": metrics["rolled_back"],
+            "mean_publish_latency": publish_latency,
+            "mean_confirmation_latency": confirmation_latency,
+            "mean_latency_saved": confirmation_latency - publish_latency,
+            "mean_non_speculative_latency": self._action_publish_latency["latency"] / actions if actions > 0 else 0.0,
+        }
     
     def _apply_camelot_message(self, message):
         """
@@ -462,11 +882,39 @@ class GameController:
             The message that will be applied.
         """
         changed_relations = self.current_state.apply_camelot_message(message, self._received_action_from_platform)
+        self._update_encounter_availability(changed_relations)
         if len(changed_relations) > 0:
             self.queueIn_GUI.put(self.current_state.world_state)
-            self._platform_communication.send_message(self._format_changed_relations_for_external_message(changed_relations))
+            self._platform_communication.send_message_async(self._format_changed_relations_for_external_message(changed_relations))
 
-    def _format_changed_relations_for_external_message(self, changed_relations):
+    def _update_encounter_availability(self, changed_relations : list):
+        """
+        This method is used to update which encounters are available with the relations changed in the world state,
+        notifying the platform if notify_available_encounters is True.
+
+        Parameters
+        ----------
+        changed_relations: list
+            The relations changed in the world state.
+        """
+        if self._encounter_availability is None or len(changed_relations) == 0:
+            return
+        now_available, not_available = self._encounter_availability.update(changed_relations)
+        if self.notify_available_encounters and (len(now_available) > 0 or len(not_available) > 0):
+            self._platform_communication.send_message_async(json.dumps({
+                "encounters_available": sorted(now_available),
+                "encounters_not_available": sorted(not_available)
+            }))
+
+    def get_available_encounters(self) -> list:
+        """
+        This method is used to get the names of the encounters whose preconditions are satisfied and that have not been executed yet.
+        """
+        if self._encounter_availability is None:
+            return []
+        return self._encounter_availability.get_available_encounters()
+
+    def _format_changed_relations_for_external_message(self, changed_relations, speculation = None):
         """
         This method is used to format a message for the external communication.
 
@@ -474,6 +922,8 @@ class GameController:
         ----------
         message: list
             The list of relations that changed.
+        speculation: dict (Optional)
+            The id and the status of the speculative action the relations belong to.
         """
         relation_list = []
         for item in changed_relations:
@@ -486,19 +936,30 @@ class GameController:
                 relation_list.append(i)
             else:
                 logging.debug("GameController(_format_changed_relations_for_external_message): Invalid relation: %s" %( item ))
-        json_message = jsonpickle.encode(relation_list)
+        json_message = encode_changed_relations(relation_list, self._wire_format, speculation)
         return json_message
     
     def _encounter_execution_handler(self):
         """
-        This method is used to handle the execution of an encounter. 
-        It checks if the encounter is active, and if it is, executes the next instruction.
-        """
-        if self._encounter_controller.encounter_in_execution is not None and self.conversation_active == False:
-            next_instruction = self._encounter_controller.get_next_instruction()
-            if next_instruction is not None:
-                if next_instruction[0] == "Camelot":
-                    message_parts = re.split(r"\(|\)|,", next_instruction[1])
-                    self._camelot_action.action(message_parts[0], [item for item in message_parts[1:] if item != ""])
-                elif next_instruction[0] == "PDDL":
-                    self._incoming_action_handler(next_instruction[1])
\ No newline at end of file
+        This method is used to handle the execution of the encounters. 
+        Each encounter in execution that is not waiting for a conversation executes its next batch of instructions: the Camelot
+        instructions up to the next PDDL instruction. At most tick_budgets[ENCOUNTER] instructions are executed for each call, and
+        no instruction is started after encounter_time_budget seconds.
+        The encounters waiting for a conversation are resumed when it ends (see _handle_input_message).
+
+        Returns
+        -------
+        bool -> True if an encounter is ready to execute other instructions; False if not.
+        """
+        return self._encounter_executor.step(self.tick_budgets[EventSource.ENCOUNTER], self.encounter_time_budget)
+
+    def get_encounter_metrics(self) -> dict:
+        """
+        This method is used to get the metrics of the encounters executed.
+
+        Returns
+        -------
+        dict -> For each encounter, keyed by name: "instructions": instructions executed; "batches": passes of the main loop used;
+                "wall_time": seconds from the start to the end of the encounter (None while it is in execution).
+        """
+        return self._encounter_executor.get_metrics()
\ No newline at end of file
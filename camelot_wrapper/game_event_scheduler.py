@@ -0,0 +1,72 @@
+import threading
+import time
+from singleton_decorator import singleton
+
+
+class EventSource:
+    """
+    This class contains the sources of the events notified to the GameEventScheduler.
+    """
+
+    INPUT = "input"
+    SUCCESS = "success"
+    LOCATION = "location"
+    ERROR = "error"
+    GUI = "gui"
+    PLATFORM = "platform"
+    ENCOUNTER = "encounter"
+    CONTENT = "content"
+    TIMER = "timer"
+
+
+@singleton
+class GameEventScheduler:
+    """
+    This class is used to wake up the main game loop only when there is something to do.
+    The components that receive messages (Camelot input, success and error messages, the GUI and the platform) notify
+    the source of the message; the main loop sleeps until a source is notified or a timeout expires, then runs only the handlers
+    of the sources notified.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._pending_sources = set()
+
+    def notify(self, source : str):
+        """
+        This method is used to notify that a source has something to be handled. It can be called from any thread.
+
+        Parameters
+        ----------
+        source : str
+            The source of the event, e.g. EventSource.INPUT.
+        """
+        with self._condition:
+            self._pending_sources.add(source)
+            self._condition.notify()
+
+    def wait(self, timeout : float = None) -> set:
+        """
+        This method is used to sleep until at least one source has been notified or the timeout expires.
+
+        Parameters
+        ----------
+        timeout : float (Optional)
+            The maximum seconds to sleep. If it expires, the set contains EventSource.TIMER.
+
+        Returns
+        -------
+        set
+            The sources notified since the last call.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                if len(self._pending_sources) > 0:
+                    sources = self._pending_sources
+                    self._pending_sources = set()
+                    return sources
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    return {EventSource.TIMER}
+                self._condition.wait(None if deadline is None else deadline - now)
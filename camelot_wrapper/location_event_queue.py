@@ -0,0 +1,134 @@
+import threading
+from collections import deque
+from queue import Empty
+
+
+class LocationEventQueue:
+    """
+    This class is the queue of the location messages of Camelot waiting to be handled by the main thread.
+    It can be used in place of a queue.Queue of tuples (time, message), and coalesces the redundant events of the same character
+    that are still waiting: when a character exits a position it arrived at and that arrival has not been handled yet, both the
+    events are removed, since the character only passed through it. Arrivals that moved the character to another room are kept,
+    since they change the room the character is in. A message equal to the last one still waiting for the same character is
+    removed as well. The events left keep the order in which they have been received.
+
+    Attributes
+    ----------
+    coalesce : bool
+        If False, every message is kept.
+    coalesced : int
+        The number of messages removed because they were redundant.
+    """
+
+    def __init__(self, coalesce : bool = True):
+        self.coalesce = coalesce
+        self.coalesced = 0
+        # Entries [time, message, alive, same_room]; same_room is True for the arrivals within the room the character was already in.
+        # The entries removed by coalescing are only marked as not alive
+        self._entries = deque()
+        self._size = 0
+        # Last entry still waiting for each character, and the entries "arrived" still waiting for each (character, position)
+        self._last_entry = {}
+        self._pending_arrivals = {}
+        # Room of the last position each character arrived at
+        self._character_room = {}
+        self._condition = threading.Condition()
+
+    def _parse(self, message : str) -> tuple:
+        """
+        This method is used to get the kind, the character and the position of a location message,
+        e.g. "input arrived bob position alchemyshop.Door" -> ("arrived", "bob", "alchemyshop.Door").
+        """
+        message_parts = message.split(' ')
+        if len(message_parts) >= 5 and message_parts[3] == "position":
+            return message_parts[1], message_parts[2], message_parts[4]
+        return None, None, None
+
+    def put(self, item : tuple):
+        """
+        This method is used to add a message at the end of the queue.
+
+        Parameters
+        ----------
+        item : tuple
+            A tuple (time, message), where time is when the message has been received.
+        """
+        enqueued_at, message = item
+        with self._condition:
+            kind, character, position = self._parse(message) if self.coalesce else (None, None, None)
+            if character is not None:
+                last_entry = self._last_entry.get(character)
+                if last_entry is not None and last_entry[2] and last_entry[1] == message:
+                    # Same event again: the one already waiting is enough
+                    self.coalesced += 1
+                    return
+                arrival = self._pending_arrivals.pop((character, position), None)
+                if kind == "exited" and arrival is not None and arrival[2] and arrival[3]:
+                    # The character passed through the position before the arrival has been handled
+                    self._remove(arrival)
+                    self.coalesced += 2
+                    return
+            entry = [enqueued_at, message, True, False]
+            self._entries.append(entry)
+            self._size += 1
+            if character is not None:
+                self._last_entry[character] = entry
+                if kind == "arrived":
+                    room = position.split('.')[0]
+                    # The arrival can be coalesced only if the character was already in the same room
+                    entry[3] = self._character_room.get(character) == room
+                    self._character_room[character] = room
+                    self._pending_arrivals[(character, position)] = entry
+            self._condition.notify()
+
+    def _remove(self, entry : list):
+        """
+        This method is used to remove an entry that is still waiting.
+        """
+        entry[2] = False
+        self._size -= 1
+        for character, last_entry in list(self._last_entry.items()):
+            if last_entry is entry:
+                del self._last_entry[character]
+
+    def get_nowait(self) -> tuple:
+        """
+        This method is used to take the oldest message of the queue, raising queue.Empty if there is none.
+
+        Returns
+        -------
+        tuple
+            The tuple (time, message).
+        """
+        with self._condition:
+            return self._take()
+
+    def get(self) -> tuple:
+        """
+        This method is used to take the oldest message of the queue, waiting for one if there is none.
+
+        Returns
+        -------
+        tuple
+            The tuple (time, message).
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._size > 0)
+            return self._take()
+
+    def _take(self) -> tuple:
+        while len(self._entries) > 0:
+            entry = self._entries.popleft()
+            if not entry[2]:
+                continue
+            entry[2] = False
+            self._size -= 1
+            return entry[0], entry[1]
+        raise Empty
+
+    def qsize(self) -> int:
+        """
+        This method is used to get the number of messages waiting in the queue.
+        """
+        with self._condition:
+            return self._size
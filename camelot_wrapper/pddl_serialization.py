@@ -0,0 +1,92 @@
+import hashlib
+import json
+from pathlib import Path
+
+# Domain PDDL texts already generated, keyed by domain hash; kept for the life of the process
+_domain_cache = {}
+
+
+def get_domain_hash(domain_path : str) -> str:
+    """
+    This method is used to get the content hash that identifies the domain sent to the platform.
+    It covers the domain file and pddl_actions_to_camelot.json, since this decides which domain actions are available.
+
+    Parameters
+    ----------
+    domain_path : str
+        The path of the domain file.
+    """
+    digest = hashlib.sha256()
+    digest.update(Path(domain_path).read_bytes())
+    digest.update((Path(__file__).parent / "json_data" / "pddl_actions_to_camelot.json").read_bytes())
+    return digest.hexdigest()
+
+
+def get_domain_PDDL(domain, domain_hash : str) -> str:
+    """
+    This method is used to get the PDDL text of the domain, generating it only if it is not cached yet.
+    The text is cached in memory, so it is generated once for each version of the domain while the process runs.
+
+    Parameters
+    ----------
+    domain : Domain
+        The domain.
+    domain_hash : str
+        The hash of the domain, as returned by get_domain_hash.
+    """
+    if domain_hash not in _domain_cache:
+        _domain_cache[domain_hash] = domain.to_PDDL()
+    return _domain_cache[domain_hash]
+
+
+def iter_problem_PDDL(world_state, chunk_size : int = 64 * 1024):
+    """
+    This method is used to get the PDDL problem of the world state in pieces, to be streamed by iter_json_body.
+    The problem is rendered as a whole by ev_pddl (WorldState.to_PDDL), so that it is the same text the platform received before;
+    only the encoding of the JSON body is done one piece at a time, the problem text is held in memory while it is sent.
+
+    Parameters
+    ----------
+    world_state : WorldState
+        The world state to serialize.
+    chunk_size : int, default - 64 KB
+        The maximum number of characters of each piece.
+
+    Yields
+    ------
+    str
+        The next piece of the problem text.
+    """
+    problem_PDDL = world_state.to_PDDL()
+    for start in range(0, len(problem_PDDL), chunk_size):
+        yield problem_PDDL[start:start + chunk_size]
+
+
+def iter_json_body(message : dict, streamed_fields : dict):
+    """
+    This method is used to encode a JSON object one piece at a time, to be sent as a streaming request body.
+
+    Parameters
+    ----------
+    message : dict
+        The fields of the object that are already in memory.
+    streamed_fields : dict
+        The fields of the object whose string value is produced by an iterator of pieces.
+
+    Yields
+    ------
+    bytes
+        The next piece of the JSON object.
+    """
+    separator = "{"
+    for key, value in message.items():
+        yield (separator + json.dumps(key) + ":" + json.dumps(value)).encode()
+        separator = ","
+    for key, pieces in streamed_fields.items():
+        yield (separator + json.dumps(key) + ':"').encode()
+        for piece in pieces:
+            # A JSON string is the concatenation of its escaped pieces
+            yield json.dumps(piece)[1:-1].encode()
+        yield b'"'
+        separator = ","
+    yield b"}" if separator == "," else b"{}"
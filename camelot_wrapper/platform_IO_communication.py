@@ -1,11 +1,19 @@
 import logging
 from singleton_decorator import singleton
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import time
+from datetime import datetime
 import threading
 import queue
 import debugpy
+try:
+    from platform_spool import PlatformSpool
+    from game_event_scheduler import GameEventScheduler, EventSource
+except (ModuleNotFoundError, ImportError):
+    from .platform_spool import PlatformSpool
+    from .game_event_scheduler import GameEventScheduler, EventSource
 
 
 @singleton
@@ -15,58 +23,274 @@ class PlatformIOCommunication:
     """    
     communication_protocol_phase_messages = None
 
-    def __init__(self):
+    def __init__(self, pool_size = 4, connect_timeout = 0.5, read_timeout = 5.0, handshake_timeout = None, long_poll_timeout = 10.0, max_delivery_latency = 0.05,
+                 outbox_size = 1000, batch_window = 0.005, max_batch_size = 50, batch_messages = False,
+                 heartbeat_interval = 1.0, max_heartbeat_backoff = 30.0, max_send_retries = 5,
+                 spool_path = "logs/spool/platform_messages.spool", spool_max_messages = 10000, spool_max_bytes = 50 * 1024 * 1024):
+        """
+        Parameters
+        ----------
+        pool_size : int, default - 4
+            The number of keep-alive connections kept open towards the platform.
+        connect_timeout : float, default - 0.5
+            Seconds to wait for a connection to the platform to be established.
+        read_timeout : float, default - 5.0
+            Seconds to wait for the platform to reply once connected.
+        handshake_timeout : float (Optional)
+            Seconds to wait for the platform to reply to a message of the handshake once connected. If None it waits until the platform
+            replies, since the reply to phase 3 arrives only once the planner of the platform is ready.
+        long_poll_timeout : float, default - 10.0
+            Seconds the platform is asked to hold a receive request open while it has no messages.
+        max_delivery_latency : float, default - 0.05
+            Worst-case seconds between a message being available on the platform and it being in the local queue,
+            used when the platform answers receive requests immediately instead of holding them.
+        outbox_size : int, default - 1000
+            The maximum number of messages waiting in the outbox. Messages sent when the outbox is full are dropped.
+        batch_window : float, default - 0.005
+            Seconds the outbox sender waits for further messages to send them together with the first one.
+        max_batch_size : int, default - 50
+            The maximum number of messages sent together.
+        batch_messages : bool, default - False
+            True if the platform accepts a list of messages in a single request on the send message url.
+        heartbeat_interval : float, default - 1.0
+            Seconds between two liveness checks while the platform is online. It is also the first reconnection delay.
+        max_heartbeat_backoff : float, default - 30.0
+            The maximum seconds between two reconnection attempts while the platform is offline.
+        max_send_retries : int, default - 5
+            The maximum number of times a spooled message is sent again after the platform replied with a server error (5xx);
+            after that it is dropped, so that it does not hold back the messages spooled after it.
+        spool_path : str, default - "logs/spool/platform_messages.spool"
+            The file where the messages are kept while the platform is offline.
+        spool_max_messages : int, default - 10000
+            The maximum number of messages kept in the spool; the oldest are evicted first.
+        spool_max_bytes : int, default - 50 MB
+            The maximum size of the messages kept in the spool; the oldest are evicted first.
+        """
         self.base_link  = "http://127.0.0.1:8080/"
+        self._timeout = (connect_timeout, read_timeout)
+        self._handshake_timeout = (connect_timeout, handshake_timeout)
+        self._session = self._create_session(pool_size)
         self.__message_queue = queue.Queue()
+        self.__input_thread = None
+        self.__receiving = threading.Event()
+        self.long_poll_timeout = long_poll_timeout
+        self.max_delivery_latency = max_delivery_latency
+        self.__outbox = queue.Queue(maxsize=outbox_size)
+        self.__outbox_thread = None
+        # Guards the start of the sender thread and the metrics of the outbox
+        self.__outbox_lock = threading.Lock()
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.batch_messages = batch_messages
+        # Messages of the outbox acknowledged by the platform, spooled to be sent again, and refused by it
+        self._outbox_sent = 0
+        self._outbox_spooled = 0
+        self._outbox_failed = 0
+        self._outbox_dropped = 0
+        self._outbox_requests = 0
+        self._outbox_last_latency = 0.0
+        self._outbox_total_latency = 0.0
         self.initial_message_link = "inizialization_env"
         self.protocol_phase_link = "protocol_phase"
+        self.domain_hash_link = "domain_hash"
         self.receive_message_link = ""
         self.send_message_link = ""
-        self.__number_of_requests_plt_online = 100
         self.__platform_online = False
-        self.__max_number_of_requests_plt_online = 10
+        self.__heartbeat_thread = None
+        self.__heartbeat_lock = threading.Lock()
+        self.heartbeat_interval = heartbeat_interval
+        self.max_heartbeat_backoff = max_heartbeat_backoff
+        self.max_send_retries = max_send_retries
+        self.liveness_changed_at = None
+        self._spool = PlatformSpool(spool_path, spool_max_messages, spool_max_bytes)
+        self.__send_lock = threading.RLock()
         self.__number_of_requests_plt_rcv_mess = 999999
         # 500 max number of requests are 15ms 
         self.__max_number_of_requests_rcv_mess  = 1000
     
+    def _create_session(self, pool_size : int) -> requests.Session:
+        """
+        This method is used to create the session used for all the traffic towards the platform.
+        The session keeps the connections alive so that each request does not open a new TCP connection.
+
+        Parameters
+        ----------
+        pool_size : int
+            The number of connections kept in the pool.
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def close(self):
+        """
+        This method is used to close the connections kept open towards the platform.
+        """
+        self._session.close()
+
     def start(self):
-        self.communication_protocol_phase_messages = requests.get(self.base_link + "get_protocol_messages").json()
+        self.communication_protocol_phase_messages = self._session.get(self.base_link + "get_protocol_messages", timeout = self._timeout).json()
+        self._set_platform_online(True)
+        self.start_heartbeat()
+
+    def start_heartbeat(self):
+        """
+        This method is used to start the thread that checks in background if the platform is online.
+        """
+        with self.__heartbeat_lock:
+            if self.__heartbeat_thread is not None:
+                return
+            self.__heartbeat_thread = threading.Thread(target=self.__heartbeat_thread_method, daemon=True)
+            self.__heartbeat_thread.start()
+
+    def __heartbeat_thread_method(self):
+        """
+        Thread method that checks if the platform is online every heartbeat_interval seconds.
+        While the platform is offline the delay between two checks doubles at every failed attempt, up to max_heartbeat_backoff seconds.
+        """
+        logging.debug("PlatformIOCommunication:__heartbeat_thread_method: started")
+        delay = self.heartbeat_interval
+        while True:
+            online = self._check_platform_online()
+            self._set_platform_online(online)
+            if online:
+                if len(self._spool) > 0:
+                    self._flush_spool()
+                delay = self.heartbeat_interval
+                time.sleep(delay)
+            else:
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_heartbeat_backoff)
+
+    def _check_platform_online(self) -> bool:
+        """
+        This method is used to send a request to the platform to check if it is online.
+        """
+        try:
+            response = self._session.head(self.base_link, timeout=(self._timeout[0], 0.5))
+            return response.status_code == 200
+        except requests.exceptions.RequestException:
+            return False
+
+    def _set_platform_online(self, online : bool):
+        """
+        This method is used to update the cached liveness flag, logging when it changes.
+        """
+        if online != self.__platform_online or self.liveness_changed_at is None:
+            self.liveness_changed_at = datetime.now()
+            logging.info("PlatformIOCommunication -- Platform %s at %s" % ("online" if online else "offline", self.liveness_changed_at.isoformat()))
+        self.__platform_online = online
     
     def start_receiving_normal_messages(self):
         """
         This method is used to start the thread that receives normal messages from the platform.
+        Once started, receive_message reads from the local queue filled by the thread instead of polling the platform.
         """
-        self.__input_thread = threading.Thread(target=self.__receive_message_thread, args=(self.__message_queue), daemon=True)
+        if self.__receiving.is_set():
+            return
+        self.__receiving.set()
+        self.__input_thread = threading.Thread(target=self.__receive_message_thread, args=(self.__message_queue,), daemon=True)
         self.__input_thread.start()
-        pass
+
+    def stop_receiving_normal_messages(self):
+        """
+        This method is used to stop the thread that receives normal messages from the platform.
+        """
+        self.__receiving.clear()
+        if self.__input_thread is not None:
+            self.__input_thread.join()
+            self.__input_thread = None
 
     def __receive_message_thread(self, message_queue: queue.Queue):
         """
         This method is used to create a thread that continuosly makes request to the platform to receive a new message when available.
+        Each request asks the platform to hold it open for long_poll_timeout seconds until a message is available (long-polling).
+        If the platform answers immediately with no messages, the next request is sent no later than max_delivery_latency seconds after the previous one.
         """
-        debugpy.breakpoint()
         logging.debug("PlatformIOCommunication:__receive_message_thread: started")
-        while self._is_platform_online():
-            message = self.receive_message()
-            if message != "":
+        while self.__receiving.is_set():
+            request_start = time.perf_counter()
+            message = None
+            if self._is_platform_online():
+                try:
+                    response = self._session.get(self.base_link + self.receive_message_link,
+                                                 params = {'wait': self.long_poll_timeout},
+                                                 timeout = (self._timeout[0], self.long_poll_timeout + self._timeout[1]))
+                    if response.status_code == 200:
+                        message = response.json()
+                except (requests.exceptions.RequestException, ValueError) as inst:
+                    logging.debug("PlatformIOCommunication:__receive_message_thread -- Request failed: %s" % inst)
+            if message:
                 message_queue.put(message)
+                GameEventScheduler().notify(EventSource.PLATFORM)
                 logging.debug("PlatformIOCommunication:__receive_message_thread -- Received message and added to the queue: " + str(message))
-            time.sleep(1)
+                continue
+            elapsed = time.perf_counter() - request_start
+            if elapsed < self.max_delivery_latency:
+                time.sleep(self.max_delivery_latency - elapsed)
+        logging.debug("PlatformIOCommunication:__receive_message_thread: stopped")
     
-    def get_handshake_phase(self) -> str:
+    def get_handshake_phase(self, wait_for : str = None) -> str:
         """
         This method is used to get the handshake phase of the communication protocol.
 
+        Parameters
+        ----------
+        wait_for : str (Optional)
+            If set, the platform is asked to hold the request open for long_poll_timeout seconds until the handshake reaches this phase.
+
         Returns
         -------
         str
             The handshake phase.
         """
         if self._is_platform_online():
-            response = requests.get(self.base_link + self.protocol_phase_link)
+            if wait_for is None:
+                response = self._session.get(self.base_link + self.protocol_phase_link, timeout = self._timeout)
+            else:
+                response = self._session.get(self.base_link + self.protocol_phase_link,
+                                             params = {'wait_for': wait_for, 'wait': self.long_poll_timeout},
+                                             timeout = (self._timeout[0], self.long_poll_timeout + self._timeout[1]))
             return response.text.replace('"', '')
         return ""
 
+    def wait_for_handshake_phase(self, phase : str, timeout : float = None, poll_interval : float = 0.1) -> bool:
+        """
+        This method is used to block until the handshake of the communication protocol reaches a phase.
+        Each request is a long-poll, so the phase is received one round-trip after the platform advances.
+        If the platform answers immediately instead of holding the request, the next request is sent after poll_interval seconds.
+
+        Parameters
+        ----------
+        phase : str
+            The phase to wait for (e.g. "PHASE_3").
+        timeout : float (Optional)
+            The maximum seconds to wait. If None it waits until the phase is reached.
+        poll_interval : float, default - 0.1
+            Seconds between two requests when the platform does not hold them open.
+
+        Returns
+        -------
+        bool
+            True if the phase has been reached, False if the timeout expired.
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            request_start = time.perf_counter()
+            try:
+                if self.get_handshake_phase(wait_for = phase) == phase:
+                    return True
+            except requests.exceptions.RequestException as inst:
+                logging.debug("PlatformIOCommunication:wait_for_handshake_phase -- Request failed: %s" % inst)
+            now = time.perf_counter()
+            if deadline is not None and now >= deadline:
+                return False
+            elapsed = now - request_start
+            if elapsed < poll_interval:
+                time.sleep(poll_interval - elapsed)
+
     def send_message(self, message, inizialization = False):
         """
         This method is used to send a message to the platform.
@@ -75,34 +299,360 @@ class PlatformIOCommunication:
         ----------
         message : str
             The message to be sent.
+        inizialization : bool, default - False
+            True if the message is part of the handshake. Only normal messages are spooled while the platform is offline;
+            the reply to a handshake message is awaited for handshake_timeout seconds instead of read_timeout.
         """
+        if not inizialization:
+            return self.__send_or_spool("message", message)[1]
         if self._is_platform_online():
-            if inizialization:
-                if type(message) == str:
-                    data = {'text': message}
-                    response = requests.post(self.base_link + self.initial_message_link, json = data)
-                elif type(message) == dict:
-                    response = requests.post(self.base_link + self.initial_message_link, json = message)
-                else:
-                    return None
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    logging.error("Error sending message to platform")
-                    return None
+            if type(message) == str:
+                message = {'text': message}
+            elif type(message) != dict:
+                return None
+            try:
+                response = self._session.post(self.base_link + self.initial_message_link, json = message, timeout = self._handshake_timeout)
+            except requests.exceptions.RequestException as inst:
+                logging.error("PlatformIOCommunication -- Error sending handshake message to platform: %s" % inst)
+                return None
+            if response.status_code == 200:
+                return response.json()
+            else:
+                logging.error("Error sending message to platform")
+                return None
+
+    def send_streamed_initialization_message(self, body):
+        """
+        This method is used to send a message of the handshake whose body is produced one piece at a time.
+        The body is sent with chunked transfer encoding, so it is never held in memory as a whole. Like the other handshake messages,
+        the reply is awaited for handshake_timeout seconds.
+
+        Parameters
+        ----------
+        body : iterable
+            The pieces (bytes) of the JSON body.
+
+        Returns
+        -------
+        dict
+            The reply of the platform, or None if the platform is offline or replied with an error.
+        """
+        if self._is_platform_online():
+            try:
+                response = self._session.post(self.base_link + self.initial_message_link, data = body,
+                                              headers = {'Content-Type': 'application/json'}, timeout = self._handshake_timeout)
+            except requests.exceptions.RequestException as inst:
+                logging.error("PlatformIOCommunication -- Error sending handshake message to platform: %s" % inst)
+                return None
+            if response.status_code == 200:
+                return response.json()
             else:
-                message_preparation = {
-                    'text':message,
-                    'to_user_role' : 'EM'
-                }
-                logging.info("PlatformIOCommunication -- Sending message to platform: " + str(message_preparation))
-                response = requests.post(self.base_link + self.send_message_link, json = message_preparation)
+                logging.error("Error sending message to platform")
+        return None
+
+    def platform_has_domain(self, domain_hash : str) -> bool:
+        """
+        This method is used to ask the platform if it already has the domain with the given hash, so that it does not need to be sent again.
+        Platforms that don't support the request are treated as not having the domain.
+
+        Parameters
+        ----------
+        domain_hash : str
+            The hash of the domain.
+        """
+        if not self._is_platform_online():
+            return False
+        try:
+            response = self._session.get(self.base_link + self.domain_hash_link, params = {'hash': domain_hash}, timeout = self._timeout)
+            return response.status_code == 200 and response.json().get('known', False) == True
+        except (requests.exceptions.RequestException, ValueError, AttributeError):
+            return False
+
+    def __send_or_spool(self, kind : str, message):
+        """
+        This method is used to send a normal or error message to the platform, or to append it to the spool if the platform is offline.
+        Messages already in the spool are sent first, so the platform receives all the messages in order. A message the platform
+        replies to with a server error (5xx) is spooled too, and sent again with the spool; a message the platform refuses
+        (any other status code, e.g. 400) is logged and dropped, since sending it again would not change the reply.
+
+        Parameters
+        ----------
+        kind : str
+            "message" for a normal message, "error" for an error message.
+        message : str
+            The message to be sent.
+
+        Returns
+        -------
+        tuple
+            The outcome, "sent" if the platform acknowledged the message, "spooled" if it was offline or replied with a server error,
+            or "failed" if it refused the message;
+            and the reply of the platform, None if the message has not been acknowledged or it is an error message.
+        """
+        with self.__send_lock:
+            if self._is_platform_online() and self._flush_spool():
+                try:
+                    response = self._post(kind, message)
+                except requests.exceptions.RequestException as inst:
+                    logging.error("PlatformIOCommunication -- Error sending message to platform, message spooled: %s" % inst)
+                    self._spool.append(kind, message)
+                    return "spooled", None
                 if response.status_code == 200:
-                    return response.json()
+                    return "sent", response.json() if kind == "message" else None
+                if response.status_code >= 500:
+                    logging.error("PlatformIOCommunication -- Error sending message to platform, status code %d, message spooled" % response.status_code)
+                    self._spool.append(kind, message)
+                    return "spooled", None
+                logging.error("PlatformIOCommunication -- Message refused by the platform, status code %d, message dropped: %s" % (response.status_code, message))
+                return "failed", None
+            self._spool.append(kind, message)
+            return "spooled", None
+
+    def _post(self, kind : str, message) -> requests.Response:
+        """
+        This method is used to make the request that sends a normal or error message to the platform.
+
+        Parameters
+        ----------
+        kind : str
+            "message" for a normal message, "error" for an error message.
+        message : str or list
+            The message to be sent. A list of normal messages is sent in one request.
+        """
+        if kind == "error":
+            return self._session.post(self.base_link + "add_error_message", data = json.dumps({'text':message, "error_type": ""}), timeout = self._timeout)
+        if type(message) == list:
+            message_preparation = [{'text': text, 'to_user_role': 'EM'} for text in message]
+        else:
+            message_preparation = {
+                'text':message,
+                'to_user_role' : 'EM'
+            }
+        logging.info("PlatformIOCommunication -- Sending message to platform: " + str(message_preparation))
+        return self._session.post(self.base_link + self.send_message_link, json = message_preparation, timeout = self._timeout)
+
+    def _flush_spool(self) -> bool:
+        """
+        This method is used to send to the platform, in order, the messages spooled while it was offline.
+        Normal messages are sent max_batch_size at a time when batch_messages is True.
+        A message stays in the spool until the platform answers 200 to it, or until it is dropped: at once if the platform refuses
+        it (any status code other than 200 and 5xx), or after max_send_retries server errors (5xx).
+
+        Returns
+        -------
+        bool
+            True if the spool is empty, False if the platform went offline or failed before all the messages were sent.
+        """
+        with self.__send_lock:
+            # Set when the platform refused a batch, so that only the messages it refuses are dropped
+            one_at_a_time = not self.batch_messages
+            while len(self._spool) > 0:
+                if not self.__platform_online:
+                    return False
+                entries = self._spool.peek(1 if one_at_a_time else self.max_batch_size)
+                messages = [text for kind, text in entries if kind == "message"]
+                try:
+                    if len(entries) > 1 and len(messages) == len(entries):
+                        response = self._post("message", messages)
+                    else:
+                        entries = entries[:1]
+                        response = self._post(entries[0][0], entries[0][1])
+                except requests.exceptions.RequestException as inst:
+                    logging.error("PlatformIOCommunication -- Error flushing the spool: %s" % inst)
+                    return False
+                if response.status_code == 200:
+                    self._spool.pop(len(entries))
+                    logging.debug("PlatformIOCommunication -- %d spooled messages sent to platform" % len(entries))
+                elif response.status_code >= 500:
+                    failures = self._spool.record_failure()
+                    if failures <= self.max_send_retries:
+                        logging.error("PlatformIOCommunication -- Error flushing the spool, status code: %d" % response.status_code)
+                        return False
+                    logging.error("PlatformIOCommunication -- Spooled message dropped after %d failed attempts: %s" % (failures, entries[0][1]))
+                    self._spool.pop(1, dropped=True)
+                elif len(entries) > 1:
+                    one_at_a_time = True
                 else:
-                    logging.error("PlatformIOCommunication -- Error sending message to platform")
-                    return None
+                    logging.error("PlatformIOCommunication -- Spooled message refused by the platform, status code %d, message dropped: %s" % (response.status_code, entries[0][1]))
+                    self._spool.pop(1, dropped=True)
+            return True
+
+    def get_spool_metrics(self) -> dict:
+        """
+        This method is used to get the metrics of the spool of the messages kept while the platform is offline.
+        """
+        return self._spool.get_metrics()
     
+    def send_message_async(self, message):
+        """
+        This method is used to add a message to the outbox. The message is sent to the platform by a background thread,
+        so the caller does not wait for the request to the platform to complete.
+
+        Parameters
+        ----------
+        message : str
+            The message to be sent.
+
+        Returns
+        -------
+        bool
+            True if the message has been added to the outbox, False if it has been dropped because the outbox is full.
+        """
+        return self.__put_in_outbox(("message", message, time.perf_counter()))
+
+    def send_error_message_async(self, message):
+        """
+        This method is used to add an error message to the outbox. The message is sent to the platform by a background thread.
+
+        Parameters
+        ----------
+        message : str
+            The error message to be sent.
+
+        Returns
+        -------
+        bool
+            True if the message has been added to the outbox, False if it has been dropped because the outbox is full.
+        """
+        return self.__put_in_outbox(("error", message, time.perf_counter()))
+
+    def get_outbox_metrics(self) -> dict:
+        """
+        This method is used to get the metrics of the outbox.
+
+        Returns
+        -------
+        dict
+            "queue_depth": messages waiting to be sent; "sent": messages acknowledged by the platform; "spooled": messages spooled
+            because the platform was offline or replied with a server error; "failed": messages refused by the platform or not sent because
+            of an unexpected error, dropped;
+            "dropped": messages dropped because the outbox was full; "requests": requests made to the platform; "last_send_latency" and "mean_send_latency":
+            seconds from when a message acknowledged is added to the outbox to when its request completes.
+        """
+        with self.__outbox_lock:
+            return {
+                "queue_depth": self.__outbox.qsize(),
+                "sent": self._outbox_sent,
+                "spooled": self._outbox_spooled,
+                "failed": self._outbox_failed,
+                "dropped": self._outbox_dropped,
+                "requests": self._outbox_requests,
+                "last_send_latency": self._outbox_last_latency,
+                "mean_send_latency": self._outbox_total_latency / self._outbox_sent if self._outbox_sent > 0 else 0.0,
+            }
+
+    def __put_in_outbox(self, item : tuple) -> bool:
+        """
+        This method is used to add an item to the outbox, starting the sender thread the first time.
+        """
+        with self.__outbox_lock:
+            if self.__outbox_thread is None:
+                self.__outbox_thread = threading.Thread(target=self.__outbox_sender_thread, args=(self.__outbox,), daemon=True)
+                self.__outbox_thread.start()
+        try:
+            self.__outbox.put_nowait(item)
+        except queue.Full:
+            with self.__outbox_lock:
+                self._outbox_dropped += 1
+            logging.warning("PlatformIOCommunication -- Outbox full, message dropped: " + str(item[1]))
+            return False
+        return True
+
+    def __outbox_sender_thread(self, outbox: queue.Queue):
+        """
+        Thread method that sends the messages in the outbox to the platform, in the order they were added.
+        Messages that arrive within batch_window seconds of each other are sent in one request when batch_messages is True.
+        An unexpected error (e.g. writing the spool file) is logged and the messages of the batch are counted as failed; the thread goes on.
+        """
+        logging.debug("PlatformIOCommunication:__outbox_sender_thread: started")
+        while True:
+            batch = [outbox.get()]
+            deadline = time.perf_counter() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(outbox.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self.__send_outbox_batch(batch)
+            except Exception as inst:
+                logging.exception("PlatformIOCommunication -- Error sending %d outbox messages to platform: %s" % (len(batch), inst))
+                self.__record_outcome(batch, "failed")
+
+    def __send_outbox_batch(self, batch : list):
+        """
+        This method is used to send a batch of items taken from the outbox, keeping their order.
+        """
+        messages = [item for item in batch if item[0] == "message"]
+        if self.batch_messages and len(messages) > 1 and len(messages) == len(batch):
+            with self.__send_lock:
+                outcome = "spooled"
+                if self._is_platform_online() and self._flush_spool():
+                    try:
+                        logging.info("PlatformIOCommunication -- Sending %d messages to platform in one request" % len(messages))
+                        with self.__outbox_lock:
+                            self._outbox_requests += 1
+                        response = self._post("message", [item[1] for item in messages])
+                        if response.status_code == 200:
+                            outcome = "sent"
+                        elif response.status_code >= 500:
+                            logging.error("PlatformIOCommunication -- Error sending outbox messages to platform, status code %d, messages spooled" % response.status_code)
+                        else:
+                            outcome = "failed"
+                            logging.warning("PlatformIOCommunication -- Outbox messages refused by the platform, status code %d, sent again one at a time" % response.status_code)
+                    except requests.exceptions.RequestException as inst:
+                        logging.error("PlatformIOCommunication -- Error sending outbox messages to platform, messages spooled: %s" % inst)
+                if outcome == "spooled":
+                    for item in messages:
+                        self._spool.append("message", item[1])
+                if outcome != "failed":
+                    self.__record_outcome(batch, outcome)
+                    return
+                # Only the messages the platform refuses are dropped; the lock keeps the others in order
+                self.__send_outbox_items(batch)
+            return
+        self.__send_outbox_items(batch)
+
+    def __send_outbox_items(self, batch : list):
+        """
+        This method is used to send the items taken from the outbox one at a time, keeping their order.
+        """
+        for item in batch:
+            outcome = "failed"
+            try:
+                with self.__outbox_lock:
+                    self._outbox_requests += 1
+                outcome = self.__send_or_spool(item[0], item[1])[0]
+            except Exception as inst:
+                logging.exception("PlatformIOCommunication -- Error sending outbox message to platform: %s" % inst)
+            self.__record_outcome([item], outcome)
+
+    def __record_outcome(self, items : list, outcome : str):
+        """
+        This method is used to update the outbox metrics once the items have been sent, spooled or refused.
+
+        Parameters
+        ----------
+        items : list
+            The items taken from the outbox.
+        outcome : str
+            "sent" if the platform acknowledged them, "spooled" or "failed".
+        """
+        now = time.perf_counter()
+        with self.__outbox_lock:
+            if outcome == "spooled":
+                self._outbox_spooled += len(items)
+            elif outcome == "failed":
+                self._outbox_failed += len(items)
+            else:
+                for item in items:
+                    self._outbox_last_latency = now - item[2]
+                    self._outbox_total_latency += self._outbox_last_latency
+                    self._outbox_sent += 1
+
     def get_received_message(self):
         """
         This method is used to get the received message from the platform.
@@ -120,16 +670,20 @@ class PlatformIOCommunication:
     def receive_message(self) -> str:
         """
         This method is used to receive a message from the platform.
+        If the receiving thread is running the message is taken from the local queue without any request to the platform.
 
         Returns
         -------
         str
             The message received from the platform.
         """
+        if self.__receiving.is_set():
+            message = self.get_received_message()
+            return message if message != "" else None
         if self.__number_of_requests_plt_rcv_mess > self.__max_number_of_requests_rcv_mess:
             self.__number_of_requests_plt_rcv_mess = 0
             if self._is_platform_online():
-                response = requests.get(self.base_link + self.receive_message_link)
+                response = self._session.get(self.base_link + self.receive_message_link, timeout = self._timeout)
                 if response.status_code == 200:
                     if response.json() == []:
                         return None
@@ -149,27 +703,15 @@ class PlatformIOCommunication:
         message : str
             The error message to be sent.
         """
-        if self._is_platform_online():
-            response = requests.post(self.base_link + "add_error_message", data = json.dumps({'text':message, "error_type": ""}))
-            pass
+        self.__send_or_spool("error", message)
 
     def _is_platform_online(self):
         """
         This method is used to check if the platform is online.
-        It does that every X times this method is called to avoid congestion on API side.
+        It reads the flag kept updated by the heartbeat thread, so it does not make any request to the platform.
+        The first time it is called, if the heartbeat is not running yet, it checks the platform once and starts the heartbeat.
         """
-        if self.__number_of_requests_plt_online > self.__max_number_of_requests_plt_online:
-            try:
-                response = requests.head(self.base_link, timeout=0.5)
-                if response.status_code == 200:
-                    self.__platform_online = True
-                else:
-                    self.__platform_online = False
-            except:
-                self.__platform_online = False
-            self.__number_of_requests_plt_online = 0
-        else:
-            self.__number_of_requests_plt_online += 1
-        
+        if self.__heartbeat_thread is None:
+            self._set_platform_online(self._check_platform_online())
+            self.start_heartbeat()
         return self.__platform_online
-
@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import threading
+from collections import deque
+from pathlib import Path
+
+
+class PlatformSpool:
+    """
+    This class is a disk-backed, append-only spool for the messages that can't be sent to the platform while it is offline.
+    Messages are appended to the end of the spool file and read back in order when the platform is online again; a message is
+    removed once the platform has answered 200 to it, or dropped if the platform refuses it or keeps failing on it (see
+    PlatformIOCommunication._flush_spool). When the spool is over its limits the oldest messages are evicted first.
+
+    Attributes
+    ----------
+    path : str
+        The path of the spool file. The file is created, or emptied if it already exists, when the first message is appended.
+    max_messages : int
+        The maximum number of messages kept in the spool.
+    max_bytes : int
+        The maximum size in bytes of the messages kept in the spool.
+    """
+
+    def __init__(self, path : str, max_messages : int = 10000, max_bytes : int = 50 * 1024 * 1024):
+        self.path = str(path)
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self._file = None
+        # Size of each message in the spool file, from the oldest to the newest
+        self._sizes = deque()
+        # Offset of the oldest message still in the spool; everything before it has been flushed or evicted
+        self._start_offset = 0
+        self._end_offset = 0
+        self._lock = threading.RLock()
+        # Failed attempts to send the oldest message
+        self._head_failures = 0
+        self.spooled = 0
+        self.flushed = 0
+        self.evicted = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def _open(self):
+        """
+        This method is used to create the spool file the first time a message is appended.
+        """
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'w+b')
+
+    def append(self, kind : str, text):
+        """
+        This method is used to append a message at the end of the spool.
+
+        Parameters
+        ----------
+        kind : str
+            "message" for a normal message, "error" for an error message.
+        text : str
+            The message.
+        """
+        line = (json.dumps({'kind': kind, 'text': text}) + "\n").encode()
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._file.seek(0, os.SEEK_END)
+            self._file.write(line)
+            self._file.flush()
+            self._sizes.append(len(line))
+            self._end_offset += len(line)
+            self.spooled += 1
+            self._evict()
+
+    def _evict(self):
+        """
+        This method is used to evict the oldest messages while the spool is over its limits.
+        Evicted messages are only skipped; the file is compacted once they take more space than the messages left.
+        """
+        while len(self._sizes) > 0 and (len(self._sizes) > self.max_messages or self._end_offset - self._start_offset > self.max_bytes):
+            self._start_offset += self._sizes.popleft()
+            self._head_failures = 0
+            self.evicted += 1
+            logging.warning("PlatformSpool -- Spool full, oldest message evicted")
+        if self._start_offset > self._end_offset - self._start_offset:
+            self._compact()
+
+    def _compact(self):
+        """
+        This method is used to remove from the spool file the messages that have been flushed or evicted.
+        """
+        self._file.seek(self._start_offset)
+        live = self._file.read(self._end_offset - self._start_offset)
+        self._file.seek(0)
+        self._file.write(live)
+        self._file.truncate()
+        self._file.flush()
+        self._end_offset = len(live)
+        self._start_offset = 0
+
+    def peek(self, count : int = 1) -> list:
+        """
+        This method is used to read the oldest messages of the spool without removing them.
+
+        Parameters
+        ----------
+        count : int, default - 1
+            The maximum number of messages to read.
+
+        Returns
+        -------
+        list
+            A list of tuples (kind, text), from the oldest.
+        """
+        with self._lock:
+            count = min(count, len(self._sizes))
+            if count == 0:
+                return []
+            self._file.seek(self._start_offset)
+            messages = []
+            for _ in range(count):
+                entry = json.loads(self._file.readline())
+                messages.append((entry['kind'], entry['text']))
+            return messages
+
+    def record_failure(self) -> int:
+        """
+        This method is used to count a failed attempt to send the oldest message.
+
+        Returns
+        -------
+        int
+            The failed attempts to send the oldest message so far.
+        """
+        with self._lock:
+            self._head_failures += 1
+            return self._head_failures
+
+    def pop(self, count : int = 1, dropped : bool = False):
+        """
+        This method is used to remove the oldest messages once the platform has acknowledged them.
+
+        Parameters
+        ----------
+        count : int, default - 1
+            The number of messages to remove.
+        dropped : bool, default - False
+            True if the messages are removed without having been acknowledged.
+        """
+        with self._lock:
+            for _ in range(min(count, len(self._sizes))):
+                self._start_offset += self._sizes.popleft()
+                self._head_failures = 0
+                if dropped:
+                    self.dropped += 1
+                else:
+                    self.flushed += 1
+            if len(self._sizes) == 0 and self._file is not None:
+                self._file.seek(0)
+                self._file.truncate()
+                self._start_offset = 0
+                self._end_offset = 0
+
+    def get_metrics(self) -> dict:
+        """
+        This method is used to get the metrics of the spool.
+
+        Returns
+        -------
+        dict
+            "depth": messages in the spool; "bytes": size of the messages in the spool; "spooled", "flushed", "evicted" and "dropped":
+            messages appended, sent after the platform came back online, evicted because the spool was full and dropped because the
+            platform refused them or failed on them too many times.
+        """
+        with self._lock:
+            return {
+                "depth": len(self._sizes),
+                "bytes": self._end_offset - self._start_offset,
+                "spooled": self.spooled,
+                "flushed": self.flushed,
+                "evicted": self.evicted,
+                "dropped": self.dropped,
+            }
+
+    def close(self):
+        """
+        This method is used to close the spool file.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,354 @@
+import logging
+import json
+import time
+import random
+import threading
+import sys
+import getopt
+import socket
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+class PlatformStandIn:
+    """
+    This class is a lightweight local stand-in for the evaluation platform.
+    It implements the communication protocol used by PlatformIOCommunication so that the handshake and the
+    message exchange can be run offline, in benchmarks and in regression tests.
+
+    Attributes
+    ----------
+    protocol_messages : dict
+        The messages of each phase of the communication protocol, served on get_protocol_messages.
+    phase : str
+        The current phase of the handshake.
+    received_messages : list
+        The messages sent by the environment to the EM.
+    received_errors : list
+        The error messages sent by the environment.
+    initialization_messages : list
+        The messages received on the initialization url.
+    known_domain_hashes : set
+        The hashes of the domains received during phase 3, answered on domain_hash.
+    refused_texts : set
+        The texts of the messages the stand-in refuses with status 400, e.g. to test how the environment handles them.
+    """
+
+    protocol_messages = {
+        "PHASE_1": {"message_1": "PHASE_1", "message_2": "Platform started"},
+        "PHASE_2": {"message_3": "Hello, I am ", "message_4": "Welcome to the platform"},
+        "PHASE_3": {"message_5": "Waiting for the environment", "message_6": "Domain and problem"},
+        "PHASE_4": {"message_7": "Waiting for the EM", "message_8": "EM ready", "message_9": "Start communication"},
+        "PHASE_5": {"message_10": "Communication started"},
+    }
+    send_message_link = "add_message_env"
+    receive_message_link = "get_message_env"
+
+    def __init__(self, host = "127.0.0.1", port = 8080, phase_delays = None, latency = 0.0, latency_jitter = 0.0, long_polling = True, wire_formats = None,
+                 planner_delay = 0.0):
+        """
+        Parameters
+        ----------
+        host : str, default - "127.0.0.1"
+            The address the server listens on.
+        port : int, default - 8080
+            The port the server listens on. 0 picks a free port.
+        phase_delays : dict (Optional)
+            Seconds to wait before moving to a phase, keyed by phase. By default PHASE_3 follows the end of phase 2 after 0.5 seconds
+            and PHASE_5 follows the end of phase 4 immediately.
+        latency : float, default - 0.0
+            Seconds added before every response.
+        latency_jitter : float, default - 0.0
+            Maximum random seconds added to latency.
+        long_polling : bool, default - True
+            If True, requests with the 'wait' parameter are held open until there is something to answer.
+        wire_formats : list (Optional)
+            The formats of the changed relations messages the stand-in accepts, in order of preference.
+            The first one also offered by the environment is chosen during phase 3. If None, no format is chosen.
+        planner_delay : float, default - 0.0
+            Seconds the reply to the phase 3 message is held back, as the platform does until its planner is ready.
+        """
+        self.phase_delays = {"PHASE_3": 0.5, "PHASE_5": 0.0}
+        if phase_delays is not None:
+            self.phase_delays.update(phase_delays)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.long_polling = long_polling
+        self.wire_formats = wire_formats if wire_formats is not None else []
+        self.planner_delay = planner_delay
+        self.online = True
+        self.refused_texts = set()
+        self.phase = "PHASE_1"
+        self.received_messages = []
+        self.received_errors = []
+        self.initialization_messages = []
+        self.known_domain_hashes = set()
+        self._pending_actions = []
+        self._condition = threading.Condition()
+        self._connections = set()
+        self._server = ThreadingHTTPServer((host, port), self._create_handler())
+        self._server.daemon_threads = True
+        self._server_thread = None
+
+    @property
+    def base_link(self) -> str:
+        """
+        The url PlatformIOCommunication has to use as base_link to talk with this stand-in.
+        """
+        host, port = self._server.server_address[:2]
+        return "http://%s:%d/" % (host, port)
+
+    def start(self):
+        """
+        This method is used to start serving requests in a background thread.
+        """
+        self._server_thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._server_thread.start()
+        logging.info("PlatformStandIn: listening on " + self.base_link)
+
+    def stop(self):
+        """
+        This method is used to stop the server, closing also the keep-alive connections still open.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        for connection in list(self._connections):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def set_phase(self, phase : str, delay : float = 0.0):
+        """
+        This method is used to move the handshake to a phase, optionally after a delay.
+
+        Parameters
+        ----------
+        phase : str
+            The new phase.
+        delay : float, default - 0.0
+            Seconds to wait before changing phase.
+        """
+        if delay > 0:
+            threading.Timer(delay, self.set_phase, args=(phase,)).start()
+            return
+        with self._condition:
+            self.phase = phase
+            self._condition.notify_all()
+        logging.debug("PlatformStandIn: moved to " + phase)
+
+    def set_online(self, online : bool):
+        """
+        This method is used to simulate an outage: while the stand-in is offline every request is answered with status 503.
+
+        Parameters
+        ----------
+        online : bool
+            False to start the outage, True to end it.
+        """
+        self.online = online
+        logging.debug("PlatformStandIn: %s" % ("online" if online else "offline"))
+
+    def add_action(self, text : str):
+        """
+        This method is used to add an action that the EM sends to the environment.
+
+        Parameters
+        ----------
+        text : str
+            The PDDL action (e.g. "move-within-location(father, annara, Tavern)").
+        """
+        with self._condition:
+            self._pending_actions.append({'text': text})
+            self._condition.notify_all()
+
+    def feed_actions(self, feed):
+        """
+        This method is used to script the actions that the EM sends to the environment.
+
+        Parameters
+        ----------
+        feed : iterable
+            Tuples (delay, text): each action is added delay seconds after the previous one.
+        """
+        def run_feed():
+            for delay, text in feed:
+                time.sleep(delay)
+                self.add_action(text)
+        threading.Thread(target=run_feed, daemon=True).start()
+
+    def _take_actions(self, wait : float) -> list:
+        """
+        This method is used to take all the pending actions, waiting up to wait seconds for one if there are none.
+        """
+        with self._condition:
+            if self.long_polling and wait > 0:
+                self._condition.wait_for(lambda: len(self._pending_actions) > 0, timeout=wait)
+            actions = self._pending_actions
+            self._pending_actions = []
+        return actions
+
+    def _get_phase(self, wait_for : str, wait : float) -> str:
+        """
+        This method is used to get the current phase, waiting up to wait seconds for wait_for if it is set.
+        """
+        with self._condition:
+            if self.long_polling and wait_for is not None and wait > 0:
+                self._condition.wait_for(lambda: self.phase == wait_for, timeout=wait)
+            return self.phase
+
+    def _handle_initialization(self, message : dict) -> dict:
+        """
+        This method is used to answer the messages of phase 2 and phase 3 of the handshake.
+        """
+        self.initialization_messages.append(message)
+        text = message.get('text', '')
+        if text.startswith(self.protocol_messages['PHASE_2']['message_3']):
+            self.set_phase("PHASE_3", self.phase_delays["PHASE_3"])
+            return {'text': self.protocol_messages['PHASE_2']['message_4']}
+        if text == self.protocol_messages['PHASE_3']['message_6']:
+            if self.planner_delay > 0:
+                time.sleep(self.planner_delay)
+            if 'domain' in message and 'domain_hash' in message:
+                self.known_domain_hashes.add(message['domain_hash'])
+            self.set_phase("PHASE_5", self.phase_delays["PHASE_5"])
+            reply = {
+                'text': self.protocol_messages['PHASE_4']['message_9'],
+                'add_message_url': '/' + self.send_message_link,
+                'get_message_url': '/' + self.receive_message_link
+            }
+            offered = message.get('wire_formats', [])
+            chosen = [wire_format for wire_format in self.wire_formats if wire_format in offered]
+            if len(chosen) > 0:
+                reply['wire_format'] = chosen[0]
+            return reply
+        return {'text': 'Message not recognized'}
+
+    def _create_handler(self):
+        stand_in = self
+
+        class StandInRequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                stand_in._connections.add(self.connection)
+
+            def finish(self):
+                stand_in._connections.discard(self.connection)
+                super().finish()
+
+            def _inject_latency(self):
+                if stand_in.latency > 0 or stand_in.latency_jitter > 0:
+                    time.sleep(stand_in.latency + random.uniform(0, stand_in.latency_jitter))
+
+            def _reply(self, content, status = 200):
+                body = json.dumps(content).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_body(self):
+                if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                    body = b""
+                    while True:
+                        chunk_size = int(self.rfile.readline().strip().split(b";")[0], 16)
+                        if chunk_size == 0:
+                            self.rfile.readline()
+                            break
+                        body += self.rfile.read(chunk_size)
+                        self.rfile.readline()
+                    return json.loads(body or b'null')
+                length = int(self.headers.get("Content-Length", 0))
+                return json.loads(self.rfile.read(length) or b'null')
+
+            def do_HEAD(self):
+                self.send_response(200 if stand_in.online else 503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_GET(self):
+                self._inject_latency()
+                if not stand_in.online:
+                    self._reply({'text': 'Service unavailable'}, 503)
+                    return
+                url = urlparse(self.path)
+                path = url.path.strip('/')
+                query = parse_qs(url.query)
+                wait = float(query.get('wait', ['0'])[0])
+                if path == "get_protocol_messages":
+                    self._reply(stand_in.protocol_messages)
+                elif path == "protocol_phase":
+                    self._reply(stand_in._get_phase(query.get('wait_for', [None])[0], wait))
+                elif path == stand_in.receive_message_link:
+                    self._reply(stand_in._take_actions(wait))
+                elif path == "domain_hash":
+                    self._reply({'known': query.get('hash', [None])[0] in stand_in.known_domain_hashes})
+                else:
+                    self._reply({'text': 'Not found'}, 404)
+
+            def do_POST(self):
+                self._inject_latency()
+                path = urlparse(self.path).path.strip('/')
+                message = self._read_body()
+                if not stand_in.online:
+                    self._reply({'text': 'Service unavailable'}, 503)
+                    return
+                if path == "inizialization_env":
+                    self._reply(stand_in._handle_initialization(message))
+                elif path == stand_in.send_message_link:
+                    texts = [item.get('text') for item in message] if type(message) == list else [message.get('text')]
+                    if any(text in stand_in.refused_texts for text in texts):
+                        self._reply({'text': 'Message refused'}, 400)
+                        return
+                    if type(message) == list:
+                        stand_in.received_messages.extend(message)
+                    else:
+                        stand_in.received_messages.append(message)
+                    self._reply({'text': 'OK'})
+                elif path == "add_error_message":
+                    stand_in.received_errors.append(message)
+                    self._reply({'text': 'OK'})
+                else:
+                    self._reply({'text': 'Not found'}, 404)
+
+            def log_message(self, format, *args):
+                logging.debug("PlatformStandIn: " + format % args)
+
+        return StandInRequestHandler
+
+
+def main(argv):
+    port = 8080
+    latency = 0.0
+    try:
+        opts, args = getopt.getopt(argv, "hp:l:")
+    except getopt.GetoptError:
+        print('Parameter not recognized')
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print("usage: python platform_stand_in.py <optional> -p <port> -l <latency in seconds>")
+            sys.exit()
+        elif opt == '-p':
+            port = int(arg)
+        elif opt == '-l':
+            latency = float(arg)
+    logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.INFO)
+    stand_in = PlatformStandIn(port=port, latency=latency)
+    stand_in.start()
+    try:
+        for line in sys.stdin:
+            # Each line typed is sent to the environment as an action of the EM
+            if line.strip() != "":
+                stand_in.add_action(line.strip())
+    except KeyboardInterrupt:
+        pass
+    stand_in.stop()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
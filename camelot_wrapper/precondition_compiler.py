@@ -0,0 +1,367 @@
+import re
+from pathlib import Path
+
+
+# Compilers already created, keyed by domain path
+_compilers = {}
+
+
+def get_precondition_compiler(domain_path : str):
+    """
+    This method is used to get the PreconditionCompiler of a domain, creating it the first time.
+
+    Parameters
+    ----------
+    domain_path : str
+        The path of the domain file.
+    """
+    domain_path = str(domain_path)
+    if domain_path not in _compilers:
+        _compilers[domain_path] = PreconditionCompiler(domain_path)
+    return _compilers[domain_path]
+
+
+def parse_sexpression(text : str) -> list:
+    """
+    This method is used to parse a PDDL text in nested lists of tokens, ignoring the comments.
+
+    Parameters
+    ----------
+    text : str
+        The PDDL text, e.g. "(and (in father Tavern) (alive father))".
+
+    Returns
+    -------
+    list
+        The expressions of the text, e.g. [["and", ["in", "father", "Tavern"], ["alive", "father"]]].
+    """
+    tokens = re.findall(r"\(|\)|[^\s()]+", re.sub(r";[^\n]*", "", text))
+    stack = [[]]
+    for token in tokens:
+        if token == "(":
+            stack.append([])
+        elif token == ")":
+            if len(stack) == 1:
+                raise ValueError("Unbalanced parenthesis in PDDL text.")
+            expression = stack.pop()
+            stack[-1].append(expression)
+        else:
+            stack[-1].append(token)
+    if len(stack) != 1:
+        raise ValueError("Unbalanced parenthesis in PDDL text.")
+    return stack[0]
+
+
+def parse_typed_list(tokens : list) -> list:
+    """
+    This method is used to parse a PDDL typed list, e.g. "?who - character ?from ?to - location".
+
+    Returns
+    -------
+    list
+        A list of tuples (name, type); type is "object" if it is not given.
+    """
+    typed_list = []
+    untyped = []
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        if token == "-" or (token.startswith("-") and len(token) > 1):
+            # The type can be written also attached to the dash, e.g. "?who -character"
+            if token == "-":
+                index += 1
+                type_name = tokens[index]
+            else:
+                type_name = token[1:]
+            typed_list.extend((name, type_name) for name in untyped)
+            untyped = []
+        else:
+            untyped.append(token)
+        index += 1
+    typed_list.extend((name, "object") for name in untyped)
+    return typed_list
+
+
+class WorldStateIndex:
+    """
+    This class is an index of a world state used by the compiled evaluators: the true relations are kept as a set of tuples
+    (predicate, entity, ...) and the entities are grouped by type, including the supertypes.
+
+    Attributes
+    ----------
+    facts : set
+        The true relations, e.g. ("in", "father", "Tavern").
+    """
+
+    def __init__(self, facts = (), entity_types : dict = None, type_parents : dict = None):
+        """
+        Parameters
+        ----------
+        facts : iterable
+            The true relations as tuples (predicate, entity, ...).
+        entity_types : dict (Optional)
+            The type of each entity, keyed by entity name.
+        type_parents : dict (Optional)
+            The parent of each type, keyed by type name.
+        """
+        self.facts = set(facts)
+        self._entity_types = {}
+        self._entities_by_type = {}
+        self._type_parents = type_parents if type_parents is not None else {}
+        for entity, entity_type in (entity_types or {}).items():
+            self.add_entity(entity, entity_type)
+
+    def add_entity(self, entity : str, entity_type : str):
+        """
+        This method is used to add an entity to the index; an entity already in the index is ignored.
+
+        Parameters
+        ----------
+        entity : str
+            The name of the entity.
+        entity_type : str
+            The name of the type of the entity.
+        """
+        if entity in self._entity_types:
+            return
+        self._entity_types[entity] = entity_type
+        visited = set()
+        while entity_type is not None and entity_type not in visited:
+            visited.add(entity_type)
+            self._entities_by_type.setdefault(entity_type, []).append(entity)
+            entity_type = self._type_parents.get(entity_type)
+        self._entities_by_type.setdefault("object", []).append(entity)
+
+    @classmethod
+    def from_world_state(cls, world_state, type_parents : dict = None):
+        """
+        This method is used to create the index of an ev_pddl WorldState.
+
+        Parameters
+        ----------
+        world_state : WorldState
+            The world state.
+        type_parents : dict (Optional)
+            The parent of each type, keyed by type name, e.g. PreconditionCompiler.type_parents.
+        """
+        # Imported here, so that the compiler and the index can be used also without ev_pddl (e.g. in the benchmarks)
+        from ev_pddl.relation_value import RelationValue
+        facts = [(relation.predicate.name,) + tuple(entity.name for entity in relation.entities)
+                 for relation in world_state.relations if relation.value == RelationValue.TRUE]
+        entity_types = {entity.name: entity.type.name for entity in world_state.entities}
+        return cls(facts, entity_types, type_parents)
+
+    def apply_changes(self, changed_relations : list) -> list:
+        """
+        This method is used to update the index with the changes of the world state.
+
+        Parameters
+        ----------
+        changed_relations : list
+            The changed relations in the format of CamelotWorldState.apply_camelot_message, e.g. [("new", relation), ...],
+            also nested in lists, and ("new_entity", entity) for the entities added.
+
+        Returns
+        -------
+        list
+            The relations changed, as tuples (predicate, entity, ...).
+        """
+        from ev_pddl.relation_value import RelationValue
+        from ev_pddl.relation import Relation
+        atoms = []
+        for item in changed_relations:
+            for change in (item if type(item) == list else [item]):
+                if type(change) != tuple or len(change) != 2:
+                    continue
+                change_type, changed = change
+                if change_type == "new_entity":
+                    self.add_entity(changed.name, changed.type.name)
+                    continue
+                if type(changed) != Relation:
+                    continue
+                # The entities created with the relation (e.g. a new position) are not reported as new entities
+                for entity in changed.entities:
+                    self.add_entity(entity.name, entity.type.name)
+                atom = (changed.predicate.name,) + tuple(entity.name for entity in changed.entities)
+                if changed.value == RelationValue.TRUE:
+                    self.facts.add(atom)
+                else:
+                    self.facts.discard(atom)
+                atoms.append(atom)
+        return atoms
+
+    def entities_of_type(self, type_name : str) -> list:
+        """
+        This method is used to get the names of the entities of a type or of one of its subtypes.
+        """
+        return self._entities_by_type.get(type_name, [])
+
+
+class PreconditionCompiler:
+    """
+    This class is used to compile the preconditions of the actions of a PDDL domain, and any other PDDL formula
+    (e.g. the preconditions of the encounters), in Python functions that are evaluated on a WorldStateIndex.
+    A compiled function is called with the index and the arguments of the parameters, in the order they are defined,
+    and it looks up each atom directly in the set of the true relations.
+
+    Attributes
+    ----------
+    type_parents : dict
+        The parent of each type of the domain, keyed by type name.
+    action_parameters : dict
+        The names of the parameters of each action, keyed by action name, in the order they are defined.
+    action_parameter_types : dict
+        The types of the parameters of each action, keyed by action name, in the order they are defined.
+    evaluators : dict
+        The compiled precondition of each action, keyed by action name.
+    """
+
+    def __init__(self, domain_path : str):
+        """
+        Parameters
+        ----------
+        domain_path : str
+            The path of the domain file.
+        """
+        self.type_parents = {}
+        self.action_parameters = {}
+        self.action_parameter_types = {}
+        self.evaluators = {}
+        self._formula_cache = {}
+        domain = parse_sexpression(Path(domain_path).read_text())[0]
+        for section in domain:
+            if type(section) != list or len(section) == 0:
+                continue
+            if section[0] == ":types":
+                for name, parent in parse_typed_list(section[1:]):
+                    if parent != "object" and parent != name:
+                        self.type_parents[name] = parent
+            elif section[0] == ":action":
+                self._compile_action(section)
+
+    def _compile_action(self, section : list):
+        """
+        This method is used to compile the precondition of an action section of the domain.
+        """
+        name = section[1]
+        typed_parameters = []
+        precondition = ["and"]
+        for index in range(2, len(section) - 1):
+            if section[index] == ":parameters":
+                typed_parameters = parse_typed_list(section[index + 1])
+            elif section[index] == ":precondition":
+                precondition = section[index + 1]
+        parameters = [parameter for parameter, _ in typed_parameters]
+        self.action_parameters[name] = [parameter.lstrip("?") for parameter in parameters]
+        self.action_parameter_types[name] = [type_name for _, type_name in typed_parameters]
+        self.evaluators[name] = self._compile(precondition, parameters, "precondition of " + name)
+
+    def is_subtype(self, type_name : str, parent : str) -> bool:
+        """
+        This method is used to know if a type is the same as another type or one of its subtypes, e.g. "player" of "character".
+        """
+        visited = set()
+        while type_name is not None and type_name not in visited:
+            if type_name == parent:
+                return True
+            visited.add(type_name)
+            type_name = self.type_parents.get(type_name)
+        return parent == "object"
+
+    def compile_formula(self, formula : str, parameters : list = ()):
+        """
+        This method is used to compile a PDDL formula, e.g. the preconditions of an encounter.
+        The compiled functions are cached, so the same formula is compiled once.
+
+        Parameters
+        ----------
+        formula : str
+            The formula, e.g. "(and (in father Tavern) (alive father))".
+        parameters : list, default - ()
+            The names of the variables of the formula, e.g. ["?who"].
+
+        Returns
+        -------
+        function
+            The function (index, *arguments) -> bool.
+        """
+        key = (formula, tuple(parameters))
+        if key not in self._formula_cache:
+            expressions = parse_sexpression(formula)
+            if len(expressions) != 1:
+                raise ValueError("The formula must be one expression: %s" % formula)
+            self._formula_cache[key] = self._compile(expressions[0], parameters, formula)
+        return self._formula_cache[key]
+
+    def evaluate_action(self, action_name : str, index : WorldStateIndex, arguments : dict) -> bool:
+        """
+        This method is used to check the precondition of an action.
+
+        Parameters
+        ----------
+        action_name : str
+            The name of the action.
+        index : WorldStateIndex
+            The index of the world state.
+        arguments : dict
+            The names of the entities, keyed by parameter name (with or without "?").
+
+        Returns
+        -------
+        bool
+            True if the precondition is satisfied.
+        """
+        values = [arguments[parameter] if parameter in arguments else arguments["?" + parameter]
+                  for parameter in self.action_parameters[action_name]]
+        return self.evaluators[action_name](index, *values)
+
+    def _compile(self, formula : list, parameters : list, description : str):
+        """
+        This method is used to generate and compile the Python function of a formula.
+        """
+        variables = {}
+        for parameter in parameters:
+            variables[parameter if parameter.startswith("?") else "?" + parameter] = "v%d" % len(variables)
+        source = "def evaluator(index, %s):\n    facts = index.facts\n    entities_of_type = index.entities_of_type\n    return %s\n" % (
+            ", ".join(variables.values()), self._generate(formula, dict(variables)))
+        namespace = {}
+        exec(compile(source, "<%s>" % description, "exec"), namespace)
+        evaluator = namespace["evaluator"]
+        evaluator.source = source
+        return evaluator
+
+    def _generate(self, formula, variables : dict) -> str:
+        """
+        This method is used to generate the Python expression of a formula.
+        """
+        if type(formula) != list or len(formula) == 0:
+            raise ValueError("Formula not supported: %s" % formula)
+        operator = formula[0]
+        if operator == "and":
+            return "(" + " and ".join(self._generate(item, variables) for item in formula[1:]) + ")" if len(formula) > 1 else "True"
+        if operator == "or":
+            return "(" + " or ".join(self._generate(item, variables) for item in formula[1:]) + ")" if len(formula) > 1 else "False"
+        if operator == "not":
+            return "(not %s)" % self._generate(formula[1], variables)
+        if operator == "imply":
+            return "((not %s) or %s)" % (self._generate(formula[1], variables), self._generate(formula[2], variables))
+        if operator == "=":
+            return "(%s == %s)" % (self._term(formula[1], variables), self._term(formula[2], variables))
+        if operator in ("forall", "exists"):
+            inner_variables = dict(variables)
+            loops = []
+            for name, type_name in parse_typed_list(formula[1]):
+                inner_variables[name] = "v%d" % len(inner_variables)
+                loops.append("for %s in entities_of_type(%r)" % (inner_variables[name], type_name))
+            return "%s(%s %s)" % ("all" if operator == "forall" else "any", self._generate(formula[2], inner_variables), " ".join(loops))
+        return "((%s,) in facts)" % ", ".join([repr(operator)] + [self._term(term, variables) for term in formula[1:]])
+
+    def _term(self, term : str, variables : dict) -> str:
+        """
+        This method is used to generate the Python expression of a variable or of a constant.
+        """
+        if term.startswith("?"):
+            if term not in variables:
+                raise ValueError("Variable %s not defined." % term)
+            return variables[term]
+        return repr(term)
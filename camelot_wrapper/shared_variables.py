@@ -2,6 +2,14 @@ import os
 from pathlib import Path
 
 location_message_prefix = ("input started walking", "input stopped walking", "input arrived", "input exited")
+# Camelot actions sent with priority CommandPriority.UI and CommandPriority.BACKGROUND; the others are sent with CommandPriority.GAMEPLAY
+ui_actions = ("AddToList", "ClearDialog", "ClearList", "DisableIcon", "DisableInput", "EnableIcon", "EnableInput", "HideCredits",
+              "HideDialog", "HideList", "HideMenu", "HideNarration", "RemoveFromList", "SetCredits", "SetDialog", "SetLeft",
+              "SetNarration", "SetRight", "SetTitle", "ShowCredits", "ShowDialog", "ShowList", "ShowMenu", "ShowNarration")
+background_actions = ("CheckVersion", "CreateCharacter", "CreateItem", "CreatePlace", "SetClothing", "SetEyeColor", "SetHairColor",
+                      "SetHairStyle", "SetSkinColor")
+# Location messages that change the world state; the others are dropped by the CamelotInputMultiplexer
+location_message_subscriptions = ("input arrived", "input exited")
 
 supported_types = {}
 supported_predicates = {}
@@ -1,4 +1,5 @@
 import json
+import re
 import importlib.resources as pkg_resources
 try:
     import json_data
@@ -31,6 +32,17 @@ def get_action_list():
         action_list.append(action['name'])
     return action_list
 
+def split_instruction(instruction):
+    """
+    This method is used to split an instruction in its name and its arguments, e.g. 'Face(arnell, "annara")' -> ("Face", ["arnell", "annara"]).
+    The arguments are stripped of the spaces and of the quotes around them; a comma within quotes is part of the argument.
+    """
+    instruction = instruction.strip()
+    name, _, arguments = instruction.partition("(")
+    arguments = arguments.rsplit(")", 1)[0]
+    parts = [part.strip() for part in re.findall(r'\s*("[^"]*"|[^,]*)\s*(?:,|$)', arguments)]
+    return name.strip(), [part[1:-1] if len(part) >= 2 and part[0] == part[-1] == '"' else part for part in parts if part != ""]
+
 def str2bool(v):
     """
     This method is used to convert a string to a boolean.
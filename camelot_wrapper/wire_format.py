@@ -0,0 +1,76 @@
+import json
+import jsonpickle
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Formats that can be used to send the changed relations to the platform, in order of preference.
+# The format is negotiated during phase 3 of the handshake; jsonpickle is used if the platform does not choose one.
+COMPACT_JSON = "compact_json"
+JSONPICKLE = "jsonpickle"
+SUPPORTED_WIRE_FORMATS = [COMPACT_JSON, JSONPICKLE]
+
+# Version of the compact schema, sent within every compact message.
+COMPACT_SCHEMA_VERSION = 1
+
+
+# Status of the changed relations of a speculative action, sent within the compact messages
+SPECULATION_TENTATIVE = "tentative"
+SPECULATION_CONFIRMED = "confirmed"
+SPECULATION_ROLLED_BACK = "rolled_back"
+
+
+def encode_changed_relations(relation_list : list, wire_format : str = JSONPICKLE, speculation : dict = None) -> str:
+    """
+    This method is used to encode the changed relations in a message for the platform.
+
+    Parameters
+    ----------
+    relation_list : list
+        A list of tuples (change_type, relation_pddl), e.g. ("new", "(at bob alchemyshop.Door)").
+    wire_format : str, default - JSONPICKLE
+        The format used to encode the message.
+    speculation : dict (Optional)
+        {"id": int, "status": str} if the relations belong to an action applied before Camelot confirmed it: SPECULATION_TENTATIVE when it is applied,
+        SPECULATION_CONFIRMED when Camelot succeeded and SPECULATION_ROLLED_BACK, with the relations that undo it, when Camelot failed.
+        Only COMPACT_JSON can carry it.
+
+    Returns
+    -------
+    str
+        The encoded message. With COMPACT_JSON it is a JSON object {"schema": version, "relations": [[change_type, relation_pddl], ...]},
+        with also "speculation" if it is given.
+    """
+    if speculation is not None and wire_format != COMPACT_JSON:
+        raise ValueError("Wire format %s can't carry speculative relations." % wire_format)
+    if wire_format == COMPACT_JSON:
+        message = {"schema": COMPACT_SCHEMA_VERSION, "relations": relation_list}
+        if speculation is not None:
+            message["speculation"] = speculation
+        if orjson is not None:
+            return orjson.dumps(message).decode()
+        return json.dumps(message, separators=(',', ':'))
+    return jsonpickle.encode(relation_list)
+
+
+def decode_changed_relations(message : str) -> list:
+    """
+    This method is used to decode a message created by encode_changed_relations, whatever format was used.
+
+    Parameters
+    ----------
+    message : str
+        The encoded message.
+
+    Returns
+    -------
+    list
+        A list of tuples (change_type, relation_pddl).
+    """
+    decoded = orjson.loads(message) if orjson is not None else json.loads(message)
+    if type(decoded) == dict and "schema" in decoded:
+        if decoded["schema"] != COMPACT_SCHEMA_VERSION:
+            raise ValueError("Compact message schema version %s not supported." % decoded["schema"])
+        return [tuple(item) for item in decoded["relations"]]
+    return jsonpickle.decode(message)
@@ -0,0 +1,43 @@
+import os
+import sys
+import time
+import pytest
+
+# The modules of camelot_wrapper import each other by name, as when the wrapper is started from its folder
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'camelot_wrapper'))
+
+from platform_IO_communication import PlatformIOCommunication
+from platform_stand_in import PlatformStandIn
+
+
+def wait_until(condition, timeout : float = 5.0, interval : float = 0.01) -> bool:
+    """
+    This method is used to wait until a condition becomes true, for at most timeout seconds.
+    """
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if condition():
+            return True
+        time.sleep(interval)
+    return condition()
+
+
+@pytest.fixture
+def stand_in():
+    stand_in = PlatformStandIn(port=0, phase_delays={"PHASE_3": 0.05})
+    stand_in.start()
+    yield stand_in
+    stand_in.stop()
+
+
+@pytest.fixture
+def platform(stand_in, tmp_path):
+    # PlatformIOCommunication is a singleton; each test gets its own instance of the class
+    platform = PlatformIOCommunication.__wrapped__(read_timeout=0.2, long_poll_timeout=0.5, heartbeat_interval=0.05,
+                                                   max_heartbeat_backoff=0.1, spool_path=str(tmp_path / "spool" / "messages.spool"))
+    platform.base_link = stand_in.base_link
+    platform.send_message_link = stand_in.send_message_link
+    platform.receive_message_link = stand_in.receive_message_link
+    yield platform
+    platform.stop_receiving_normal_messages()
+    platform.close()
@@ -0,0 +1,36 @@
+"""
+Tests of the mirror of the state of the Camelot UI.
+"""
+from camelot_ui_state import CamelotUIState
+
+
+def test_enable_input_undoes_one_disable_input():
+    ui_state = CamelotUIState()
+    ui_state.input_disabled = 0
+    assert ui_state.is_redundant("EnableInput", [])
+    ui_state.apply("DisableInput", [])
+    ui_state.apply("DisableInput", [])
+    ui_state.apply("EnableInput", [])
+    # The input is still disabled once, so the next EnableInput changes the state of Camelot
+    assert not ui_state.is_redundant("EnableInput", [])
+    ui_state.apply("EnableInput", [])
+    assert ui_state.is_redundant("EnableInput", [])
+
+
+def test_menu_disables_the_input():
+    ui_state = CamelotUIState()
+    ui_state.input_disabled = 0
+    ui_state.apply("ShowMenu", [])
+    assert ui_state.is_redundant("ShowMenu", [])
+    assert not ui_state.is_redundant("EnableInput", [])
+    ui_state.apply("HideMenu", [])
+    assert ui_state.is_redundant("HideMenu", [])
+
+
+def test_input_not_known_is_never_redundant():
+    ui_state = CamelotUIState()
+    ui_state.apply("EnableInput", [])
+    assert not ui_state.is_redundant("EnableInput", [])
+    ui_state.input_disabled = 0
+    ui_state.invalidate("DisableInput")
+    assert not ui_state.is_redundant("EnableInput", [])
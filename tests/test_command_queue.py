@@ -0,0 +1,53 @@
+"""
+Tests of the queue of the commands waiting to be sent to Camelot.
+"""
+import time
+from command_queue import CommandPriority, PrioritizedCommandQueue
+
+
+def _take_all(command_queue) -> list:
+    return [command_queue.get() for _ in range(command_queue.qsize())]
+
+
+def test_most_urgent_reorderable_command_first():
+    command_queue = PrioritizedCommandQueue()
+    command_queue.put("background", CommandPriority.BACKGROUND, reorderable=True)
+    command_queue.put("gameplay", CommandPriority.GAMEPLAY, reorderable=True)
+    command_queue.put("ui", CommandPriority.UI, reorderable=True)
+    assert _take_all(command_queue) == ["ui", "gameplay", "background"]
+
+
+def test_same_priority_keeps_the_order():
+    command_queue = PrioritizedCommandQueue()
+    for index in range(5):
+        command_queue.put("gameplay %d" % index, CommandPriority.GAMEPLAY, reorderable=True)
+    command_queue.put("ui", CommandPriority.UI, reorderable=True)
+    assert _take_all(command_queue) == ["ui"] + ["gameplay %d" % index for index in range(5)]
+
+
+def test_command_not_reorderable_keeps_its_place():
+    command_queue = PrioritizedCommandQueue()
+    command_queue.put("background", CommandPriority.BACKGROUND, reorderable=True)
+    command_queue.put("barrier", CommandPriority.BACKGROUND)
+    command_queue.put("ui after the barrier", CommandPriority.UI, reorderable=True)
+    command_queue.put("ui before the barrier", CommandPriority.UI)
+    assert _take_all(command_queue) == ["background", "barrier", "ui after the barrier", "ui before the barrier"]
+
+
+def test_commands_not_reorderable_are_fifo():
+    command_queue = PrioritizedCommandQueue()
+    command_queue.put("background", CommandPriority.BACKGROUND)
+    command_queue.put("gameplay", CommandPriority.GAMEPLAY)
+    command_queue.put("ui", CommandPriority.UI)
+    assert _take_all(command_queue) == ["background", "gameplay", "ui"]
+
+
+def test_command_waiting_too_long_is_promoted():
+    command_queue = PrioritizedCommandQueue(max_wait={CommandPriority.BACKGROUND: 0.05})
+    command_queue.put("background", CommandPriority.BACKGROUND, reorderable=True)
+    time.sleep(0.1)
+    command_queue.put("ui", CommandPriority.UI, reorderable=True)
+    assert _take_all(command_queue) == ["background", "ui"]
+    metrics = command_queue.get_metrics()
+    assert metrics["promoted"] == 1
+    assert metrics["background"]["sent"] == 1 and metrics["ui"]["sent"] == 1
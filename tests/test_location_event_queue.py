@@ -0,0 +1,58 @@
+"""
+Tests of the coalescing of the location messages of Camelot.
+"""
+from queue import Empty
+import pytest
+from location_event_queue import LocationEventQueue
+
+
+def _take_all(location_queue) -> list:
+    messages = []
+    while True:
+        try:
+            messages.append(location_queue.get_nowait()[1])
+        except Empty:
+            return messages
+
+
+def test_passing_through_a_position_is_coalesced():
+    location_queue = LocationEventQueue()
+    location_queue.put((0.0, "input arrived bob position Tavern.Door"))
+    assert _take_all(location_queue) == ["input arrived bob position Tavern.Door"]
+    location_queue.put((1.0, "input arrived bob position Tavern.Bar"))
+    location_queue.put((2.0, "input exited bob position Tavern.Bar"))
+    location_queue.put((3.0, "input arrived bob position Tavern.Table"))
+    assert location_queue.qsize() == 1
+    assert location_queue.coalesced == 2
+    assert _take_all(location_queue) == ["input arrived bob position Tavern.Table"]
+
+
+def test_arrival_in_another_room_is_kept():
+    location_queue = LocationEventQueue()
+    location_queue.put((0.0, "input arrived bob position Tavern.Door"))
+    location_queue.put((1.0, "input exited bob position Tavern.Door"))
+    location_queue.put((2.0, "input arrived bob position City.Fountain"))
+    location_queue.put((3.0, "input exited bob position City.Fountain"))
+    assert location_queue.coalesced == 0
+    assert len(_take_all(location_queue)) == 4
+
+
+def test_duplicate_message_is_coalesced():
+    location_queue = LocationEventQueue()
+    location_queue.put((0.0, "input arrived bob position Tavern.Door"))
+    location_queue.put((1.0, "input arrived bob position Tavern.Door"))
+    location_queue.put((2.0, "input arrived alice position Tavern.Door"))
+    assert location_queue.coalesced == 1
+    assert _take_all(location_queue) == ["input arrived bob position Tavern.Door", "input arrived alice position Tavern.Door"]
+
+
+def test_every_message_kept_without_coalescing():
+    location_queue = LocationEventQueue(coalesce=False)
+    messages = ["input arrived bob position Tavern.Door", "input arrived bob position Tavern.Door",
+                "input exited bob position Tavern.Door"]
+    for index, message in enumerate(messages):
+        location_queue.put((float(index), message))
+    assert location_queue.coalesced == 0
+    assert _take_all(location_queue) == messages
+    with pytest.raises(Empty):
+        location_queue.get_nowait()
@@ -0,0 +1,111 @@
+"""
+Tests of PlatformIOCommunication against the local stand-in platform.
+"""
+from conftest import wait_until
+from pddl_serialization import iter_json_body
+
+
+def _texts(stand_in) -> list:
+    return [message['text'] for message in stand_in.received_messages]
+
+
+def _go_offline(stand_in, platform):
+    stand_in.set_online(False)
+    assert wait_until(lambda: not platform._is_platform_online())
+
+
+def test_handshake_waits_for_the_planner(stand_in, platform):
+    # The reply to phase 3 arrives only when the planner is ready, later than the read timeout of the normal messages
+    stand_in.planner_delay = 0.5
+    platform.send_message_link = ""
+    platform.receive_message_link = ""
+    platform.start()
+    phase_messages = platform.communication_protocol_phase_messages
+    result = platform.send_message(phase_messages['PHASE_2']['message_3'] + "Camelot", inizialization=True)
+    assert result['text'] == phase_messages['PHASE_2']['message_4']
+    assert platform.wait_for_handshake_phase("PHASE_3", timeout=5.0)
+    message = {"text": phase_messages['PHASE_3']['message_6'], "domain_hash": "hash", "domain": "(define (domain CamelotDomain))"}
+    result = platform.send_streamed_initialization_message(iter_json_body(message, {"problem": iter(["(define ", "(problem example))"])}))
+    assert result['text'] == phase_messages['PHASE_4']['message_9']
+    assert stand_in.initialization_messages[-1]['problem'] == "(define (problem example))"
+    assert platform.platform_has_domain("hash")
+    assert platform.wait_for_handshake_phase("PHASE_5", timeout=5.0)
+    platform.send_message_link = result['add_message_url'].replace('/', '')
+    platform.receive_message_link = result['get_message_url'].replace('/', '')
+    platform.start_receiving_normal_messages()
+    stand_in.add_action("move-within-location(father, annara, Tavern)")
+    assert wait_until(lambda: platform.get_spool_metrics()["depth"] == 0)
+    received = []
+    assert wait_until(lambda: received.append(platform.receive_message()) or any(received))
+    assert [message for message in received if message][0] == [{'text': "move-within-location(father, annara, Tavern)"}]
+
+
+def test_handshake_message_waits_for_the_planner(stand_in, platform):
+    stand_in.planner_delay = 0.5
+    platform.start()
+    phase_messages = platform.communication_protocol_phase_messages
+    platform.send_message(phase_messages['PHASE_2']['message_3'] + "Camelot", inizialization=True)
+    result = platform.send_message({"text": phase_messages['PHASE_3']['message_6']}, inizialization=True)
+    assert result['text'] == phase_messages['PHASE_4']['message_9']
+
+
+def test_spool_is_flushed_in_order_after_an_outage(stand_in, platform):
+    platform.send_message("before")
+    _go_offline(stand_in, platform)
+    platform.send_message("first")
+    platform.send_error_message("error")
+    platform.send_message("second")
+    assert platform.get_spool_metrics()["depth"] == 3
+    stand_in.set_online(True)
+    assert wait_until(lambda: platform.get_spool_metrics()["depth"] == 0)
+    platform.send_message("after")
+    assert _texts(stand_in) == ["before", "first", "second", "after"]
+    assert [error['text'] for error in stand_in.received_errors] == ["error"]
+    assert platform.get_spool_metrics()["flushed"] == 3
+
+
+def test_refused_message_does_not_hold_back_the_others(stand_in, platform):
+    stand_in.refused_texts.add("refused")
+    for text in ["first", "refused", "second", "third"]:
+        platform.send_message_async(text)
+    assert wait_until(lambda: len(stand_in.received_messages) == 3)
+    assert _texts(stand_in) == ["first", "second", "third"]
+    # The stand-in records a message before the reply reaches the outbox
+    assert wait_until(lambda: platform.get_outbox_metrics()["sent"] == 3)
+    metrics = platform.get_outbox_metrics()
+    assert (metrics["failed"], metrics["spooled"]) == (1, 0)
+    assert platform.get_spool_metrics()["depth"] == 0
+
+
+def test_refused_spooled_message_is_dropped(stand_in, platform):
+    stand_in.refused_texts.add("refused")
+    _go_offline(stand_in, platform)
+    for text in ["first", "refused", "second"]:
+        platform.send_message(text)
+    stand_in.set_online(True)
+    assert wait_until(lambda: platform.get_spool_metrics()["depth"] == 0)
+    platform.send_message("third")
+    assert _texts(stand_in) == ["first", "second", "third"]
+    assert platform.get_spool_metrics()["dropped"] == 1
+
+
+def test_outbox_keeps_the_order(stand_in, platform):
+    texts = ["message %d" % index for index in range(100)]
+    for text in texts:
+        assert platform.send_message_async(text)
+    assert wait_until(lambda: len(stand_in.received_messages) == len(texts))
+    assert _texts(stand_in) == texts
+    assert wait_until(lambda: platform.get_outbox_metrics()["sent"] == len(texts))
+
+
+def test_batched_outbox_keeps_the_order(stand_in, platform):
+    platform.batch_messages = True
+    stand_in.refused_texts.add("message 10")
+    texts = ["message %d" % index for index in range(100)]
+    for text in texts:
+        platform.send_message_async(text)
+    expected = [text for text in texts if text != "message 10"]
+    assert wait_until(lambda: len(stand_in.received_messages) == len(expected))
+    assert _texts(stand_in) == expected
+    assert wait_until(lambda: platform.get_outbox_metrics()["sent"] == len(expected))
+    assert platform.get_outbox_metrics()["failed"] == 1
@@ -0,0 +1,17 @@
+"""
+Tests of the helpers of utilities.
+"""
+from utilities import split_instruction
+
+
+def test_split_instruction():
+    assert split_instruction('Face(arnell, "annara")') == ("Face", ["arnell", "annara"])
+    assert split_instruction('  WalkTo( bob , Tavern.Door )  ') == ("WalkTo", ["bob", "Tavern.Door"])
+
+
+def test_split_instruction_without_arguments():
+    assert split_instruction("HideMenu()") == ("HideMenu", [])
+
+
+def test_split_instruction_keeps_the_comma_within_quotes():
+    assert split_instruction('SetDialog("Hello, traveller", arnell)') == ("SetDialog", ["Hello, traveller", "arnell"])